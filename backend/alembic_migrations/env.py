@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 from app.models import Base
+from app.services.message_partitions import PARTITION_NAME
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,6 +29,12 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 # target_metadata = None
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Skip the monthly messages partitions, which are created at runtime."""
+    return not (type_ == "table" and reflected and PARTITION_NAME.match(name))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -67,6 +74,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -76,7 +84,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
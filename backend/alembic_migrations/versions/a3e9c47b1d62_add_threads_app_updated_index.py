@@ -0,0 +1,33 @@
+"""add threads (app_id, updated_at) index
+
+Revision ID: a3e9c47b1d62
+Revises: d7b2e5c81f03
+Create Date: 2026-10-19 12:00:00.000000
+
+Serves the thread list ordering and the per-app max(updated_at) used as
+the list's ETag validator.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3e9c47b1d62"
+down_revision: Union[str, None] = "d7b2e5c81f03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_threads_app_updated",
+        "threads",
+        ["app_id", "updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_threads_app_updated", table_name="threads")
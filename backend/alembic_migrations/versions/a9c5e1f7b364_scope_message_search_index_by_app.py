@@ -0,0 +1,57 @@
+"""denormalize messages.app_id and scope the search index by app
+
+Revision ID: a9c5e1f7b364
+Revises: f6b3d8e2a419
+Create Date: 2026-10-20 14:00:00.000000
+
+The GIN index on content_tsv alone made every search read the matches of all
+apps. It is replaced by a GIN index on (ARRAY[app_id], content_tsv); uuid[]
+has a built-in GIN opclass, so no extension is needed.
+
+The backfill rewrites every messages partition and setting NOT NULL scans
+them; on large installations run this migration in a maintenance window.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a9c5e1f7b364"
+down_revision: Union[str, None] = "f6b3d8e2a419"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "messages", sa.Column("app_id", postgresql.UUID(as_uuid=True), nullable=True)
+    )
+    op.execute(
+        "UPDATE messages SET app_id = threads.app_id "
+        "FROM threads WHERE threads.id = messages.thread_id"
+    )
+    op.alter_column("messages", "app_id", nullable=False)
+    op.drop_index("ix_messages_content_tsv", table_name="messages")
+    op.create_index(
+        "ix_messages_app_content_tsv",
+        "messages",
+        [sa.text("(ARRAY[app_id])"), "content_tsv"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_app_content_tsv", table_name="messages")
+    op.create_index(
+        "ix_messages_content_tsv",
+        "messages",
+        ["content_tsv"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.drop_column("messages", "app_id")
@@ -0,0 +1,61 @@
+"""add subscriber metadata GIN index and subscriber segments
+
+Revision ID: b8d41f6e2a95
+Revises: a3e9c47b1d62
+Create Date: 2026-10-19 13:00:00.000000
+
+jsonb_path_ops indexes only serve @>, @? and @@, which is all the metadata
+filters use, and are smaller than the default jsonb_ops. Segments cache their
+member counts.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8d41f6e2a95"
+down_revision: Union[str, None] = "a3e9c47b1d62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_subscribers_metadata",
+        "subscribers",
+        ["metadata_json"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"metadata_json": "jsonb_path_ops"},
+    )
+    op.create_table(
+        "subscriber_segments",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("app_id", sa.UUID(), nullable=False),
+        sa.Column("name", sa.String(length=200), nullable=False),
+        sa.Column(
+            "filter_json",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.Column("matches_empty", sa.Boolean(), nullable=False),
+        sa.Column("member_count", sa.Integer(), nullable=False),
+        sa.Column("counted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["app_id"], ["apps.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_subscriber_segments_app", "subscriber_segments", ["app_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_subscriber_segments_app", table_name="subscriber_segments")
+    op.drop_table("subscriber_segments")
+    op.drop_index("ix_subscribers_metadata", table_name="subscribers")
@@ -0,0 +1,75 @@
+"""add archived_threads cold storage
+
+Revision ID: b9e4f2a6d183
+Revises: a7d3e9f1c254
+Create Date: 2026-10-19 22:00:00.000000
+
+The downgrade moves archived messages back into messages first (the month
+partitions they came from must still exist).
+"""
+
+import json
+import zlib
+from datetime import datetime
+from typing import Sequence, Union
+from uuid import UUID
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b9e4f2a6d183"
+down_revision: Union[str, None] = "a7d3e9f1c254"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "archived_threads",
+        sa.Column("thread_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("codec", sa.String(length=16), nullable=False),
+        sa.Column("payload", sa.LargeBinary(), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+        sa.Column("oldest_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["thread_id"], ["threads.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("thread_id"),
+    )
+    # Payloads are compressed already: store them out of line as they are
+    op.execute("ALTER TABLE archived_threads ALTER COLUMN payload SET STORAGE EXTERNAL")
+    op.add_column("threads", sa.Column("archived_seq", sa.Integer(), nullable=True))
+
+
+_RESTORE = sa.text(
+    "INSERT INTO messages (id, thread_id, seq, role, content, content_json, "
+    "created_at) VALUES (:id, :thread_id, :seq, :role, :content, "
+    "CAST(:content_json AS jsonb), :created_at)"
+)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    archives = bind.execute(
+        sa.text("SELECT thread_id, payload FROM archived_threads")
+    ).all()
+    for thread_id, payload in archives:
+        messages = json.loads(zlib.decompress(payload))
+        if messages:
+            bind.execute(
+                _RESTORE,
+                [
+                    {
+                        **m,
+                        "id": UUID(m["id"]),
+                        "thread_id": thread_id,
+                        "content_json": json.dumps(m["content_json"]),
+                        "created_at": datetime.fromisoformat(m["created_at"]),
+                    }
+                    for m in messages
+                ],
+            )
+    op.drop_column("threads", "archived_seq")
+    op.drop_table("archived_threads")
@@ -0,0 +1,33 @@
+"""add app_shards lookup table
+
+Revision ID: c4f8a2d6e917
+Revises: b9e4f2a6d183
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f8a2d6e917"
+down_revision: Union[str, None] = "b9e4f2a6d183"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "app_shards",
+        sa.Column("app_id", sa.UUID(), nullable=False),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("app_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("app_shards")
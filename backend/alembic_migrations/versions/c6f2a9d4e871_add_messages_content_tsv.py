@@ -0,0 +1,49 @@
+"""add generated messages.content_tsv with a GIN index
+
+Revision ID: c6f2a9d4e871
+Revises: b8d41f6e2a95
+Create Date: 2026-10-19 14:00:00.000000
+
+Adding a stored generated column rewrites the messages table under an
+ACCESS EXCLUSIVE lock; on large installations run this migration in a
+maintenance window.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c6f2a9d4e871"
+down_revision: Union[str, None] = "b8d41f6e2a95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "messages",
+        sa.Column(
+            "content_tsv",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('english', coalesce(content, ''))", persisted=True
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_messages_content_tsv",
+        "messages",
+        ["content_tsv"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_content_tsv", table_name="messages")
+    op.drop_column("messages", "content_tsv")
@@ -0,0 +1,36 @@
+"""lower threads.messages_from below created_at
+
+Revision ID: d2a6f8c3e514
+Revises: c4f8a2d6e917
+Create Date: 2026-10-20 09:00:00.000000
+
+Threads created since the messages partitioning started messages_from at
+their exact created_at, so a message timestamped by an app server with a
+slower clock could fall below it and be skipped by reads. New threads start
+MESSAGES_FROM_MARGIN (one hour) earlier; this applies the same margin to
+existing threads still at their created_at. Values raised by retention or
+lowered by backdated imports differ from created_at and are left alone.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2a6f8c3e514"
+down_revision: Union[str, None] = "c4f8a2d6e917"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "UPDATE threads SET messages_from = created_at - interval '1 hour' "
+        "WHERE messages_from = created_at"
+    )
+
+
+def downgrade() -> None:
+    # Lower bounds stay valid when lowered further; nothing to undo
+    pass
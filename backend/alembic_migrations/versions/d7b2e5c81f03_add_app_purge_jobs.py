@@ -0,0 +1,53 @@
+"""add app purge jobs and apps.deleted_at
+
+Revision ID: d7b2e5c81f03
+Revises: c3f8a1d92e47
+Create Date: 2026-10-19 11:00:00.000000
+
+Large apps are deleted by a background job in bounded batches; the app is
+hidden via deleted_at while the job runs. Child rows already use
+ON DELETE CASCADE, so no foreign key changes are needed.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d7b2e5c81f03"
+down_revision: Union[str, None] = "c3f8a1d92e47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "apps", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.create_table(
+        "app_purge_jobs",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("app_id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("threads_deleted", sa.Integer(), nullable=False),
+        sa.Column("messages_deleted", sa.BigInteger(), nullable=False),
+        sa.Column("subscribers_deleted", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_app_purge_jobs_status", "app_purge_jobs", ["status"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_app_purge_jobs_status", table_name="app_purge_jobs")
+    op.drop_table("app_purge_jobs")
+    op.drop_column("apps", "deleted_at")
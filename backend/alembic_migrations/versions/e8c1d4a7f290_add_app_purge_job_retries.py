@@ -0,0 +1,42 @@
+"""add attempts and retry_at to app_purge_jobs
+
+Revision ID: e8c1d4a7f290
+Revises: d2a6f8c3e514
+Create Date: 2026-10-20 10:00:00.000000
+
+Failed purge jobs are retried with backoff instead of leaving the app hidden
+with its data in place.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8c1d4a7f290"
+down_revision: Union[str, None] = "d2a6f8c3e514"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "app_purge_jobs",
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "app_purge_jobs",
+        sa.Column("retry_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    # Jobs that failed before retries existed get another go
+    op.execute(
+        "UPDATE app_purge_jobs SET attempts = 1, retry_at = now() "
+        "WHERE status = 'failed'"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("app_purge_jobs", "retry_at")
+    op.drop_column("app_purge_jobs", "attempts")
@@ -0,0 +1,148 @@
+"""partition messages by month of created_at
+
+Revision ID: f1c8e3a5b702
+Revises: e4a7c1b9d352
+Create Date: 2026-10-19 18:00:00.000000
+
+A table cannot be partitioned in place: this migration creates the
+partitioned table with one partition per month from the oldest message to
+three months ahead, copies every row, then swaps the tables. It holds an
+ACCESS EXCLUSIVE lock on messages while copying; on large installations run
+it in a maintenance window. uq_thread_seq becomes a unique constraint on each
+partition (Postgres requires parent unique constraints to include created_at).
+threads.messages_from is added and backfilled with the oldest message time.
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f1c8e3a5b702"
+down_revision: Union[str, None] = "e4a7c1b9d352"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_MONTHS_AHEAD = 3
+_COLUMNS = "id, thread_id, seq, role, content, content_json, created_at"
+
+
+def _month(at: datetime, offset: int = 0) -> datetime:
+    index = at.year * 12 + at.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _columns() -> list[sa.Column]:
+    return [
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("thread_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("role", sa.String(length=20), nullable=False),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column(
+            "content_json",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "content_tsv",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('english', coalesce(content, ''))", persisted=True
+            ),
+            nullable=True,
+        ),
+    ]
+
+
+def _create_indexes() -> None:
+    op.create_index(
+        "ix_messages_content_tsv",
+        "messages",
+        ["content_tsv"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_foreign_key(
+        "messages_thread_id_fkey",
+        "messages",
+        "threads",
+        ["thread_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    op.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+
+    op.create_table(
+        "messages_partitioned",
+        *_columns(),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    oldest = bind.scalar(sa.text("SELECT min(created_at) FROM messages"))
+    now = datetime.now(timezone.utc)
+    month = _month(min(oldest, now) if oldest else now)
+    last = _month(now, _MONTHS_AHEAD)
+    newest = bind.scalar(sa.text("SELECT max(created_at) FROM messages"))
+    if newest is not None and newest >= _month(last, 1):
+        last = _month(newest)
+    partitions = []
+    while month <= last:
+        name = f"messages_y{month.year:04d}m{month.month:02d}"
+        op.execute(
+            f"CREATE TABLE {name} PARTITION OF messages_partitioned FOR VALUES "
+            f"FROM ('{month.isoformat()}') TO ('{_month(month, 1).isoformat()}')"
+        )
+        partitions.append(name)
+        month = _month(month, 1)
+
+    op.execute(
+        f"INSERT INTO messages_partitioned ({_COLUMNS}) SELECT {_COLUMNS} FROM messages"
+    )
+
+    op.add_column(
+        "threads",
+        sa.Column("messages_from", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        "UPDATE threads SET messages_from = least(threads.created_at, m.oldest) "
+        "FROM (SELECT thread_id, min(created_at) AS oldest FROM messages "
+        "GROUP BY thread_id) AS m WHERE m.thread_id = threads.id"
+    )
+    op.execute(
+        "UPDATE threads SET messages_from = created_at WHERE messages_from IS NULL"
+    )
+    op.alter_column("threads", "messages_from", nullable=False)
+
+    op.drop_table("messages")
+    op.rename_table("messages_partitioned", "messages")
+    op.create_primary_key("messages_pkey", "messages", ["id", "created_at"])
+    for name in partitions:
+        op.create_unique_constraint(f"{name}_uq_thread_seq", name, ["thread_id", "seq"])
+    _create_indexes()
+
+
+def downgrade() -> None:
+    op.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+    op.create_table("messages_plain", *_columns())
+    op.execute(
+        f"INSERT INTO messages_plain ({_COLUMNS}) SELECT {_COLUMNS} FROM messages"
+    )
+    op.drop_table("messages")
+    op.rename_table("messages_plain", "messages")
+    op.create_primary_key("messages_pkey", "messages", ["id"])
+    op.create_unique_constraint("uq_thread_seq", "messages", ["thread_id", "seq"])
+    op.create_index(
+        "ix_messages_thread_seq", "messages", ["thread_id", "seq"], unique=False
+    )
+    _create_indexes()
+    op.drop_column("threads", "messages_from")
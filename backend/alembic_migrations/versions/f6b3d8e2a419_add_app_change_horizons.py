@@ -0,0 +1,37 @@
+"""add app_change_horizons for change feed pruning
+
+Revision ID: f6b3d8e2a419
+Revises: e8c1d4a7f290
+Create Date: 2026-10-20 12:00:00.000000
+
+Change feed entries older than CHANGE_FEED_RETENTION_DAYS are pruned; the
+newest pruned position per app tells readers their cursor fell behind.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f6b3d8e2a419"
+down_revision: Union[str, None] = "e8c1d4a7f290"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "app_change_horizons",
+        sa.Column("app_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("tx_id", sa.BigInteger(), nullable=False),
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["app_id"], ["apps.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("app_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("app_change_horizons")
@@ -22,11 +22,103 @@ class Settings(BaseSettings):
     # Connection pooling strategy
     # "null" - No pooling, new connection per request (serverless: Vercel, Lambda)
     # "queue" - Connection pool with reuse (traditional servers: Docker, VPS, Kubernetes)
+    # "bouncer" - Pool of connections to PgBouncer in transaction mode (no
+    #   prepared statement caching); set REALTIME_DATABASE_URLS too
     DATABASE_POOL_CLASS: str = "null"
-    # QueuePool settings (ignored when using NullPool)
-    DATABASE_POOL_SIZE: int = 5  # Number of connections to maintain
+    # Pool settings (ignored when using NullPool)
+    DATABASE_POOL_SIZE: int = 5  # Number of connections to maintain (opened at startup)
     DATABASE_MAX_OVERFLOW: int = 10  # Additional connections if pool exhausted
     DATABASE_POOL_RECYCLE: int = 3600  # Recycle connections after N seconds
+    # Warn about connections held longer than this (e.g. a session kept by an
+    # SSE stream); see GET /metrics/database
+    DATABASE_HOLD_WARN_SECONDS: float = 30.0
+
+    # Read replicas for read-only list routes (get_read_session); empty = primary
+    # only. A replica is skipped while it lags more than the max, and clients
+    # that wrote within that window read from the primary.
+    DATABASE_REPLICA_URLS: list[str] = []
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 2.0
+    DATABASE_REPLICA_LAG_CHECK_SECONDS: float = 1.0  # Lag measured at most this often
+
+    # App-level sharding: extra databases holding whole apps (shard 0 is
+    # DATABASE_URL, which also keeps users and the app_shards lookup table).
+    # New apps are placed on a consistent-hash ring of DATABASE_SHARD_VNODES
+    # points per shard; empty = everything on DATABASE_URL.
+    DATABASE_SHARD_URLS: list[str] = []
+    DATABASE_SHARD_VNODES: int = 64
+    SHARD_MAP_CACHE_SIZE: int = 100000  # App/thread -> shard entries cached per worker
+
+    # Idempotency-Key support on write endpoints
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400  # Stored responses replayable for 24h
+    IDEMPOTENCY_CACHE_SIZE: int = 10000  # In-process hot cache entries
+
+    # Subscriber last_seen_at/last_message_at are buffered and written every N seconds
+    SUBSCRIBER_ACTIVITY_FLUSH_SECONDS: float = 5.0
+
+    # messages is partitioned by month of created_at: partitions are created
+    # this many months ahead; with MESSAGE_RETENTION_MONTHS > 0, months older than
+    # that are dropped whole. Checked at startup and every interval.
+    MESSAGE_PARTITIONS_AHEAD: int = 3
+    MESSAGE_RETENTION_MONTHS: int = 0  # 0 keeps every month
+    MESSAGE_PARTITION_CHECK_SECONDS: float = 3600.0
+    # Bulk imports create partitions for the months they touch: at most this
+    # many months per request, none before retention and none in the future
+    # beyond a clock-skew allowance
+    MESSAGE_BULK_MAX_MONTHS: int = 24
+    MESSAGE_BULK_MAX_FUTURE_SECONDS: float = 300.0
+
+    # App deletion: apps with more messages than this are purged in the background
+    APP_PURGE_SYNC_MAX_MESSAGES: int = 10000
+    APP_PURGE_BATCH_SIZE: int = 5000  # Rows deleted per statement/commit
+    APP_PURGE_PAUSE_SECONDS: float = 0.05  # Pause between batches to limit load
+    # Unfinished jobs are picked up every interval; failed ones are retried after
+    # APP_PURGE_RETRY_SECONDS, doubling per attempt, up to APP_PURGE_MAX_ATTEMPTS
+    APP_PURGE_CHECK_SECONDS: float = 300.0
+    APP_PURGE_RETRY_SECONDS: float = 60.0
+    APP_PURGE_MAX_ATTEMPTS: int = 5
+
+    # Per-app retention (config_json["retention"]): passes run every interval and
+    # delete expired rows in batches
+    RETENTION_CHECK_SECONDS: float = 3600.0
+    RETENTION_BATCH_SIZE: int = 2000  # Rows deleted per statement/commit
+    RETENTION_PAUSE_SECONDS: float = 0.05  # Pause between batches to limit load
+
+    # Cold storage: threads with status "archived" or not updated for this many
+    # days (0: only archived threads; apps can override) move to compressed blobs
+    # during the retention pass
+    THREAD_ARCHIVE_AFTER_DAYS: int = 0
+    THREAD_ARCHIVE_BATCH_SIZE: int = 50  # Threads archived per transaction
+    THREAD_ARCHIVE_CACHE_SIZE: int = 256  # Unpacked archives cached per worker
+
+    # Realtime SSE subscriptions (Postgres LISTEN/NOTIFY)
+    REALTIME_CHANNEL: str = "nexo_events"
+    # LISTEN needs a session of its own: behind a transaction-mode PgBouncer,
+    # list direct Postgres URLs here (one per shard, in order). Empty uses
+    # DATABASE_URL and DATABASE_SHARD_URLS.
+    REALTIME_DATABASE_URLS: list[str] = []
+    REALTIME_KEEPALIVE_SECONDS: float = 15.0  # SSE comment sent when idle
+    REALTIME_QUEUE_SIZE: int = 256  # Events buffered per subscriber before resync
+    CHANGE_FEED_STREAM_BATCH_SIZE: int = 500  # Changes read per query when streaming
+    # Change feed entries older than this are pruned by the retention worker
+    CHANGE_FEED_RETENTION_DAYS: int = 30  # 0 keeps every entry
+    MESSAGES_LONG_POLL_MAX_SECONDS: float = 30.0  # Upper bound for list_messages ?wait=
+
+    # Bulk export (NDJSON): rows fetched per server-side cursor batch; a resume
+    # token is emitted after each batch
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Bulk subscriber import: rows COPYed into the staging table and merged per
+    # transaction
+    SUBSCRIBER_IMPORT_BATCH_SIZE: int = 5000
+
+    # Message search ranks at most this many of the newest matches per query
+    SEARCH_MAX_CANDIDATES: int = 10000
+
+    # WebSocket chat gateway: per-connection flow control
+    WS_MAX_MESSAGE_BYTES: int = 32768  # Larger client frames are rejected
+    WS_MAX_PENDING_MESSAGES: int = 4  # User messages queued behind the running turn
+    WS_SEND_QUEUE_SIZE: int = 64  # Outbound frames buffered before producers wait
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0  # Close sockets that stop reading
 
     # User secrets - DEVELOPMENT DEFAULTS (MUST override in production!)
     ACCESS_SECRET_KEY: str = "dev-access-secret-CHANGE-IN-PRODUCTION-min-32-chars"
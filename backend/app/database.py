@@ -1,41 +1,98 @@
-from typing import AsyncGenerator
+import asyncio
+import bisect
+import hashlib
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, TypeVar
 from urllib.parse import urlparse
+from uuid import UUID, uuid4
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi_users.db import SQLAlchemyUserDatabase
-from sqlalchemy import NullPool, QueuePool
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .config import settings
-from .models import Base, User
+from .logging_config import get_logger
+from .models import AppPurgeJob, AppShard, Base, Thread, User
+from .models import Message as MessageModel
+from .services.pool_metrics import (
+    InstrumentedNullPool,
+    InstrumentedQueuePool,
+    instrument,
+)
 
 
-parsed_db_url = urlparse(settings.DATABASE_URL)
+logger = get_logger(__name__)
 
-async_db_connection_url = (
-    f"postgresql+asyncpg://{parsed_db_url.username}:{parsed_db_url.password}@"
-    f"{parsed_db_url.hostname}{':' + str(parsed_db_url.port) if parsed_db_url.port else ''}"
-    f"{parsed_db_url.path}"
-)
+
+def asyncpg_url(url: str) -> str:
+    """``url`` with the asyncpg driver (any scheme and query are dropped)."""
+    parsed = urlparse(url)
+    return (
+        f"postgresql+asyncpg://{parsed.username}:{parsed.password}@"
+        f"{parsed.hostname}{':' + str(parsed.port) if parsed.port else ''}"
+        f"{parsed.path}"
+    )
+
+
+async_db_connection_url = asyncpg_url(settings.DATABASE_URL)
 
 # Configure connection pooling based on deployment type
+# (instrumented: app.services.pool_metrics times checkouts)
 poolclass_map = {
-    "null": NullPool,  # Serverless (Vercel, Lambda) - new connection per request
-    "queue": QueuePool,  # Traditional servers (Docker, VPS) - connection pool with reuse
+    "null": InstrumentedNullPool,  # Serverless (Vercel, Lambda) - new connection per request
+    "queue": InstrumentedQueuePool,  # Traditional servers (Docker, VPS) - connection pool with reuse
+    "bouncer": InstrumentedQueuePool,  # Pool of connections to PgBouncer (transaction mode)
 }
-poolclass = poolclass_map.get(settings.DATABASE_POOL_CLASS.lower(), NullPool)
+pool_mode = settings.DATABASE_POOL_CLASS.lower()
+poolclass = poolclass_map.get(pool_mode, InstrumentedNullPool)
 
-# Engine configuration
-engine_kwargs = {"poolclass": poolclass}
 
-# Add QueuePool settings if using connection pooling
-if poolclass == QueuePool:
-    engine_kwargs.update({
-        "pool_size": settings.DATABASE_POOL_SIZE,
-        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
-        "pool_pre_ping": True,  # Verify connections before use (prevents stale connections)
-        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
-    })
+def _statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def _engine_kwargs(pool_mode: str) -> dict:
+    """create_async_engine arguments for a DATABASE_POOL_CLASS value."""
+    poolclass = poolclass_map.get(pool_mode, InstrumentedNullPool)
+    kwargs = {"poolclass": poolclass}
+
+    # Add pool settings if using connection pooling
+    if poolclass is InstrumentedQueuePool:
+        kwargs.update({
+            "pool_size": settings.DATABASE_POOL_SIZE,
+            "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+            "pool_pre_ping": True,  # Verify connections before use (prevents stale connections)
+            "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        })
+
+    # PgBouncer in transaction mode hands each transaction any server connection,
+    # so a statement prepared on one may be missing (or a different statement) on
+    # the next: no statement caches, and every prepared statement gets a unique name.
+    if pool_mode == "bouncer":
+        kwargs["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _statement_name,
+        }
+    return kwargs
+
+
+# Engine configuration
+engine_kwargs = _engine_kwargs(pool_mode)
 
 engine = create_async_engine(async_db_connection_url, **engine_kwargs)
 
@@ -44,25 +101,385 @@ async_session_maker = async_sessionmaker(
 )
 
 
+T = TypeVar("T")
+
+
+class Shard:
+    """One database holding whole apps (with all their rows)."""
+
+    def __init__(
+        self, index: int, engine: AsyncEngine, session_maker: async_sessionmaker
+    ):
+        self.index = index
+        self.engine = engine
+        self.session_maker = session_maker
+
+
+def _ring_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+# Rows found by id alone (routes without app_id), by path parameter
+_LOCATED_BY = {"thread_id": Thread, "message_id": MessageModel, "job_id": AppPurgeJob}
+
+
+class ShardRouter:
+    """Maps apps, and rows under an app, to the shard holding them.
+
+    The app_shards table on shard 0 is authoritative; apps without a row are
+    on shard 0 (e.g. created before sharding was enabled). New apps are placed
+    by consistent hashing, so an added shard takes its share of new apps and
+    no placed app ever moves. Placements never change, so they are cached.
+    """
+
+    def __init__(self, shards: list[Shard], vnodes: int):
+        self.shards = shards
+        ring = sorted(
+            (_ring_hash(f"{shard.index}:{vnode}".encode()), shard.index)
+            for shard in shards
+            for vnode in range(vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [index for _, index in ring]
+        self._cache: OrderedDict[UUID, Shard] = OrderedDict()
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    @property
+    def primary(self) -> Shard:
+        return self.shards[0]
+
+    def place(self, app_id: UUID) -> Shard:
+        """The shard for a new app: the next ring point after its hash."""
+        at = bisect.bisect(self._points, _ring_hash(app_id.bytes)) % len(self._points)
+        return self.shards[self._owners[at]]
+
+    def _remember(self, key: UUID, shard: Shard) -> Shard:
+        self._cache[key] = shard
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.SHARD_MAP_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return shard
+
+    async def assign(self, app_id: UUID) -> Shard:
+        """Place a new app, recording it in app_shards unless on shard 0."""
+        shard = self.place(app_id)
+        if shard is not self.primary:
+            async with self.primary.session_maker() as db:
+                db.add(AppShard(app_id=app_id, shard=shard.index))
+                await db.commit()
+        return self._remember(app_id, shard)
+
+    async def unassign(self, app_id: UUID) -> None:
+        """Forget the placement of a deleted (or never created) app."""
+        self._cache.pop(app_id, None)
+        if not self.sharded:
+            return
+        async with self.primary.session_maker() as db:
+            await db.execute(delete(AppShard).where(AppShard.app_id == app_id))
+            await db.commit()
+
+    async def ensure_user(self, shard: Shard, user_id: UUID) -> None:
+        """Copy a user row from shard 0 to ``shard``, for the foreign keys of
+        the user's apps there. Auth always reads shard 0."""
+        if shard is self.primary:
+            return
+        users = User.__table__
+        async with self.primary.session_maker() as db:
+            row = (
+                (await db.execute(select(users).filter(users.c.id == user_id)))
+                .mappings()
+                .one()
+            )
+        async with shard.session_maker() as db:
+            await db.execute(insert(users).values(**row).on_conflict_do_nothing())
+            await db.commit()
+
+    async def shard_for_app(self, app_id: UUID) -> Shard:
+        if not self.sharded:
+            return self.primary
+        shard = self._cache.get(app_id)
+        if shard is None:
+            async with self.primary.session_maker() as db:
+                index = await db.scalar(
+                    select(AppShard.shard).filter(AppShard.app_id == app_id)
+                )
+            shard = self._remember(app_id, self.shards[index or 0])
+        return shard
+
+    async def locate(self, model, row_id: UUID) -> Shard:
+        """The shard holding a row known only by id, asking every shard.
+
+        Unknown ids resolve to shard 0 (the route then answers 404).
+        """
+        if not self.sharded:
+            return self.primary
+        shard = self._cache.get(row_id)
+        if shard is not None:
+            return shard
+
+        async def holds(db: AsyncSession) -> bool:
+            return (
+                await db.scalar(select(model.id).filter(model.id == row_id)) is not None
+            )
+
+        for shard, found in zip(self.shards, await self.gather(holds)):
+            if found:
+                return self._remember(row_id, shard)
+        return self.primary
+
+    async def for_connection(self, connection: HTTPConnection) -> Shard:
+        """The shard a request's path parameters point to (cached per request)."""
+        shard = getattr(connection.state, "shard", None)
+        if shard is not None:
+            return shard
+        shard = self.primary
+        params = connection.path_params
+        try:
+            if "app_id" in params:
+                shard = await self.shard_for_app(UUID(params["app_id"]))
+            else:
+                for name, model in _LOCATED_BY.items():
+                    if name in params:
+                        shard = await self.locate(model, UUID(params[name]))
+                        break
+        except ValueError:
+            pass  # Not a UUID: validation rejects the request
+        connection.state.shard = shard
+        return shard
+
+    async def gather(self, read: Callable[[AsyncSession], Awaitable[T]]) -> list[T]:
+        """Run ``read`` on every shard concurrently; results in shard order."""
+
+        async def on(shard: Shard) -> T:
+            async with shard.session_maker() as db:
+                return await read(db)
+
+        return list(await asyncio.gather(*(on(shard) for shard in self.shards)))
+
+
+shards = [Shard(0, engine, async_session_maker)]
+for _index, _url in enumerate(settings.DATABASE_SHARD_URLS, start=1):
+    _engine = create_async_engine(asyncpg_url(_url), **engine_kwargs)
+    shards.append(
+        Shard(
+            _index,
+            _engine,
+            async_sessionmaker(_engine, expire_on_commit=settings.EXPIRE_ON_COMMIT),
+        )
+    )
+shard_router = ShardRouter(shards, settings.DATABASE_SHARD_VNODES)
+for _shard in shards:
+    instrument(_shard.engine, f"shard-{_shard.index}" if _shard.index else "primary")
+
+
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+async def get_async_session(
+    connection: HTTPConnection,
+) -> AsyncGenerator[AsyncSession, None]:
+    """Session on the shard of the request's app (the primary when unsharded)."""
+    session_maker = async_session_maker
+    if shard_router.sharded:
+        session_maker = (await shard_router.for_connection(connection)).session_maker
+    async with session_maker() as session:
+        yield session
+
+
+@asynccontextmanager
+async def primary_session(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """A session for user lookups: ``db`` itself unless it is on another shard
+    (users live on shard 0)."""
+    if not shard_router.sharded or db.bind is shard_router.primary.engine:
+        yield db
+        return
     async with async_session_maker() as session:
         yield session
 
 
-def get_session_factory() -> async_sessionmaker:
-    """Return the async session factory.
+async def get_primary_session(
+    db: AsyncSession = Depends(get_async_session),
+) -> AsyncGenerator[AsyncSession, None]:
+    async with primary_session(db) as session:
+        yield session
+
+
+# Read replicas. Each replica's lag is measured at most every
+# DATABASE_REPLICA_LAG_CHECK_SECONDS: zero when it has replayed all WAL it
+# received (an idle primary writes no transactions, so the age of the last
+# replayed one would overstate it), otherwise the age of the last replayed
+# transaction. NULL (nothing replayed yet) or an error takes it out of rotation.
+_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Read-your-writes token: set on successful writes, sent back by clients on
+# reads. Its value is the write time in milliseconds since the epoch.
+CONSISTENCY_HEADER = "X-Consistency-Token"
+
+
+class Replica:
+    """A read replica's engine and its last measured replication lag."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_async_engine(asyncpg_url(url), **engine_kwargs)
+        self.session_maker = async_sessionmaker(
+            self.engine, expire_on_commit=settings.EXPIRE_ON_COMMIT
+        )
+        self.lag: float | None = None  # Seconds; None when unknown or unreachable
+        self.checked_at = float("-inf")
+
+    async def current_lag(self) -> float | None:
+        now = time.monotonic()
+        if now - self.checked_at >= settings.DATABASE_REPLICA_LAG_CHECK_SECONDS:
+            self.checked_at = now
+            try:
+                async with self.engine.connect() as conn:
+                    lag = await conn.scalar(_REPLICA_LAG)
+            except (OSError, SQLAlchemyError):
+                logger.warning("Read replica %s is unreachable", self.engine.url)
+                lag = None
+            self.lag = None if lag is None else float(lag)
+        return self.lag
+
+
+replicas = [Replica(url) for url in settings.DATABASE_REPLICA_URLS]
+for _index, _replica in enumerate(replicas):
+    instrument(_replica.engine, f"replica-{_index}")
+_replica_turn = itertools.count()
+
+
+async def warm_up_pools() -> None:
+    """Open DATABASE_POOL_SIZE connections on every engine (shards and
+    replicas), so the first requests after a deploy do not each pay the
+    connect latency. Failures are only logged: the pools connect lazily."""
+    if poolclass is not InstrumentedQueuePool:
+        return
+    started = time.perf_counter()
+    engines = [shard.engine for shard in shards]
+    engines += [replica.engine for replica in replicas]
+    results = await asyncio.gather(
+        *(
+            engine.connect()
+            for engine in engines
+            for _ in range(settings.DATABASE_POOL_SIZE)
+        ),
+        return_exceptions=True,
+    )
+    opened = [conn for conn in results if not isinstance(conn, BaseException)]
+    for conn in opened:
+        await conn.close()  # Back to its pool
+    if len(opened) < len(results):
+        logger.warning(
+            "Pool warm-up opened %d of %d connections: %s",
+            len(opened),
+            len(results),
+            next(conn for conn in results if isinstance(conn, BaseException)),
+        )
+    logger.info(
+        "Warmed up %d pooled connections in %.0fms",
+        len(opened),
+        (time.perf_counter() - started) * 1000,
+    )
+
+
+def consistency_token() -> str:
+    return str(int(time.time() * 1000))
+
+
+def wrote_recently(token: str | None) -> bool:
+    """Whether a consistency token is too recent for any usable replica.
+
+    Replicas are used while their lag is within the max, measured up to one
+    check interval ago, so writes older than both have reached them.
+    """
+    try:
+        written = int(token) / 1000
+    except (TypeError, ValueError):
+        return False
+    window = (
+        settings.DATABASE_REPLICA_MAX_LAG_SECONDS
+        + settings.DATABASE_REPLICA_LAG_CHECK_SECONDS
+    )
+    return time.time() - written < window
+
+
+async def pick_replica(token: str | None) -> Replica | None:
+    """The next replica (round robin) that is caught up, or None for the primary."""
+    if not replicas or wrote_recently(token):
+        return None
+    start = next(_replica_turn)
+    for offset in range(len(replicas)):
+        replica = replicas[(start + offset) % len(replicas)]
+        lag = await replica.current_lag()
+        if lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+            return replica
+    return None
+
+
+async def get_read_session(
+    request: Request, db: AsyncSession = Depends(get_async_session)
+) -> AsyncGenerator[AsyncSession, None]:
+    """Session for read-only routes: a replica when one is configured and caught
+    up, else the request's primary session.
+
+    Clients that send the ``X-Consistency-Token`` of a recent write are served
+    by the primary, so they always see their own writes.
+    """
+    if shard_router.sharded and (
+        await shard_router.for_connection(request) is not shard_router.primary
+    ):
+        yield db  # Replicas are of shard 0
+        return
+    replica = await pick_replica(request.headers.get(CONSISTENCY_HEADER))
+    if replica is None:
+        yield db
+        return
+    async with replica.session_maker() as session:
+        yield session
+
+
+class ConsistencyTokenMiddleware:
+    """Adds a fresh ``X-Consistency-Token`` to successful write responses."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_token(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (CONSISTENCY_HEADER.lower().encode(), consistency_token().encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
+
+
+async def get_session_factory(connection: HTTPConnection) -> async_sessionmaker:
+    """Return the async session factory of the request's shard.
 
     Exposed as a dependency so tests can override it with a test-scoped factory.
     Used by streaming endpoints that need to create their own short-lived sessions
     (e.g. to persist data inside an SSE generator without leaking connections).
     """
+    if shard_router.sharded:
+        return (await shard_router.for_connection(connection)).session_maker
     return async_session_maker
 
 
-async def get_user_db(session: AsyncSession = Depends(get_async_session)):
+async def get_user_db(session: AsyncSession = Depends(get_primary_session)):
     yield SQLAlchemyUserDatabase(session, User)
@@ -4,26 +4,35 @@ import secrets
 from uuid import UUID
 
 import jwt
-from fastapi import Depends, HTTPException, Request
+from fastapi import Depends, Header, HTTPException, Request
+from starlette.requests import HTTPConnection
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 from app.config import settings
-from app.database import User, get_async_session
-from app.models import App, Thread, Subscriber
+from app.database import User, get_async_session, primary_session
+from app.models import App, Thread, Subscriber, SubscriberSegment
+from app.services.idempotency import IdempotencyRequest, hash_request
+from app.services.segments import get_segment
 from app.users import current_active_user
 
 
 async def _get_user_from_bearer_token(
-    request: Request,
+    request: HTTPConnection,
     db: AsyncSession = Depends(get_async_session),
 ) -> User | None:
-    """Extract and validate JWT from Authorization Bearer; return User or None."""
+    """Extract and validate JWT from Authorization Bearer; return User or None.
+
+    Browsers cannot set headers on WebSockets, so those may pass ``?token=``.
+    """
     auth = request.headers.get("Authorization")
-    if not auth or not auth.startswith("Bearer "):
+    if auth and auth.startswith("Bearer "):
+        token = auth[7:].strip()
+    elif request.scope["type"] == "websocket":
+        token = request.query_params.get("token", "").strip()
+    else:
         return None
-    token = auth[7:].strip()
     if not token:
         return None
     try:
@@ -42,14 +51,15 @@ async def _get_user_from_bearer_token(
         user_id = UUID(sub) if isinstance(sub, str) else sub
     except (TypeError, ValueError):
         return None
-    result = await db.execute(select(User).filter(User.id == user_id))
-    user = result.scalars().first()
+    async with primary_session(db) as users_db:
+        result = await users_db.execute(select(User).filter(User.id == user_id))
+        user = result.scalars().first()
     return user
 
 
 async def get_app_for_request(
     app_id: UUID,
-    request: Request,
+    request: HTTPConnection,
     db: AsyncSession = Depends(get_async_session),
 ) -> App:
     """
@@ -72,7 +82,9 @@ async def get_app_for_request(
             raise HTTPException(
                 status_code=401, detail="ERROR_PARTNER_API_APP_ID_MISMATCH"
             )
-        result = await db.execute(select(App).filter(App.id == app_id))
+        result = await db.execute(
+            select(App).filter(App.id == app_id, App.deleted_at.is_(None))
+        )
         app = result.scalars().first()
         if not app or not app.webhook_secret:
             raise HTTPException(
@@ -87,7 +99,9 @@ async def get_app_for_request(
     user = await _get_user_from_bearer_token(request, db)
     if user:
         result = await db.execute(
-            select(App).filter(App.id == app_id, App.user_id == user.id)
+            select(App).filter(
+                App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+            )
         )
         app = result.scalars().first()
         if app:
@@ -105,7 +119,9 @@ async def get_app_or_404(
 ) -> App:
     """Get app by ID and verify ownership."""
     result = await db.execute(
-        select(App).filter(App.id == app_id, App.user_id == user.id)
+        select(App).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     app = result.scalars().first()
 
@@ -135,6 +151,19 @@ async def get_subscriber_in_app_or_404(
     return subscriber
 
 
+async def get_segment_in_app_or_404(
+    app_id: UUID,
+    segment_id: UUID,
+    db: AsyncSession = Depends(get_async_session),
+    app: App = Depends(get_app_for_request),
+) -> SubscriberSegment:
+    """Get a saved segment and verify it belongs to the app (JWT or app-secret auth)."""
+    segment = await get_segment(db, app.id, segment_id) if app.id == app_id else None
+    if not segment:
+        raise HTTPException(status_code=404, detail="ERROR_SEGMENT_NOT_FOUND")
+    return segment
+
+
 async def get_thread_in_app_or_404(
     app_id: UUID,
     thread_id: UUID,
@@ -173,3 +202,28 @@ async def get_thread_in_app_with_lock(
     if not thread:
         raise HTTPException(status_code=404, detail="ERROR_THREAD_NOT_FOUND")
     return thread
+
+
+async def get_idempotency_request(
+    app_id: UUID,
+    request: Request,
+    idempotency_key: str | None = Header(
+        None,
+        min_length=1,
+        max_length=255,
+        description="Client-chosen key; retries with the same key replay the first response",
+    ),
+) -> IdempotencyRequest | None:
+    """Parse the Idempotency-Key header for a write endpoint under /apps/{app_id}.
+
+    The key is not claimed here: routes call ``claim()`` after their auth
+    dependencies have run, so unauthenticated callers cannot probe keys.
+    """
+    if idempotency_key is None:
+        return None
+    body = await request.body()
+    return IdempotencyRequest(
+        app_id,
+        idempotency_key,
+        hash_request(request.method, request.url.path, body),
+    )
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi_pagination import add_pagination
@@ -9,17 +11,63 @@ from app.routes.apps import router as apps_router
 from app.routes.threads import router as threads_router
 from app.routes.messages import router as messages_router
 from app.routes.subscribers import router as subscribers_router
+from app.routes.segments import router as segments_router
+from app.routes.changes import router as changes_router
 from app.routes.run import router as run_router
+from app.routes.realtime import router as realtime_router
+from app.routes.chat_gateway import router as chat_gateway_router
+from app.routes.export import router as export_router
 from app.routes.webhook_test import router as webhook_test_router
+from app.routes.metrics import router as metrics_router
 from app.config import settings
+from app.database import (
+    CONSISTENCY_HEADER,
+    ConsistencyTokenMiddleware,
+    shards,
+    warm_up_pools,
+)
 from app.logging_config import configure_logging, get_logger
+from app.services.activity_tracker import activity_tracker
+from app.services.app_purge import start_app_purge_worker, stop_app_purges
+from app.services.message_partitions import (
+    start_partition_maintenance,
+    stop_partition_maintenance,
+)
+from app.services.pool_metrics import (
+    PoolMetricsMiddleware,
+    start_pool_monitor,
+    stop_pool_monitor,
+)
+from app.services.realtime import realtime_hub
+from app.services.retention import start_retention_worker, stop_retention_worker
 
 configure_logging()
 logger = get_logger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start per-worker background services; flush their buffers on shutdown."""
+    await warm_up_pools()
+    start_pool_monitor()
+    activity_tracker.start()
+    engines = [shard.engine for shard in shards]
+    start_partition_maintenance(*engines)
+    start_retention_worker(*engines)
+    start_app_purge_worker(*(shard.session_maker for shard in shards))
+    yield
+    await realtime_hub.close()
+    await stop_app_purges()
+    await stop_retention_worker()
+    await stop_partition_maintenance()
+    await activity_tracker.stop()
+    await stop_pool_monitor()
+
+
 app = FastAPI(
     generate_unique_id_function=simple_generate_unique_route_id,
     openapi_url=settings.OPENAPI_URL,
+    lifespan=lifespan,
 )
 
 
@@ -44,7 +92,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CONSISTENCY_HEADER],
 )
+# Read-your-writes tokens for replica routing (app.database.get_read_session)
+app.add_middleware(ConsistencyTokenMiddleware)
+# Attributes connection holds to routes (GET /metrics/database)
+app.add_middleware(PoolMetricsMiddleware)
 
 # Include authentication and user management routes
 app.include_router(
@@ -80,7 +133,13 @@ app.include_router(apps_router, prefix="/apps")
 app.include_router(threads_router)
 app.include_router(messages_router)
 app.include_router(subscribers_router)
+app.include_router(segments_router)
+app.include_router(changes_router)
 app.include_router(run_router)
+app.include_router(realtime_router)
+app.include_router(chat_gateway_router)
+app.include_router(export_router)
 app.include_router(webhook_test_router)
+app.include_router(metrics_router)
 
 add_pagination(app)
@@ -1,21 +1,36 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
     Column,
+    Computed,
+    PrimaryKeyConstraint,
     String,
     ForeignKey,
     Integer,
+    LargeBinary,
     Text,
     DateTime,
     Index,
     UniqueConstraint,
+    text,
 )
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
 from uuid import uuid4
 
 
+# Text search configuration of Message.content_tsv; search queries must match
+SEARCH_TEXT_CONFIG = "english"
+
+# Thread.messages_from starts this far before the thread's created_at:
+# messages are timestamped by whichever app server writes them, and one with
+# a clock behind the thread creator's must not fall below messages_from.
+MESSAGES_FROM_MARGIN = timedelta(hours=1)
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -52,9 +67,46 @@ class Subscriber(Base):
         UniqueConstraint("app_id", "customer_id", name="uq_subscriber_app_customer"),
         Index("ix_subscribers_app_last_seen", "app_id", "last_seen_at"),
         Index("ix_subscribers_app_last_message", "app_id", "last_message_at"),
+        # Serves metadata containment (@>) and jsonpath (@@) filters
+        Index(
+            "ix_subscribers_metadata",
+            "metadata_json",
+            postgresql_using="gin",
+            postgresql_ops={"metadata_json": "jsonb_path_ops"},
+        ),
     )
 
 
+class SubscriberSegment(Base):
+    """A saved subscriber metadata filter with a cached member count.
+
+    member_count is computed when the segment is created or refreshed and is
+    then kept current incrementally: bulk imports apply per-batch deltas and
+    new subscribers (empty metadata) count towards segments with
+    matches_empty.
+    """
+
+    __tablename__ = "subscriber_segments"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    app_id = Column(
+        UUID(as_uuid=True), ForeignKey("apps.id", ondelete="CASCADE"), nullable=False
+    )
+    name = Column(String(200), nullable=False)
+    filter_json = Column(JSONB, nullable=False, default=dict, server_default="{}")
+    # Whether a subscriber with empty metadata is a member
+    matches_empty = Column(Boolean, nullable=False, default=False)
+    member_count = Column(Integer, nullable=False, default=0)
+    counted_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+    __table_args__ = (Index("ix_subscriber_segments_app", "app_id"),)
+
+
 class App(Base):
     __tablename__ = "apps"
 
@@ -65,11 +117,22 @@ class App(Base):
     webhook_url = Column(String, nullable=True)
     webhook_secret = Column(String, nullable=True)
     config_json = Column(JSONB, nullable=False, default=dict, server_default="{}")
+    # Set while a background purge is deleting the app; hidden from the API
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="apps")
-    threads = relationship("Thread", back_populates="app", cascade="all, delete-orphan")
+    # passive_deletes: rely on ON DELETE CASCADE instead of loading children
+    threads = relationship(
+        "Thread",
+        back_populates="app",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
     subscribers = relationship(
-        "Subscriber", back_populates="app", cascade="all, delete-orphan"
+        "Subscriber",
+        back_populates="app",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -102,6 +165,18 @@ class Thread(Base):
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc),
     )
+    # No message of the thread is older: lets reads skip earlier partitions.
+    # Writers of backdated messages must lower it (see allocate_seq_ranges).
+    messages_from = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda context: (
+            context.get_current_parameters()["created_at"] - MESSAGES_FROM_MARGIN
+        ),
+    )
+
+    # Highest seq moved to cold storage (ArchivedThread); NULL if never archived
+    archived_seq = Column(Integer, nullable=True)
 
     app = relationship("App", back_populates="threads")
     subscriber = relationship("Subscriber", back_populates="threads")
@@ -109,17 +184,26 @@ class Thread(Base):
         "Message",
         back_populates="thread",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         order_by="Message.seq",
     )
 
     __table_args__ = (
         Index("ix_threads_app_created", "app_id", "created_at"),
+        Index("ix_threads_app_updated", "app_id", "updated_at"),
         Index("ix_threads_app_customer", "app_id", "customer_id"),
         Index("ix_threads_subscriber", "subscriber_id"),
     )
 
 
 class Message(Base):
+    """A message of a thread; range-partitioned by month of created_at.
+
+    Partitions are managed by app.services.message_partitions. Postgres only
+    allows unique constraints that include the partition key, so uq_thread_seq
+    exists on each partition instead of on this table.
+    """
+
     __tablename__ = "messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
@@ -128,19 +212,221 @@ class Message(Base):
         ForeignKey("threads.id", ondelete="CASCADE"),
         nullable=False,
     )
+    # Denormalized from threads.app_id so search can use an app-scoped index
+    app_id = Column(UUID(as_uuid=True), nullable=False)
     seq = Column(Integer, nullable=False)
     role = Column(String(20), nullable=False)  # user, assistant, system, tool
     content = Column(Text, nullable=True)
     content_json = Column(JSONB, nullable=False, default=dict, server_default="{}")
     created_at = Column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
         default=lambda: datetime.now(timezone.utc),
     )
+    # Full-text search vector, kept up to date by the database; deferred so
+    # loading messages never reads it
+    content_tsv = deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                f"to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce(content, ''))",
+                persisted=True,
+            ),
+        )
+    )
 
     thread = relationship("Thread", back_populates="messages")
 
     __table_args__ = (
-        UniqueConstraint("thread_id", "seq", name="uq_thread_seq"),
-        Index("ix_messages_thread_seq", "thread_id", "seq"),
+        # uuid[] has a built-in GIN opclass, so the app scope needs no btree_gin
+        Index(
+            "ix_messages_app_content_tsv",
+            text("(ARRAY[app_id])"),
+            "content_tsv",
+            postgresql_using="gin",
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class ArchivedThread(Base):
+    """A thread's cold messages as one compressed blob (app.services.thread_archive).
+
+    Holds seqs 1..threads.archived_seq; later messages are in messages.
+    """
+
+    __tablename__ = "archived_threads"
+
+    thread_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("threads.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    codec = Column(String(16), nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    oldest_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+
+class AppShard(Base):
+    """Shard of an app (app.database.ShardRouter); only used on shard 0.
+
+    Apps without a row live on shard 0. app_id has no foreign key: the app
+    row is on its shard.
+    """
+
+    __tablename__ = "app_shards"
+
+    app_id = Column(UUID(as_uuid=True), primary_key=True)
+    shard = Column(Integer, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+
+class AppPurgeJob(Base):
+    """Progress of a background purge of a large app, deleted in bounded batches.
+
+    app_id has no foreign key: the job outlives the app row it deletes.
+    """
+
+    __tablename__ = "app_purge_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    app_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    status = Column(
+        String(20), nullable=False, default="pending"
+    )  # pending, running, completed, failed
+    threads_deleted = Column(Integer, nullable=False, default=0)
+    messages_deleted = Column(BigInteger, nullable=False, default=0)
+    subscribers_deleted = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    # Failed runs; a failed job is retried at retry_at (NULL: given up)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    retry_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (Index("ix_app_purge_jobs_status", "status"),)
+
+
+class RetentionRun(Base):
+    """One pass of the retention worker over an app (app.services.retention).
+
+    Counters are committed with each batch, so a running pass shows progress.
+    """
+
+    __tablename__ = "retention_runs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    app_id = Column(
+        UUID(as_uuid=True), ForeignKey("apps.id", ondelete="CASCADE"), nullable=False
+    )
+    status = Column(
+        String(20), nullable=False, default="running"
+    )  # running, completed, failed
+    messages_deleted = Column(BigInteger, nullable=False, default=0)
+    threads_deleted = Column(Integer, nullable=False, default=0)
+    subscribers_deleted = Column(Integer, nullable=False, default=0)
+    batches = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    started_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (Index("ix_retention_runs_app_started", "app_id", "started_at"),)
+
+
+class IdempotencyKey(Base):
+    """Response stored for a write request sent with an Idempotency-Key header.
+
+    status_code/response_json are NULL while the first request is in flight.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    app_id = Column(
+        UUID(as_uuid=True), ForeignKey("apps.id", ondelete="CASCADE"), nullable=False
+    )
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_json = Column(JSONB, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("app_id", "key", name="pk_idempotency_keys"),
+        Index("ix_idempotency_keys_expires", "expires_at"),
+    )
+
+
+class AppChange(Base):
+    """One entry of an app's append-only change feed (app.services.change_feed).
+
+    tx_id is the id of the writing transaction; the feed is read in
+    (tx_id, seq) order so entries never appear behind a reader's cursor.
+    """
+
+    __tablename__ = "app_changes"
+
+    seq = Column(BigInteger, primary_key=True)
+    tx_id = Column(
+        BigInteger,
+        nullable=False,
+        server_default=text("(pg_current_xact_id()::text)::bigint"),
+    )
+    app_id = Column(
+        UUID(as_uuid=True), ForeignKey("apps.id", ondelete="CASCADE"), nullable=False
+    )
+    kind = Column(String(32), nullable=False)
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    thread_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=text("now()")
+    )
+
+    __table_args__ = (Index("ix_app_changes_position", "app_id", "tx_id", "seq"),)
+
+
+class AppChangeHorizon(Base):
+    """Position of the newest change feed entry pruned for an app.
+
+    Cursors before it have missed entries (app.services.change_feed).
+    """
+
+    __tablename__ = "app_change_horizons"
+
+    app_id = Column(
+        UUID(as_uuid=True), ForeignKey("apps.id", ondelete="CASCADE"), primary_key=True
     )
+    tx_id = Column(BigInteger, nullable=False)
+    seq = Column(BigInteger, nullable=False)
@@ -1,14 +1,25 @@
-from uuid import UUID
+import heapq
+from datetime import datetime, timezone
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi_pagination import Page, Params
 from fastapi_pagination.ext.sqlalchemy import apaginate
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 
-from app.database import User, get_async_session
-from app.models import App
-from app.schemas import AppRead, AppCreate, AppUpdate
+from app.config import settings
+from app.database import User, get_async_session, get_session_factory, shard_router
+from app.models import App, AppPurgeJob, RetentionRun
+from app.schemas import (
+    AppPurgeJobRead,
+    AppRead,
+    AppCreate,
+    AppUpdate,
+    RetentionRunRead,
+)
+from app.services.app_purge import count_app_messages, schedule_app_purge
 from app.users import current_active_user
 
 router = APIRouter(tags=["app"])
@@ -26,8 +37,30 @@ async def read_app(
     size: int = Query(10, ge=1, le=100, description="Page size"),
 ):
     params = Params(page=page, size=size)
-    query = select(App).filter(App.user_id == user.id)
-    return await apaginate(db, query, params, transformer=transform_apps)
+    query = select(App).filter(App.user_id == user.id, App.deleted_at.is_(None))
+    if not shard_router.sharded:
+        return await apaginate(db, query, params, transformer=transform_apps)
+
+    # Sharded: every shard returns its total and its first offset + size apps
+    # in id order; the merged lists are cut to the page.
+    raw = params.to_raw_params()
+
+    async def read_shard(shard_db: AsyncSession):
+        total = await shard_db.scalar(
+            select(func.count()).select_from(query.subquery())
+        )
+        apps = await shard_db.scalars(
+            query.order_by(App.id).limit(raw.offset + raw.limit)
+        )
+        return total, apps.all()
+
+    results = await shard_router.gather(read_shard)
+    apps = list(heapq.merge(*(apps for _, apps in results), key=lambda a: a.id))
+    return Page.create(
+        transform_apps(apps[raw.offset : raw.offset + raw.limit]),
+        params,
+        total=sum(total for total, _ in results),
+    )
 
 
 @router.post("/", response_model=AppRead)
@@ -36,7 +69,21 @@ async def create_app(
     db: AsyncSession = Depends(get_async_session),
     user: User = Depends(current_active_user),
 ):
-    db_app = App(**app.model_dump(), user_id=user.id)
+    db_app = App(**app.model_dump(), id=uuid4(), user_id=user.id)
+    shard = await shard_router.assign(db_app.id)
+    if shard is shard_router.primary:
+        return await _insert_app(db, db_app)
+    # The placement is committed first; drop it if the app never gets there
+    try:
+        await shard_router.ensure_user(shard, user.id)
+        async with shard.session_maker() as shard_db:
+            return await _insert_app(shard_db, db_app)
+    except Exception:
+        await shard_router.unassign(db_app.id)
+        raise
+
+
+async def _insert_app(db: AsyncSession, db_app: App) -> AppRead:
     db.add(db_app)
     await db.commit()
     await db.refresh(db_app)
@@ -50,7 +97,9 @@ async def get_app(
     user: User = Depends(current_active_user),
 ):
     result = await db.execute(
-        select(App).filter(App.id == app_id, App.user_id == user.id)
+        select(App).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     app = result.scalars().first()
 
@@ -68,7 +117,9 @@ async def update_app(
     user: User = Depends(current_active_user),
 ):
     result = await db.execute(
-        select(App).filter(App.id == app_id, App.user_id == user.id)
+        select(App).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     app = result.scalars().first()
 
@@ -87,18 +138,84 @@ async def update_app(
 @router.delete("/{app_id}")
 async def delete_app(
     app_id: UUID,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
     user: User = Depends(current_active_user),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
 ):
+    """Delete an app and everything in it.
+
+    Small apps are deleted in one statement (the database cascades to threads,
+    messages and subscribers). Larger apps are hidden immediately and purged
+    in the background; the response is 202 with a job id to poll.
+    """
     result = await db.execute(
-        select(App).filter(App.id == app_id, App.user_id == user.id)
+        select(App).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     app = result.scalars().first()
 
     if not app:
         raise HTTPException(status_code=404, detail="ERROR_APP_NOT_FOUND")
 
-    await db.delete(app)
+    threshold = settings.APP_PURGE_SYNC_MAX_MESSAGES
+    if await count_app_messages(db, app.id, threshold + 1) <= threshold:
+        await db.execute(delete(App).where(App.id == app.id))
+        await db.commit()
+        await shard_router.unassign(app.id)
+        return {"message": "ACTION_APP_DELETED"}
+
+    app.deleted_at = datetime.now(timezone.utc)
+    job_id = uuid4()
+    db.add(AppPurgeJob(id=job_id, app_id=app.id, user_id=user.id))
     await db.commit()
+    schedule_app_purge(job_id, session_factory)
+
+    response.status_code = 202
+    return {"message": "ACTION_APP_DELETE_SCHEDULED", "job_id": job_id}
+
+
+@router.get("/purge-jobs/{job_id}", response_model=AppPurgeJobRead)
+async def get_app_purge_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_async_session),
+    user: User = Depends(current_active_user),
+):
+    """Progress of a background app deletion."""
+    result = await db.execute(
+        select(AppPurgeJob).filter(
+            AppPurgeJob.id == job_id, AppPurgeJob.user_id == user.id
+        )
+    )
+    job = result.scalars().first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="ERROR_PURGE_JOB_NOT_FOUND")
 
-    return {"message": "ACTION_APP_DELETED"}
+    return job
+
+
+@router.get("/{app_id}/retention-runs", response_model=list[RetentionRunRead])
+async def list_retention_runs(
+    app_id: UUID,
+    db: AsyncSession = Depends(get_async_session),
+    user: User = Depends(current_active_user),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Recent retention passes over the app, newest first, with throughput."""
+    result = await db.execute(
+        select(App.id).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
+    )
+    if result.scalar() is None:
+        raise HTTPException(status_code=404, detail="ERROR_APP_NOT_FOUND")
+
+    result = await db.execute(
+        select(RetentionRun)
+        .filter(RetentionRun.app_id == app_id)
+        .order_by(RetentionRun.started_at.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
@@ -0,0 +1,70 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_session
+from app.dependencies import get_app_for_request
+from app.models import App
+from app.schemas import AppChangeRead, ChangeFeedPage
+from app.services.change_feed import (
+    current_position,
+    decode_position,
+    encode_position,
+    ensure_retained,
+    read_changes,
+)
+
+router = APIRouter(tags=["changes"])
+
+
+def change_read(row) -> AppChangeRead:
+    return AppChangeRead(
+        position=encode_position(row.tx_id, row.seq),
+        kind=row.kind,
+        entity_id=row.entity_id,
+        thread_id=row.thread_id,
+        created_at=row.created_at,
+    )
+
+
+@router.get("/apps/{app_id}/changes", response_model=ChangeFeedPage)
+async def list_changes(
+    app_id: UUID,
+    since: str | None = Query(
+        None,
+        description='next_since of a previous page, or "now" to start at the end',
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Max changes to return"),
+    db: AsyncSession = Depends(get_async_session),
+    app: App = Depends(get_app_for_request),
+):
+    """
+    List the app's changes after a position, oldest first (incremental sync).
+
+    Kinds: message.created, thread.updated, thread.deleted (its messages are
+    gone too), subscriber.created, subscriber.updated, subscriber.deleted.
+    Entries carry ids only; refetch entities for their current state.
+    Always continue from next_since, also when a page is empty. To build a
+    mirror, take ``since=now`` first, then export, then apply changes from
+    that position (entries already covered by the export are harmless).
+    Entries are kept CHANGE_FEED_RETENTION_DAYS; a ``since`` older than the
+    pruned entries gets 410 ERROR_CHANGE_FEED_EXPIRED, and the mirror must be
+    rebuilt the same way. Without ``since`` the retained entries are listed.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    if since == "now":
+        position = await current_position(db)
+        return ChangeFeedPage(
+            items=[], next_since=encode_position(*position), has_more=False
+        )
+
+    after = decode_position(since) if since else None
+    await ensure_retained(db, app.id, after)
+    rows = await read_changes(db, app.id, after, limit + 1)
+    items = [change_read(row) for row in rows[:limit]]
+    return ChangeFeedPage(
+        items=items,
+        next_since=items[-1].position if items else since,
+        has_more=len(rows) > limit,
+    )
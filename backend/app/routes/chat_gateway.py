@@ -0,0 +1,60 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from starlette.websockets import WebSocketState
+
+from app.database import get_session_factory
+from app.dependencies import get_app_for_request
+from app.models import Thread
+from app.logging_config import get_logger
+from app.services.chat_gateway import ChatGateway
+from app.services.realtime import RealtimeHub, get_realtime_hub
+
+logger = get_logger(__name__)
+
+router = APIRouter(tags=["chat"])
+
+
+@router.websocket("/apps/{app_id}/threads/{thread_id}/ws")
+async def chat_socket(
+    websocket: WebSocket,
+    app_id: UUID,
+    thread_id: UUID,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    hub: RealtimeHub = Depends(get_realtime_hub),
+):
+    """
+    Chat over one WebSocket per thread: send user messages, receive assistant
+    deltas, persisted messages (including agent replies) and status frames.
+
+    Auth: JWT Bearer (or ``?token=`` for browsers) or X-App-Id + X-App-Secret.
+    The handshake is rejected with close code 1008 when auth or the thread
+    check fails. No database session is held while the socket is idle.
+    """
+    async with session_factory() as db:
+        try:
+            app = await get_app_for_request(app_id, websocket, db)
+        except HTTPException as exc:
+            await websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION, reason=str(exc.detail)
+            )
+            return
+        thread_exists = await db.scalar(
+            select(Thread.id).filter(Thread.id == thread_id, Thread.app_id == app.id)
+        )
+    if thread_exists is None:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="ERROR_THREAD_NOT_FOUND"
+        )
+        return
+
+    await websocket.accept()
+    gateway = ChatGateway(websocket, app_id, thread_id, session_factory, hub)
+    try:
+        await gateway.serve()
+    except Exception:
+        logger.exception("Chat socket for thread %s failed", thread_id)
+        if websocket.application_state == WebSocketState.CONNECTED:
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
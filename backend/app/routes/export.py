@@ -0,0 +1,81 @@
+from collections.abc import AsyncIterator
+from typing import Literal
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database import get_session_factory
+from app.dependencies import get_app_for_request
+from app.models import App
+from app.services import columnar_export
+from app.services import export as export_service
+from app.utils import decode_cursor
+
+router = APIRouter(tags=["export"])
+
+_EXPORT_HEADERS = {
+    "Cache-Control": "no-store",
+    "X-Accel-Buffering": "no",
+}
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip" and params.replace(" ", "") != "q=0":
+            return True
+    return False
+
+
+def _ndjson_response(request: Request, lines: AsyncIterator[bytes]):
+    headers = dict(_EXPORT_HEADERS)
+    if _accepts_gzip(request):
+        lines = export_service.gzip_chunks(lines)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/apps/{app_id}/export/{table}")
+async def export_app_data(
+    app_id: UUID,
+    table: Literal["threads", "messages", "subscribers"],
+    request: Request,
+    format: Literal["ndjson", "arrow", "parquet"] = Query(
+        "ndjson", description="ndjson, arrow (IPC stream) or parquet"
+    ),
+    resume_token: str | None = Query(
+        None, description="Checkpoint token from an interrupted NDJSON export"
+    ),
+    app: App = Depends(get_app_for_request),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """
+    Stream every thread, message or subscriber of the app.
+
+    Threads and subscribers are ordered by created_at; messages by thread_id
+    then seq. NDJSON writes one object per line, a ``{"resume_token"}`` line
+    after each batch and ``{"complete": true, "exported": n}`` at the end; it
+    is gzipped when the client sends ``Accept-Encoding: gzip``. ``arrow`` and
+    ``parquet`` stream the same rows as record batches / row groups.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    source = export_service.EXPORT_SOURCES[table]
+    after = decode_cursor(resume_token, source.resume_schema) if resume_token else None
+    if format == "ndjson":
+        return _ndjson_response(
+            request,
+            export_service.export_ndjson(session_factory, table, app_id, after),
+        )
+
+    filename = f"{table}.{columnar_export.FILE_EXTENSIONS[format]}"
+    return StreamingResponse(
+        columnar_export.export_columnar(session_factory, table, app_id, format, after),
+        media_type=columnar_export.MEDIA_TYPES[format],
+        headers={
+            **_EXPORT_HEADERS,
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        },
+    )
@@ -1,16 +1,66 @@
-from uuid import UUID
-from datetime import datetime, timezone
+import asyncio
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.database import User, get_async_session
-from app.dependencies import get_thread_in_app_or_404, get_thread_in_app_with_lock
-from app.models import App, Subscriber, Thread, Message
-from app.schemas import MessageRead, MessageCreate
-from app.services.subscriber_service import resolve_subscriber
+from app.config import settings
+from app.database import User, get_async_session, get_read_session
+from app.dependencies import (
+    get_app_for_request,
+    get_idempotency_request,
+    get_thread_in_app_or_404,
+    get_thread_in_app_with_lock,
+)
+from app.models import App, Thread, Message
+from app.schemas import (
+    CursorPage,
+    MessageBulkCreate,
+    MessageBulkResponse,
+    MessageBulkThreadResult,
+    MessageRead,
+    MessageCreate,
+    MessageSearchHit,
+    row_adapter,
+)
+from app.services.activity_tracker import activity_tracker
+from app.services.change_feed import MESSAGE_CREATED, record_changes
+from app.services.idempotency import IDEMPOTENT_REPLAY_HEADER, IdempotencyRequest
+from app.services.message_partitions import (
+    add_months,
+    ensure_partitions,
+    month_start,
+)
+from app.services.message_search import search_query
+from app.services.message_service import allocate_seq_ranges, persist_user_message
+from app.services.realtime import (
+    RealtimeHub,
+    get_realtime_hub,
+    publish_message_created,
+    publish_threads_updated,
+)
+from app.services.thread_archive import (
+    archived_messages,
+    reads_archive,
+    select_archived,
+)
 from app.users import current_active_user
+from app.utils import (
+    ETAG_CACHE_CONTROL,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    json_response,
+    make_etag,
+    not_modified,
+    parse_datetime,
+    parse_fields,
+    parse_float,
+    parse_uuid,
+)
 
 router = APIRouter(tags=["messages"])
 
@@ -28,7 +78,12 @@ async def get_thread_with_lock(
     result = await db.execute(
         select(Thread)
         .join(App)
-        .filter(Thread.id == thread_id, Thread.app_id == app_id, App.user_id == user.id)
+        .filter(
+            Thread.id == thread_id,
+            Thread.app_id == app_id,
+            App.user_id == user.id,
+            App.deleted_at.is_(None),
+        )
         .with_for_update()  # Lock the thread row
     )
     thread = result.scalars().first()
@@ -51,7 +106,12 @@ async def get_thread_by_id(
     result = await db.execute(
         select(Thread)
         .join(App)
-        .filter(Thread.id == thread_id, Thread.app_id == app_id, App.user_id == user.id)
+        .filter(
+            Thread.id == thread_id,
+            Thread.app_id == app_id,
+            App.user_id == user.id,
+            App.deleted_at.is_(None),
+        )
     )
     thread = result.scalars().first()
 
@@ -67,33 +127,199 @@ async def get_thread_by_id(
 async def list_messages(
     app_id: UUID,
     thread_id: UUID,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
+    read_db: AsyncSession = Depends(get_read_session),
     thread: Thread = Depends(get_thread_in_app_or_404),
+    hub: RealtimeHub = Depends(get_realtime_hub),
     before_seq: int | None = Query(
         None, description="Get messages before this sequence number (cursor pagination)"
     ),
+    after_seq: int | None = Query(
+        None,
+        ge=0,
+        description="Get messages after this sequence number (forward sync)",
+    ),
+    wait: float = Query(
+        0,
+        ge=0,
+        le=settings.MESSAGES_LONG_POLL_MAX_SECONDS,
+        description="With after_seq: seconds to wait for a new message when none is newer",
+    ),
     limit: int = Query(
         50, ge=1, le=200, description="Maximum number of messages to return"
     ),
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return (e.g. id,seq,content)"
+    ),
+    if_none_match: str | None = Header(None),
 ):
     """
     List messages for a thread with cursor-based pagination.
     Messages are ordered by seq ascending (oldest first).
+
+    ``fields`` selects only those columns in SQL (``id`` is always included),
+    so content_json is neither read nor sent unless requested.
+
+    The ETag is derived from the thread's updated_at, next_seq and the bounds
+    moved by retention and archiving (messages_from, archived_seq), so a
+    matching If-None-Match gets a 304 without querying messages (long-polls
+    are not conditional).
+
+    For incremental sync pass the last seen seq as ``after_seq``; with
+    ``wait`` the request is held (up to ``wait`` seconds) until a message
+    arrives when there is nothing newer, then returns it. Waiting requests
+    are woken by the realtime hub and hold no database connection.
+    Plain reads may be served by a read replica, which then also supplies
+    the thread's validator; long-polls use the primary, which the wake-ups
+    come from.
     Auth: JWT Bearer or X-App-Id + X-App-Secret.
     """
 
+    selected = parse_fields(fields, MessageRead)
+    waiting = after_seq is not None and wait > 0
+    if not waiting and read_db is not db:
+        # The validator must come from the database that serves the body: a
+        # lagging replica would send an old page under the primary's ETag
+        replica_thread = (
+            await read_db.execute(
+                select(
+                    Thread.id,
+                    Thread.updated_at,
+                    Thread.next_seq,
+                    Thread.messages_from,
+                    Thread.archived_seq,
+                ).filter(Thread.id == thread_id)
+            )
+        ).first()
+        # A thread the replica has not received yet is read from the primary
+        if replica_thread is not None:
+            thread = replica_thread
+            db = read_db
+    if not waiting:
+        etag = make_etag(
+            "messages",
+            thread_id,
+            thread.updated_at,
+            thread.next_seq,
+            thread.messages_from,
+            thread.archived_seq,
+            before_seq,
+            after_seq,
+            limit,
+            selected,
+        )
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
+    serializer = row_adapter(MessageRead, selected)
+
+    def render(rows) -> Response:
+        body = serializer.dump_json(rows)
+        return json_response(body, response.headers)
+
     # Build query
-    query = select(Message).filter(Message.thread_id == thread_id)
+    columns = selected or tuple(MessageRead.model_fields)
+    query = select(*(getattr(Message, name) for name in columns)).filter(
+        Message.thread_id == thread_id,
+        # Prunes the partitions older than the thread's first message
+        Message.created_at >= thread.messages_from,
+    )
 
     if before_seq is not None:
         query = query.filter(Message.seq < before_seq)
+    if after_seq is not None:
+        query = query.filter(Message.seq > after_seq)
+
+    # Archived seqs all precede the hot ones: the page starts with them
+    archived = []
+    if reads_archive(thread, after_seq):
+        window = select_archived(
+            await archived_messages(db, thread), before_seq, after_seq
+        )
+        archived = [{name: m[name] for name in columns} for m in window[:limit]]
+        if len(archived) == limit:
+            return render(archived)
 
-    query = query.order_by(Message.seq.asc()).limit(limit)
+    query = query.order_by(Message.seq.asc()).limit(limit - len(archived))
 
     result = await db.execute(query)
-    messages = result.scalars().all()
+    messages = archived + [row._asdict() for row in result]
+    if messages or not waiting:
+        return render(messages)
+
+    # Nothing newer: park until the realtime hub reports activity on the
+    # thread. The query is repeated once subscribed, so a message committed
+    # in between is not missed.
+    async with hub.subscribe(app_id, thread_id) as subscription:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            messages = [row._asdict() for row in await db.execute(query)]
+            remaining = deadline - loop.time()
+            if messages or remaining <= 0:
+                return render(messages)
+            # End the read transaction so no connection is held while parked.
+            await db.rollback()
+            try:
+                await asyncio.wait_for(subscription.get(), timeout=remaining)
+            except TimeoutError:
+                return render([])
 
-    return [MessageRead.model_validate(msg) for msg in messages]
+
+@router.get(
+    "/apps/{app_id}/messages/search", response_model=CursorPage[MessageSearchHit]
+)
+async def search_messages(
+    app_id: UUID,
+    db: AsyncSession = Depends(get_async_session),
+    app: App = Depends(get_app_for_request),
+    q: str = Query(
+        ...,
+        min_length=1,
+        max_length=256,
+        description='Search terms ("phrase", or, -not)',
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Max hits to return"),
+    cursor: str | None = Query(None, description="Opaque cursor for pagination"),
+):
+    """
+    Full-text search over the app's message content.
+
+    Hits are ranked by relevance (ts_rank_cd), newest first among equal
+    ranks, and carry the thread id and a snippet with matches wrapped in
+    ``<mark>``. Only the SEARCH_MAX_CANDIDATES newest matching messages are
+    ranked, so very common terms stay cheap on large apps. Messages moved to
+    cold storage (archived threads) are not searched.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    after = None
+    if cursor:
+        after = decode_cursor(
+            cursor,
+            {"rank": parse_float, "created_at": parse_datetime, "id": parse_uuid},
+        )
+
+    result = await db.execute(search_query(app.id, q, limit + 1, after))
+    rows = result.all()
+    visible_rows = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last_row = visible_rows[-1]
+        next_cursor = encode_cursor(
+            {
+                "rank": last_row.rank,
+                "created_at": last_row.created_at,
+                "id": last_row.id,
+            }
+        )
+
+    body = row_adapter(MessageSearchHit, shape="page").dump_json(
+        {"items": [row._asdict() for row in visible_rows], "next_cursor": next_cursor}
+    )
+    return json_response(body)
 
 
 @router.post("/apps/{app_id}/threads/{thread_id}/messages", response_model=MessageRead)
@@ -101,8 +327,10 @@ async def create_message(
     app_id: UUID,
     thread_id: UUID,
     message: MessageCreate,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
     thread: Thread = Depends(get_thread_in_app_with_lock),
+    idempotency: IdempotencyRequest | None = Depends(get_idempotency_request),
 ):
     """
     Append a new user message to the thread.
@@ -114,48 +342,24 @@ async def create_message(
     4. Updates thread.updated_at
 
     This approach guarantees concurrency-safe seq allocation.
+    A retry with the same Idempotency-Key header returns the first response.
     Auth: JWT Bearer or X-App-Id + X-App-Secret.
     """
 
-    # Allocate sequence number
-    allocated_seq = thread.next_seq
-    thread.next_seq += 1
-    thread.updated_at = datetime.now(timezone.utc)
-
-    # Resolve subscriber and update activity
-    subscriber = None
-    if thread.subscriber_id:
-        result = await db.execute(
-            select(Subscriber).filter(Subscriber.id == thread.subscriber_id)
-        )
-        subscriber = result.scalars().first()
-    elif thread.customer_id:
-        subscriber = await resolve_subscriber(
-            db,
-            app_id=thread.app_id,
-            customer_id=thread.customer_id,
-        )
-        thread.subscriber_id = subscriber.id
-
-    if subscriber:
-        now = datetime.now(timezone.utc)
-        subscriber.last_seen_at = now
-        subscriber.last_message_at = now
-
-    # Create message with allocated seq and role="user"
-    db_message = Message(
-        thread_id=thread_id,
-        seq=allocated_seq,
-        role="user",
-        **message.model_dump(),
+    if idempotency:
+        replay = await idempotency.claim(db)
+        if replay is not None:
+            response.headers[IDEMPOTENT_REPLAY_HEADER] = "true"
+            return replay
+
+    return await persist_user_message(
+        thread_id,
+        message.content,
+        db,
+        content_json=message.content_json,
+        idempotency=idempotency,
     )
 
-    db.add(db_message)
-    await db.commit()
-    await db.refresh(db_message)
-
-    return db_message
-
 
 @router.post(
     "/apps/{app_id}/threads/{thread_id}/messages/assistant", response_model=MessageRead
@@ -164,8 +368,10 @@ async def create_assistant_message(
     app_id: UUID,
     thread_id: UUID,
     message: MessageCreate,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
     thread: Thread = Depends(get_thread_in_app_with_lock),
+    idempotency: IdempotencyRequest | None = Depends(get_idempotency_request),
 ):
     """
     Create an agent message (for partner/dashboard replies).
@@ -173,9 +379,16 @@ async def create_assistant_message(
     This allows the business owner (partner) to manually reply as the agent
     through the dashboard UI. The message is created with role="agent" and
     content_json.source="dashboard_agent" for proper attribution.
+    A retry with the same Idempotency-Key header returns the first response.
     Auth: JWT Bearer or X-App-Id + X-App-Secret.
     """
 
+    if idempotency:
+        replay = await idempotency.claim(db)
+        if replay is not None:
+            response.headers[IDEMPOTENT_REPLAY_HEADER] = "true"
+            return replay
+
     # Allocate sequence number
     allocated_seq = thread.next_seq
     thread.next_seq += 1
@@ -188,6 +401,7 @@ async def create_assistant_message(
     # Create message with role="agent" (or "assistant" for compatibility)
     db_message = Message(
         thread_id=thread_id,
+        app_id=app_id,
         seq=allocated_seq,
         role="assistant",  # Keep as "assistant" for OpenAI compatibility
         content=message.content,
@@ -195,16 +409,133 @@ async def create_assistant_message(
     )
 
     db.add(db_message)
+    await db.flush()
+    await publish_message_created(db, app_id, db_message)
+    if idempotency:
+        await idempotency.save(db, MessageRead.model_validate(db_message))
     await db.commit()
     await db.refresh(db_message)
 
     return db_message
 
 
+@router.post("/apps/{app_id}/messages/bulk", response_model=MessageBulkResponse)
+async def bulk_create_messages(
+    app_id: UUID,
+    batch: MessageBulkCreate,
+    db: AsyncSession = Depends(get_async_session),
+    app: App = Depends(get_app_for_request),
+):
+    """
+    Append many messages across one or many threads in a single transaction.
+
+    Intended for importing history or syncing from another channel:
+    1. Reserves a seq range per thread with one UPDATE ... RETURNING
+    2. Inserts all messages with a batched executemany INSERT
+    3. Records subscriber activity once per subscriber (user messages only)
+
+    Messages keep their list order within each thread. Backdated messages
+    get their monthly partitions created first; timestamps in the future,
+    before message retention or spread over more than MESSAGE_BULK_MAX_MONTHS
+    months fail with 422. The whole batch fails with 404 if any thread does
+    not belong to the app.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+
+    now = datetime.now(timezone.utc)
+    counts: dict[UUID, int] = {}
+    earliest: dict[UUID, datetime] = {}
+    for item in batch.messages:
+        counts[item.thread_id] = counts.get(item.thread_id, 0) + 1
+        created_at = item.created_at or now
+        if item.thread_id not in earliest or created_at < earliest[item.thread_id]:
+            earliest[item.thread_id] = created_at
+
+    # Backdated messages may need partitions outside the maintained window;
+    # bound them so one request cannot create partitions without limit
+    months = {
+        month_start(item.created_at) for item in batch.messages if item.created_at
+    }
+    if months:
+        latest = max(item.created_at for item in batch.messages if item.created_at)
+        if latest > now + timedelta(seconds=settings.MESSAGE_BULK_MAX_FUTURE_SECONDS):
+            raise HTTPException(status_code=422, detail="ERROR_CREATED_AT_IN_FUTURE")
+        if settings.MESSAGE_RETENTION_MONTHS > 0 and min(months) < add_months(
+            month_start(now), -settings.MESSAGE_RETENTION_MONTHS
+        ):
+            raise HTTPException(
+                status_code=422, detail="ERROR_CREATED_AT_BEFORE_RETENTION"
+            )
+        if len(months) > settings.MESSAGE_BULK_MAX_MONTHS:
+            raise HTTPException(status_code=422, detail="ERROR_TOO_MANY_MONTHS")
+    await ensure_partitions(db.bind, months)
+    allocations = await allocate_seq_ranges(db, app.id, counts, earliest)
+    if len(allocations) != len(counts):
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="ERROR_THREAD_NOT_FOUND")
+
+    next_seqs = {thread_id: first for thread_id, (first, _) in allocations.items()}
+    subscriber_activity: dict[UUID, datetime] = {}
+    rows = []
+    for item in batch.messages:
+        created_at = item.created_at or now
+        rows.append(
+            {
+                "id": uuid4(),
+                "thread_id": item.thread_id,
+                "app_id": app.id,
+                "seq": next_seqs[item.thread_id],
+                "role": item.role,
+                "content": item.content,
+                "content_json": item.content_json,
+                "created_at": created_at,
+            }
+        )
+        next_seqs[item.thread_id] += 1
+
+        subscriber_id = allocations[item.thread_id][1]
+        if subscriber_id and item.role == "user":
+            latest = subscriber_activity.get(subscriber_id)
+            if latest is None or created_at > latest:
+                subscriber_activity[subscriber_id] = created_at
+
+    await db.execute(insert(Message), rows)
+    await record_changes(
+        db,
+        app.id,
+        [(MESSAGE_CREATED, row["id"], row["thread_id"]) for row in rows],
+        notify=False,
+    )
+    await publish_threads_updated(
+        db,
+        app.id,
+        {
+            thread_id: {"first_seq": first, "last_seq": first + counts[thread_id] - 1}
+            for thread_id, (first, _) in allocations.items()
+        },
+    )
+    await db.commit()
+
+    for subscriber_id, at in subscriber_activity.items():
+        activity_tracker.record(subscriber_id, at)
+
+    return MessageBulkResponse(
+        inserted=len(rows),
+        threads=[
+            MessageBulkThreadResult(
+                thread_id=thread_id,
+                first_seq=first,
+                last_seq=first + counts[thread_id] - 1,
+            )
+            for thread_id, (first, _) in allocations.items()
+        ],
+    )
+
+
 @router.get("/messages/{message_id}", response_model=MessageRead)
 async def get_message(
     message_id: UUID,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
     user: User = Depends(current_active_user),
 ):
     """Get a specific message by ID."""
@@ -212,7 +543,9 @@ async def get_message(
         select(Message)
         .join(Thread)
         .join(App)
-        .filter(Message.id == message_id, App.user_id == user.id)
+        .filter(
+            Message.id == message_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     message = result.scalars().first()
 
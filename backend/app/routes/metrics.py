@@ -0,0 +1,17 @@
+"""Operational metrics of the serving worker."""
+
+from fastapi import APIRouter, Depends
+
+from app.database import User
+from app.schemas import DatabaseMetrics
+from app.services import pool_metrics
+from app.users import current_superuser
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics/database", response_model=DatabaseMetrics)
+async def database_metrics(user: User = Depends(current_superuser)):
+    """Connection pool gauges, checkout waits and connection hold times per
+    route, for the worker that serves the request (superusers only)."""
+    return pool_metrics.snapshot()
@@ -0,0 +1,197 @@
+import asyncio
+import json
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.database import get_session_factory
+from app.dependencies import get_app_for_request, get_thread_in_app_or_404
+from app.models import App, Thread
+from app.routes.changes import change_read
+from app.services.change_feed import (
+    CHANGES_APPENDED,
+    current_position,
+    decode_position,
+    ensure_retained,
+    read_changes,
+)
+from app.services.realtime import RESYNC, RealtimeHub, get_realtime_hub
+
+router = APIRouter(tags=["realtime"])
+
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def _sse_event(event: str, data: str) -> str:
+    """Format a single SSE event."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def event_stream(hub: RealtimeHub, app_id: UUID, thread_id: UUID | None = None):
+    """Yield SSE frames for an app's (or one thread's) realtime events.
+
+    Sends a comment every REALTIME_KEEPALIVE_SECONDS while idle. Ends after a
+    ``resync`` event (client too slow, or the LISTEN connection dropped); the
+    client should refetch and reconnect.
+    """
+    async with hub.subscribe(app_id, thread_id) as subscription:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), timeout=settings.REALTIME_KEEPALIVE_SECONDS
+                )
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event["event"] == CHANGES_APPENDED:
+                continue
+
+            data = dict(event["data"])
+            if "thread_id" in event:
+                data.setdefault("thread_id", event["thread_id"])
+            yield _sse_event(event["event"], json.dumps(data))
+            if event["event"] == RESYNC:
+                return
+
+
+@router.get("/apps/{app_id}/events")
+async def subscribe_app_events(
+    app_id: UUID,
+    app: App = Depends(get_app_for_request),
+    hub: RealtimeHub = Depends(get_realtime_hub),
+):
+    """
+    Stream message.created and thread.updated events for every thread of an app (SSE).
+
+    Replaces polling list endpoints: the connection stays idle until a write
+    commits. No database session is held while streaming.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    await hub.start()
+    return StreamingResponse(
+        event_stream(hub, app.id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+
+@router.get("/apps/{app_id}/threads/{thread_id}/events")
+async def subscribe_thread_events(
+    app_id: UUID,
+    thread_id: UUID,
+    thread: Thread = Depends(get_thread_in_app_or_404),
+    hub: RealtimeHub = Depends(get_realtime_hub),
+):
+    """
+    Stream message.created and thread.updated events for one thread (SSE).
+
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    await hub.start()
+    return StreamingResponse(
+        event_stream(hub, thread.app_id, thread.id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+
+# First retry when a notified commit is not visible in the feed yet (an older
+# write transaction is still running); doubled up to the keepalive interval
+_CHANGE_RETRY_SECONDS = 0.1
+
+
+async def change_stream(
+    hub: RealtimeHub,
+    session_factory: async_sessionmaker,
+    app_id: UUID,
+    after: tuple[int, int] | None,
+):
+    """Yield SSE frames for an app's change feed entries after ``after``.
+
+    Each entry is an event named after its kind, with its position as the
+    event id. The feed is re-read with a short-lived session whenever the app
+    has a realtime event, and at least every REALTIME_KEEPALIVE_SECONDS. On
+    ``resync`` the stream ends; clients reconnect with Last-Event-ID and miss
+    nothing, since the feed itself is durable.
+    """
+    keepalive = settings.REALTIME_KEEPALIVE_SECONDS
+    batch_size = settings.CHANGE_FEED_STREAM_BATCH_SIZE
+    async with hub.subscribe(app_id) as subscription:
+        yield ": connected\n\n"
+        retry: float | None = None
+        while True:
+            async with session_factory() as db:
+                rows = await read_changes(db, app_id, after, batch_size)
+            for row in rows:
+                change = change_read(row)
+                after = (row.tx_id, row.seq)
+                yield (
+                    f"id: {change.position}\nevent: {change.kind}\n"
+                    f"data: {change.model_dump_json()}\n\n"
+                )
+            if len(rows) == batch_size:
+                continue
+            if rows:
+                retry = None
+            elif retry is not None:
+                retry = retry * 2 if retry * 2 < keepalive else None
+
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), timeout=retry or keepalive
+                )
+            except TimeoutError:
+                if retry is None:
+                    yield ": keep-alive\n\n"
+                continue
+            # One re-read covers every event queued so far
+            events = [event]
+            while not subscription.queue.empty():
+                events.append(subscription.queue.get_nowait())
+            if any(e["event"] == RESYNC for e in events):
+                return
+            retry = _CHANGE_RETRY_SECONDS
+
+
+@router.get("/apps/{app_id}/changes/stream")
+async def stream_changes(
+    app_id: UUID,
+    since: str | None = Query(
+        None, description='Position to start after, or "now" (default: beginning)'
+    ),
+    last_event_id: str | None = Header(None),
+    app: App = Depends(get_app_for_request),
+    hub: RealtimeHub = Depends(get_realtime_hub),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """
+    Tail the app's change feed (SSE); see GET /apps/{app_id}/changes.
+
+    Event ids are feed positions, so a reconnecting EventSource resumes from
+    Last-Event-ID (which takes precedence over ``since``). A position older
+    than the pruned entries gets 410 ERROR_CHANGE_FEED_EXPIRED. No database
+    session is held while idle.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    since = last_event_id or since
+    if since == "now":
+        async with session_factory() as db:
+            after = await current_position(db)
+    else:
+        after = decode_position(since) if since else None
+        async with session_factory() as db:
+            await ensure_retained(db, app.id, after)
+    await hub.start()
+    return StreamingResponse(
+        change_stream(hub, session_factory, app.id, after),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
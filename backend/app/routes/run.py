@@ -1,18 +1,36 @@
-"""Run endpoints: sync (POST /run) and streaming (GET /run/stream)."""
+"""Run endpoints: sync (POST /run), streaming (GET /run/stream) and bulk (POST /run/bulk)."""
 
+import asyncio
 import json
+from collections.abc import Sequence
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import StreamingResponse
+from sqlalchemy import true
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
 
 from app.database import User, get_async_session, get_session_factory
+from app.dependencies import get_app_or_404, get_idempotency_request
 from app.models import App, Thread, Message
-from app.schemas import MessageRead, RunResponse
-from app.services.message_service import persist_assistant_message
+from app.schemas import (
+    BulkRunItem,
+    BulkRunRequest,
+    MessageRead,
+    RunResponse,
+    RunResult,
+)
+from app.services.idempotency import IDEMPOTENT_REPLAY_HEADER, IdempotencyRequest
+from app.services.message_service import (
+    HISTORY_LIMIT,
+    get_history,
+    persist_assistant_message,
+    persist_assistant_messages,
+)
 from app.services.orchestrator import ChatOrchestrator
+from app.services.thread_archive import archived_messages
 from app.users import current_active_user
 from app.logging_config import get_logger
 
@@ -20,7 +38,8 @@ logger = get_logger(__name__)
 
 router = APIRouter(tags=["run"])
 
-_HISTORY_LIMIT = 10
+# Threads whose context is loaded (and whose replies are inserted) per round trip
+_BULK_CHUNK_SIZE = 200
 
 
 async def _get_thread_with_app(
@@ -31,7 +50,9 @@ async def _get_thread_with_app(
 ) -> tuple[App, Thread]:
     """Load app and thread, verifying ownership."""
     app_result = await db.execute(
-        select(App).filter(App.id == app_id, App.user_id == user.id)
+        select(App).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     app = app_result.scalars().first()
     if not app:
@@ -47,28 +68,35 @@ async def _get_thread_with_app(
     return app, thread
 
 
-async def _get_last_user_message(thread_id: UUID, db: AsyncSession) -> Message | None:
-    """Get the most recent user message in the thread."""
+def _last_archived_user_message(archived: Sequence[dict]) -> Message | None:
+    for message in reversed(archived):
+        if message["role"] == "user":
+            return Message(**message)
+    return None
+
+
+async def _get_last_user_message(thread: Thread, db: AsyncSession) -> Message | None:
+    """Get the most recent user message in the thread, hot or archived."""
     result = await db.execute(
         select(Message)
-        .filter(Message.thread_id == thread_id, Message.role == "user")
+        .filter(Message.thread_id == thread.id, Message.role == "user")
         .order_by(Message.seq.desc())
         .limit(1)
     )
-    return result.scalars().first()
+    message = result.scalars().first()
+    if message is None and thread.archived_seq is not None:
+        message = _last_archived_user_message(await archived_messages(db, thread))
+    return message
 
 
-async def _get_history(thread_id: UUID, db: AsyncSession) -> list[Message]:
-    """Get the last N messages for history_tail."""
-    result = await db.execute(
-        select(Message)
-        .filter(Message.thread_id == thread_id)
-        .order_by(Message.seq.desc())
-        .limit(_HISTORY_LIMIT)
-    )
-    messages = list(result.scalars().all())
-    messages.reverse()  # Oldest first
-    return messages
+def _reply_content_json(result: RunResult) -> dict:
+    """Build the assistant message content_json (source metadata) for a run result."""
+    content_json = {}
+    if result.metadata:
+        content_json["source"] = result.source
+        if "reason" in result.metadata:
+            content_json["reason"] = result.metadata["reason"]
+    return content_json
 
 
 # --- Sync endpoint ---
@@ -78,44 +106,71 @@ async def _get_history(thread_id: UUID, db: AsyncSession) -> list[Message]:
 async def run_sync(
     app_id: UUID,
     thread_id: UUID,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
     user: User = Depends(current_active_user),
+    idempotency: IdempotencyRequest | None = Depends(get_idempotency_request),
 ):
-    """Run the orchestrator synchronously and return JSON result."""
+    """Run the orchestrator synchronously and return JSON result.
+
+    With an Idempotency-Key header, a retry returns the first completed result
+    without calling the partner again. The key is claimed and committed before
+    the partner call, so a duplicate sent meanwhile gets 409 instead of waiting
+    on the row lock. Failed runs release the key.
+    """
     app, thread = await _get_thread_with_app(app_id, thread_id, db, user)
 
-    last_msg = await _get_last_user_message(thread_id, db)
-    if not last_msg:
-        raise HTTPException(status_code=400, detail="ERROR_NO_USER_MESSAGES")
+    if idempotency:
+        replay = await idempotency.claim(db)
+        if replay is not None:
+            response.headers[IDEMPOTENT_REPLAY_HEADER] = "true"
+            return replay
 
-    history = await _get_history(thread_id, db)
+    try:
+        last_msg = await _get_last_user_message(thread, db)
+        if not last_msg:
+            raise HTTPException(status_code=400, detail="ERROR_NO_USER_MESSAGES")
 
-    result = await ChatOrchestrator.run(
-        app, thread, last_msg.content or "", message=last_msg, history=history
-    )
+        history = await get_history(thread_id, db)
+        # Make the claim visible and end the read transaction; no connection
+        # is held idle in transaction while the partner answers
+        await db.commit()
 
-    if result.reply_text is None:
-        return RunResponse(
-            status="error",
-            assistant_message=None,
-            error=result.metadata.get("error", "ERROR_NO_REPLY"),
+        result = await ChatOrchestrator.run(
+            app, thread, last_msg.content or "", message=last_msg, history=history
         )
 
-    # Build content_json with source metadata
-    content_json = {}
-    if result.metadata:
-        content_json["source"] = result.source
-        if "reason" in result.metadata:
-            content_json["reason"] = result.metadata["reason"]
-
-    # Persist assistant message
-    msg = await persist_assistant_message(
-        thread, result.reply_text, db, content_json=content_json
-    )
-    return RunResponse(
-        status="completed",
-        assistant_message=MessageRead.model_validate(msg),
-    )
+        if result.reply_text is None:
+            if idempotency:
+                await idempotency.release(db)
+            return RunResponse(
+                status="error",
+                assistant_message=None,
+                error=result.metadata.get("error", "ERROR_NO_REPLY"),
+            )
+
+        # The key's response commits with the reply, so a crash in between
+        # cannot leave a reply without a stored response
+        msg = await persist_assistant_message(
+            thread,
+            result.reply_text,
+            db,
+            content_json=_reply_content_json(result),
+            commit=False,
+        )
+        run_response = RunResponse(
+            status="completed",
+            assistant_message=MessageRead.model_validate(msg),
+        )
+        if idempotency:
+            await idempotency.save(db, run_response)
+        await db.commit()
+    except BaseException:
+        if idempotency:
+            await db.rollback()
+            await idempotency.release(db)
+        raise
+    return run_response
 
 
 # --- SSE streaming endpoint ---
@@ -137,11 +192,11 @@ async def run_stream(
     """
     app, thread = await _get_thread_with_app(app_id, thread_id, db, user)
 
-    last_msg = await _get_last_user_message(thread_id, db)
+    last_msg = await _get_last_user_message(thread, db)
     if not last_msg:
         raise HTTPException(status_code=400, detail="ERROR_NO_USER_MESSAGES")
 
-    history = await _get_history(thread_id, db)
+    history = await get_history(thread_id, db)
 
     async def event_generator():
         full_text = ""
@@ -212,6 +267,230 @@ async def run_stream(
     )
 
 
+# --- Bulk NDJSON endpoint ---
+
+
+def _ranked_messages(thread_ids: Sequence[UUID], limit: int, *criteria):
+    """Select the newest ``limit`` messages per thread in one query (oldest first).
+
+    A LATERAL ``ORDER BY seq DESC LIMIT`` per thread reads only the rows it
+    returns, and Thread.messages_from skips the partitions older than the
+    thread (as get_history does).
+    """
+    newest = (
+        select(Message)
+        .where(
+            Message.thread_id == Thread.id,
+            Message.created_at >= Thread.messages_from,
+            *criteria,
+        )
+        .order_by(Message.seq.desc())
+        .limit(limit)
+        .lateral("newest")
+    )
+    newest_message = aliased(Message, newest)
+    return (
+        select(newest_message)
+        .select_from(Thread)
+        .join(newest, true())
+        .filter(Thread.id.in_(thread_ids))
+        .order_by(newest_message.thread_id, newest_message.seq)
+    )
+
+
+async def _load_bulk_contexts(
+    app_id: UUID, thread_ids: Sequence[UUID], db: AsyncSession
+) -> tuple[list[Thread], dict[UUID, Message], dict[UUID, list[Message]]]:
+    """Load threads, last user message and history for many threads set-wise.
+
+    Archived threads whose hot messages come short are filled up from their
+    archive, one (cached) archive read per such thread.
+    """
+    thread_result = await db.execute(
+        select(Thread).filter(Thread.app_id == app_id, Thread.id.in_(thread_ids))
+    )
+    threads = list(thread_result.scalars().all())
+
+    last_result = await db.execute(
+        _ranked_messages(thread_ids, 1, Message.role == "user")
+    )
+    last_user = {msg.thread_id: msg for msg in last_result.scalars().all()}
+
+    history: dict[UUID, list[Message]] = {}
+    history_result = await db.execute(_ranked_messages(thread_ids, HISTORY_LIMIT))
+    for msg in history_result.scalars().all():
+        history.setdefault(msg.thread_id, []).append(msg)
+
+    for thread in threads:
+        hot = history.get(thread.id, [])
+        if thread.archived_seq is None or (
+            thread.id in last_user and len(hot) >= HISTORY_LIMIT
+        ):
+            continue
+        archived = await archived_messages(db, thread)
+        if thread.id not in last_user:
+            message = _last_archived_user_message(archived)
+            if message is not None:
+                last_user[thread.id] = message
+        missing = HISTORY_LIMIT - len(hot)
+        if missing > 0 and archived:
+            history[thread.id] = [Message(**m) for m in archived[-missing:]] + hot
+
+    return threads, last_user, history
+
+
+def _ndjson_line(item: BulkRunItem) -> str:
+    return item.model_dump_json() + "\n"
+
+
+@router.post("/apps/{app_id}/run/bulk")
+async def run_bulk(
+    app_id: UUID,
+    body: BulkRunRequest,
+    app: App = Depends(get_app_or_404),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """Run the orchestrator for many threads and stream results as NDJSON.
+
+    Thread context is loaded in set-based queries per chunk, webhook calls
+    fan out with at most ``concurrency`` in flight, and replies are persisted
+    with one multi-row insert per chunk. No transaction is open while the
+    webhook calls run. Each output line is a BulkRunItem; a thread deleted
+    during its call gets ERROR_THREAD_NOT_FOUND.
+    """
+
+    async def run_one(
+        semaphore: asyncio.Semaphore,
+        thread: Thread,
+        last_msg: Message,
+        history: list[Message],
+    ) -> tuple[Thread, RunResult]:
+        async with semaphore:
+            try:
+                result = await ChatOrchestrator.run(
+                    app,
+                    thread,
+                    last_msg.content or "",
+                    message=last_msg,
+                    history=history,
+                )
+            except Exception:
+                logger.exception("Bulk run failed for thread %s", thread.id)
+                result = RunResult(metadata={"error": "ERROR_INTERNAL"})
+        return thread, result
+
+    async def ndjson_generator():
+        semaphore = asyncio.Semaphore(body.concurrency)
+
+        # Dedicated session: the DI session is closed before streaming starts.
+        async with session_factory() as stream_db:
+            if body.thread_ids is not None:
+                thread_ids = list(dict.fromkeys(body.thread_ids))
+            else:
+                query = select(Thread.id).filter(Thread.app_id == app.id)
+                if body.filter.status:
+                    query = query.filter(Thread.status == body.filter.status)
+                if body.filter.customer_id:
+                    query = query.filter(Thread.customer_id == body.filter.customer_id)
+                id_result = await stream_db.execute(query.order_by(Thread.id))
+                thread_ids = list(id_result.scalars().all())
+
+            for start in range(0, len(thread_ids), _BULK_CHUNK_SIZE):
+                chunk = thread_ids[start : start + _BULK_CHUNK_SIZE]
+                threads, last_user, history = await _load_bulk_contexts(
+                    app.id, chunk, stream_db
+                )
+                # End the read transaction before the webhook calls: no
+                # connection or snapshot is held while partners answer. The
+                # loaded context stays usable detached.
+                stream_db.expunge_all()
+                await stream_db.commit()
+
+                found = {thread.id for thread in threads}
+                for thread_id in chunk:
+                    if thread_id not in found:
+                        yield _ndjson_line(
+                            BulkRunItem(
+                                thread_id=thread_id,
+                                status="error",
+                                error="ERROR_THREAD_NOT_FOUND",
+                            )
+                        )
+
+                tasks = []
+                for thread in threads:
+                    last_msg = last_user.get(thread.id)
+                    if not last_msg:
+                        yield _ndjson_line(
+                            BulkRunItem(
+                                thread_id=thread.id,
+                                status="error",
+                                error="ERROR_NO_USER_MESSAGES",
+                            )
+                        )
+                        continue
+                    tasks.append(
+                        asyncio.create_task(
+                            run_one(
+                                semaphore,
+                                thread,
+                                last_msg,
+                                history.get(thread.id, []),
+                            )
+                        )
+                    )
+
+                replies = []
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        thread, result = await next_done
+                        if result.reply_text is None:
+                            yield _ndjson_line(
+                                BulkRunItem(
+                                    thread_id=thread.id,
+                                    status="error",
+                                    error=result.metadata.get(
+                                        "error", "ERROR_NO_REPLY"
+                                    ),
+                                )
+                            )
+                            continue
+                        replies.append(
+                            (thread.id, result.reply_text, _reply_content_json(result))
+                        )
+                finally:
+                    # Client went away mid-chunk: don't leave webhook calls running.
+                    for task in tasks:
+                        task.cancel()
+
+                messages = await persist_assistant_messages(replies, stream_db)
+                for msg in messages:
+                    yield _ndjson_line(
+                        BulkRunItem(
+                            thread_id=msg.thread_id,
+                            status="completed",
+                            assistant_message=MessageRead.model_validate(msg),
+                        )
+                    )
+                # Threads deleted while their webhook call ran get no reply
+                persisted = {msg.thread_id for msg in messages}
+                for thread_id, _, _ in replies:
+                    if thread_id not in persisted:
+                        yield _ndjson_line(
+                            BulkRunItem(
+                                thread_id=thread_id,
+                                status="error",
+                                error="ERROR_THREAD_NOT_FOUND",
+                            )
+                        )
+
+    return StreamingResponse(
+        ndjson_generator(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def _sse_event(event: str, data: str) -> str:
     """Format a single SSE event."""
     return f"event: {event}\ndata: {data}\n\n"
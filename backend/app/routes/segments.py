@@ -0,0 +1,85 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import get_async_session
+from app.dependencies import get_app_for_request, get_segment_in_app_or_404
+from app.models import App, SubscriberSegment
+from app.schemas import SegmentCreate, SegmentRead
+from app.services import segments as segment_service
+
+router = APIRouter(tags=["segments"])
+
+
+@router.get("/apps/{app_id}/segments", response_model=list[SegmentRead])
+async def list_segments(
+    app_id: UUID,
+    db: AsyncSession = Depends(get_async_session),
+    app: App = Depends(get_app_for_request),
+):
+    """List the app's saved segments with cached member counts."""
+    result = await db.execute(
+        select(SubscriberSegment)
+        .filter(SubscriberSegment.app_id == app.id)
+        .order_by(SubscriberSegment.created_at)
+    )
+    return result.scalars().all()
+
+
+@router.post("/apps/{app_id}/segments", response_model=SegmentRead)
+async def create_segment(
+    app_id: UUID,
+    payload: SegmentCreate,
+    db: AsyncSession = Depends(get_async_session),
+    app: App = Depends(get_app_for_request),
+):
+    """
+    Save a subscriber metadata filter as a segment and count its members.
+
+    The count is kept current as subscribers are imported, created and
+    deleted. Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    segment = SubscriberSegment(
+        app_id=app.id,
+        name=payload.name,
+        filter_json=payload.filter_json.model_dump(exclude_none=True),
+        matches_empty=await segment_service.matches_empty(db, payload.filter_json),
+    )
+    await segment_service.refresh_segment(db, segment)
+    db.add(segment)
+    await db.commit()
+    await db.refresh(segment)
+    return segment
+
+
+@router.get("/apps/{app_id}/segments/{segment_id}", response_model=SegmentRead)
+async def get_segment(
+    segment: SubscriberSegment = Depends(get_segment_in_app_or_404),
+):
+    """Get a segment with its cached member count."""
+    return segment
+
+
+@router.post("/apps/{app_id}/segments/{segment_id}/refresh", response_model=SegmentRead)
+async def refresh_segment(
+    db: AsyncSession = Depends(get_async_session),
+    segment: SubscriberSegment = Depends(get_segment_in_app_or_404),
+):
+    """Recount a segment's members from scratch."""
+    await segment_service.refresh_segment(db, segment)
+    await db.commit()
+    await db.refresh(segment)
+    return segment
+
+
+@router.delete("/apps/{app_id}/segments/{segment_id}")
+async def delete_segment(
+    db: AsyncSession = Depends(get_async_session),
+    segment: SubscriberSegment = Depends(get_segment_in_app_or_404),
+):
+    """Delete a saved segment (its subscribers are not affected)."""
+    await db.delete(segment)
+    await db.commit()
+    return {"message": "ACTION_SEGMENT_DELETED"}
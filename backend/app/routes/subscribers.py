@@ -1,22 +1,41 @@
 from __future__ import annotations
 
+import io
+import json
+from collections.abc import AsyncIterator
 from datetime import datetime, timezone
+from tempfile import SpooledTemporaryFile
+from typing import Any, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func, literal
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
 
-from app.database import get_async_session
+from app.database import get_async_session, get_read_session, get_session_factory
 from app.dependencies import get_app_for_request, get_subscriber_in_app_or_404
-from app.models import App, Message, Subscriber, Thread
-from app.schemas import CursorPage, SubscriberRead, SubscriberSummary, ThreadSummary
+from app.models import App, ArchivedThread, Message, Subscriber, Thread
+from app.schemas import (
+    CursorPage,
+    SubscriberFilter,
+    SubscriberRead,
+    SubscriberSummary,
+    ThreadSummary,
+    row_adapter,
+)
+from app.services import segments as segment_service
+from app.services import subscriber_import
+from app.services.thread_archive import archived_messages
 from app.utils import (
     build_desc_pagination_filter,
     decode_cursor,
     encode_cursor,
+    json_response,
     parse_datetime,
+    parse_fields,
     parse_uuid,
 )
 
@@ -24,6 +43,13 @@ router = APIRouter(tags=["subscribers"])
 
 _DEFAULT_ACTIVITY = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
+# Summary fields computed from joined rows rather than read from a column
+_SUBSCRIBER_COMPUTED = ("thread_count", "last_message_preview")
+_THREAD_COMPUTED = ("message_count", "last_message_at", "last_message_preview")
+
+# Import uploads larger than this are spooled to a temporary file
+_IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
 
 def _subscriber_cursor_schema() -> dict[str, any]:
     return {
@@ -33,24 +59,123 @@ def _subscriber_cursor_schema() -> dict[str, any]:
     }
 
 
+async def _metadata_conditions(
+    db: AsyncSession,
+    app_id: UUID,
+    metadata: str | None,
+    metadata_path: str | None,
+    segment_id: UUID | None,
+) -> list:
+    """SQL conditions for list_subscribers' metadata and segment filters."""
+    conditions = []
+    if metadata is not None or metadata_path is not None:
+        try:
+            contained = json.loads(metadata) if metadata is not None else None
+            if contained is not None and not isinstance(contained, dict):
+                raise ValueError("metadata filter must be a JSON object")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ERROR_INVALID_METADATA_FILTER")
+        subscriber_filter = SubscriberFilter(
+            metadata=contained, metadata_path=metadata_path
+        )
+        if metadata_path is not None:
+            await segment_service.matches_empty(db, subscriber_filter)  # validates
+        conditions += segment_service.filter_conditions(subscriber_filter)
+    if segment_id is not None:
+        segment = await segment_service.get_segment(db, app_id, segment_id)
+        if not segment:
+            raise HTTPException(status_code=404, detail="ERROR_SEGMENT_NOT_FOUND")
+        conditions += segment_service.filter_conditions(
+            SubscriberFilter.model_validate(segment.filter_json)
+        )
+    return conditions
+
+
+async def _archived_previews(db: AsyncSession, items: list[dict[str, Any]]) -> None:
+    """Fill the preview of subscribers without hot messages from the archive
+    of their most recently updated thread."""
+    ids = [item["id"] for item in items if item["last_message_preview"] is None]
+    if not ids:
+        return
+    other = aliased(Thread)
+    has_hot = (
+        select(other.id)
+        .where(
+            other.subscriber_id == Subscriber.id,
+            other.next_seq - 1 > func.coalesce(other.archived_seq, 0),
+        )
+        .exists()
+    )
+    threads = (
+        await db.execute(
+            select(
+                Thread.subscriber_id,
+                Thread.id,
+                Thread.archived_seq,
+                Thread.messages_from,
+            )
+            .join(Subscriber, Subscriber.id == Thread.subscriber_id)
+            .filter(
+                Thread.subscriber_id.in_(ids),
+                Thread.archived_seq.is_not(None),
+                ~has_hot,
+            )
+            .order_by(Thread.subscriber_id, Thread.updated_at.desc())
+            .distinct(Thread.subscriber_id)
+        )
+    ).all()
+    previews = {}
+    for thread in threads:
+        archived = await archived_messages(db, thread)
+        if archived:
+            previews[thread.subscriber_id] = archived[-1]["content"]
+    for item in items:
+        if item["id"] in previews:
+            item["last_message_preview"] = previews[item["id"]]
+
+
 @router.get("/apps/{app_id}/subscribers", response_model=CursorPage[SubscriberSummary])
 async def list_subscribers(
     app_id: UUID,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_read_session),
     app: App = Depends(get_app_for_request),
     limit: int = Query(25, ge=1, le=200, description="Max items to return"),
     cursor: str | None = Query(None, description="Opaque cursor for pagination"),
     q: str | None = Query(None, description="Search customer_id and display_name"),
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return (e.g. id,customer_id)"
+    ),
+    metadata: str | None = Query(
+        None, description='JSON object metadata must contain, e.g. {"plan":"pro"}'
+    ),
+    metadata_path: str | None = Query(
+        None,
+        min_length=1,
+        max_length=1000,
+        description="jsonpath predicate, e.g. $.score > 50",
+    ),
+    segment_id: UUID | None = Query(None, description="Only this segment's members"),
 ):
     """
     List subscribers for an app with pagination.
 
     Returns subscribers ordered by last_message_at DESC (most recent first),
-    with thread count and optional last message preview.
+    with thread count and optional last message preview (the newest hot
+    message; for a subscriber whose messages are all archived, the last
+    message of their most recently updated thread). With ``fields``
+    only those columns are read, and the thread count / preview subqueries
+    run only when requested; metadata_json is never loaded for lists.
+    ``metadata`` (containment), ``metadata_path`` (jsonpath) and
+    ``segment_id`` (a saved filter) narrow the list by metadata.
     Auth: JWT Bearer or X-App-Id + X-App-Secret (app webhook secret).
     """
 
     limit = min(limit, 200)
+    metadata_conditions = await _metadata_conditions(
+        db, app_id, metadata, metadata_path, segment_id
+    )
+    selected = parse_fields(fields, SubscriberSummary)
+    names = selected or tuple(SubscriberSummary.model_fields)
 
     activity_expr = func.coalesce(
         Subscriber.last_message_at, literal(_DEFAULT_ACTIVITY)
@@ -66,17 +191,23 @@ async def list_subscribers(
         .label("last_message_preview")
     )
 
-    query = (
-        select(
-            Subscriber,
-            func.count(Thread.id).label("thread_count"),
-            last_preview,
-            activity_expr,
-        )
-        .outerjoin(Thread, Thread.subscriber_id == Subscriber.id)
-        .filter(Subscriber.app_id == app_id)
-        .group_by(Subscriber.id)
+    # Cursor columns are always read, even when not returned
+    columns = {
+        name: getattr(Subscriber, name)
+        for name in (*names, "created_at", "id")
+        if name not in _SUBSCRIBER_COMPUTED
+    }
+    query = select(*columns.values(), activity_expr).filter(
+        Subscriber.app_id == app_id, *metadata_conditions
     )
+    if "thread_count" in names:
+        query = (
+            query.add_columns(func.count(Thread.id).label("thread_count"))
+            .outerjoin(Thread, Thread.subscriber_id == Subscriber.id)
+            .group_by(Subscriber.id)
+        )
+    if "last_message_preview" in names:
+        query = query.add_columns(last_preview)
 
     # Apply search filter
     if q:
@@ -109,22 +240,9 @@ async def list_subscribers(
     has_more = len(rows) > limit
     visible_rows = rows[:limit]
 
-    items = []
-    for row in visible_rows:
-        subscriber = row.Subscriber
-        items.append(
-            SubscriberSummary(
-                id=subscriber.id,
-                app_id=subscriber.app_id,
-                customer_id=subscriber.customer_id,
-                display_name=subscriber.display_name,
-                created_at=subscriber.created_at,
-                last_seen_at=subscriber.last_seen_at,
-                last_message_at=subscriber.last_message_at,
-                thread_count=row.thread_count,
-                last_message_preview=row.last_message_preview,
-            )
-        )
+    items = [row._asdict() for row in visible_rows]
+    if "last_message_preview" in names:
+        await _archived_previews(db, items)
 
     next_cursor = None
     if has_more and visible_rows:
@@ -132,12 +250,70 @@ async def list_subscribers(
         next_cursor = encode_cursor(
             {
                 "activity_at": last_row.activity_at,
-                "created_at": last_row.Subscriber.created_at,
-                "id": last_row.Subscriber.id,
+                "created_at": last_row.created_at,
+                "id": last_row.id,
             }
         )
 
-    return CursorPage(items=items, next_cursor=next_cursor)
+    body = row_adapter(SubscriberSummary, selected, shape="page").dump_json(
+        {"items": items, "next_cursor": next_cursor}
+    )
+    return json_response(body)
+
+
+async def _import_events(
+    events: AsyncIterator[dict[str, Any]], upload: SpooledTemporaryFile
+) -> AsyncIterator[bytes]:
+    try:
+        async for event in events:
+            yield json.dumps(event).encode() + b"\n"
+    finally:
+        upload.close()
+
+
+@router.post("/apps/{app_id}/subscribers/import")
+async def import_subscribers(
+    app_id: UUID,
+    request: Request,
+    format: Literal["csv", "ndjson"] | None = Query(
+        None, description="csv or ndjson (default: from Content-Type)"
+    ),
+    app: App = Depends(get_app_for_request),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    """
+    Create or update subscribers in bulk from a CSV or NDJSON request body.
+
+    Rows carry customer_id, optional display_name and optional metadata_json
+    (a JSON object; JSON text in CSV). Rows are merged on (app_id,
+    customer_id): a given display_name replaces the stored one and
+    metadata_json keys are merged into the stored metadata. The response is an
+    NDJSON stream of ``{"error": {"line", "message"}}`` per rejected row,
+    ``{"progress": {...}}`` after each committed batch and a final
+    ``{"complete": true, "processed", "inserted", "updated", "failed"}``.
+    Auth: JWT Bearer or X-App-Id + X-App-Secret.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if content_type.startswith("text/csv") else "ndjson"
+
+    upload = SpooledTemporaryFile(max_size=_IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    upload.seek(0)
+    lines = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    try:
+        records = subscriber_import.read_records(lines, format)
+    except subscriber_import.ImportHeaderError:
+        upload.close()
+        raise HTTPException(status_code=400, detail="ERROR_INVALID_IMPORT_HEADER")
+
+    events = subscriber_import.import_subscribers(session_factory, app_id, records)
+    return StreamingResponse(
+        _import_events(events, upload),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/apps/{app_id}/subscribers/{subscriber_id}", response_model=SubscriberRead)
@@ -162,16 +338,24 @@ async def list_subscriber_threads(
     subscriber: Subscriber = Depends(get_subscriber_in_app_or_404),
     limit: int = Query(25, ge=1, le=200, description="Max items to return"),
     cursor: str | None = Query(None, description="Opaque cursor for pagination"),
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return (e.g. id,title)"
+    ),
 ):
     """
     List threads for a subscriber with pagination.
 
     Returns threads ordered by updated_at DESC (most recent first),
-    with message count and optional last message preview.
+    with message count and optional last message preview. With ``fields``
+    the message join and preview subquery run only when requested. Archived
+    messages count, and a thread whose messages are all archived takes
+    last_message_at and the preview from its archive.
     Auth: JWT Bearer or X-App-Id + X-App-Secret.
     """
 
     limit = min(limit, 200)
+    selected = parse_fields(fields, ThreadSummary)
+    names = selected or tuple(ThreadSummary.model_fields)
 
     last_preview = (
         select(Message.content)
@@ -183,21 +367,43 @@ async def list_subscriber_threads(
         .label("last_message_preview")
     )
 
+    archived_count = (
+        select(ArchivedThread.message_count)
+        .where(ArchivedThread.thread_id == Thread.id)
+        .correlate(Thread)
+        .scalar_subquery()
+    )
+
+    # Cursor columns are always read, even when not returned; the archive
+    # state only when a computed field may come from the archive
+    computed = [name for name in names if name in _THREAD_COMPUTED]
+    hidden = ("archived_seq", "messages_from", "next_seq") if computed else ()
+    columns = {
+        name: getattr(Thread, name)
+        for name in (*names, "updated_at", "id", *hidden)
+        if name not in _THREAD_COMPUTED
+    }
     query = (
-        select(
-            Thread,
-            func.count(Message.id).label("message_count"),
-            func.max(Message.created_at).label("last_message_at"),
-            last_preview,
-        )
-        .outerjoin(Message, Message.thread_id == Thread.id)
+        select(*columns.values())
         .filter(
             Thread.app_id == app_id,
             Thread.subscriber_id == subscriber_id,
         )
-        .group_by(Thread.id)
         .order_by(Thread.updated_at.desc(), Thread.id.desc())
     )
+    if "message_count" in names or "last_message_at" in names:
+        query = (
+            query.add_columns(
+                (func.count(Message.id) + func.coalesce(archived_count, 0)).label(
+                    "message_count"
+                ),
+                func.max(Message.created_at).label("last_message_at"),
+            )
+            .outerjoin(Message, Message.thread_id == Thread.id)
+            .group_by(Thread.id)
+        )
+    if "last_message_preview" in names:
+        query = query.add_columns(last_preview)
 
     if cursor:
         cursor_data = decode_cursor(
@@ -218,33 +424,28 @@ async def list_subscriber_threads(
     has_more = len(rows) > limit
     visible_rows = rows[:limit]
 
-    items = []
-    for row in visible_rows:
-        thread = row.Thread
-        items.append(
-            ThreadSummary(
-                id=thread.id,
-                app_id=thread.app_id,
-                subscriber_id=thread.subscriber_id,
-                title=thread.title,
-                status=thread.status,
-                customer_id=thread.customer_id,
-                created_at=thread.created_at,
-                updated_at=thread.updated_at,
-                message_count=row.message_count,
-                last_message_at=row.last_message_at,
-                last_message_preview=row.last_message_preview,
-            )
-        )
+    items = [row._asdict() for row in visible_rows]
+    for row, item in zip(visible_rows, items):
+        # No hot messages since archiving: the archive holds the last message
+        if computed and (
+            row.archived_seq is not None and row.archived_seq >= row.next_seq - 1
+        ):
+            archived = await archived_messages(db, row)
+            if archived:
+                item["last_message_at"] = archived[-1]["created_at"]
+                item["last_message_preview"] = archived[-1]["content"]
 
     next_cursor = None
     if has_more and visible_rows:
         last_row = visible_rows[-1]
         next_cursor = encode_cursor(
             {
-                "updated_at": last_row.Thread.updated_at,
-                "id": last_row.Thread.id,
+                "updated_at": last_row.updated_at,
+                "id": last_row.id,
             }
         )
 
-    return CursorPage(items=items, next_cursor=next_cursor)
+    body = row_adapter(ThreadSummary, selected, shape="page").dump_json(
+        {"items": items, "next_cursor": next_cursor}
+    )
+    return json_response(body)
@@ -3,16 +3,16 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import func, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
-from app.database import User, get_async_session
-from app.dependencies import get_app_for_request
+from app.database import User, get_async_session, get_read_session
+from app.dependencies import get_app_for_request, get_idempotency_request
 from app.i18n import t
-from app.models import App, Subscriber, Thread
+from app.models import App, Message, Subscriber, Thread
 from app.schemas import (
     CursorPage,
     MessageRead,
@@ -20,15 +20,29 @@ from app.schemas import (
     ThreadCreateResponse,
     ThreadRead,
     ThreadUpdate,
+    row_adapter,
 )
-from app.services.message_service import persist_assistant_message
+from app.services.idempotency import IDEMPOTENT_REPLAY_HEADER, IdempotencyRequest
+from app.services.change_feed import (
+    SUBSCRIBER_DELETED,
+    THREAD_DELETED,
+    record_changes,
+)
+from app.services.realtime import publish_message_created, publish_thread_updated
+from app.services.segments import uncount_subscriber
 from app.services.subscriber_service import resolve_subscriber
 from app.users import current_active_user
 from app.utils import (
+    ETAG_CACHE_CONTROL,
     build_desc_pagination_filter,
     decode_cursor,
     encode_cursor,
+    etag_matches,
+    json_response,
+    make_etag,
+    not_modified,
     parse_datetime,
+    parse_fields,
     parse_uuid,
 )
 
@@ -44,7 +58,9 @@ async def get_thread_by_id(
     result = await db.execute(
         select(Thread)
         .join(App)
-        .filter(Thread.id == thread_id, App.user_id == user.id)
+        .filter(
+            Thread.id == thread_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
         .options(selectinload(Thread.app))
     )
     thread = result.scalars().first()
@@ -59,17 +75,26 @@ async def get_thread_by_id(
 async def create_thread(
     app_id: UUID,
     thread: ThreadCreate,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
     app: App = Depends(get_app_for_request),
+    idempotency: IdempotencyRequest | None = Depends(get_idempotency_request),
 ):
     """Create a new thread for the specified app.
 
     When no user message is provided (default), the backend adds an initial
     assistant greeting as the clear entry point. The greeting is returned
     in the response so the UI can show it instantly without a second request.
+    A retry with the same Idempotency-Key header returns the first response.
     Auth: JWT Bearer or X-App-Id + X-App-Secret.
     """
 
+    if idempotency:
+        replay = await idempotency.claim(db)
+        if replay is not None:
+            response.headers[IDEMPOTENT_REPLAY_HEADER] = "true"
+            return replay
+
     # Get or create subscriber when customer_id is provided
     subscriber_id = None
     if thread.customer_id:
@@ -80,40 +105,86 @@ async def create_thread(
         )
         subscriber_id = subscriber.id
 
-    # Create thread
-    db_thread = Thread(
-        **thread.model_dump(), app_id=app_id, subscriber_id=subscriber_id
+    # Insert the thread with seq 1 already taken by the greeting, then the
+    # greeting itself; RETURNING gives us both rows, so no refreshes and a
+    # single commit. No row lock is needed: nobody else can see the thread yet.
+    now = datetime.now(timezone.utc)
+    db_thread = await db.scalar(
+        insert(Thread)
+        .values(
+            **thread.model_dump(),
+            app_id=app_id,
+            subscriber_id=subscriber_id,
+            next_seq=2,
+            created_at=now,
+            updated_at=now,
+        )
+        .returning(Thread)
     )
-    db.add(db_thread)
-    await db.commit()
-    await db.refresh(db_thread)
 
     # Initial greeting when no user message: streamed back in response for instant display
-    greeting_msg = await persist_assistant_message(
-        db_thread, t("SIM_GREETING"), db, content_json={"source": "system"}
+    greeting_msg = await db.scalar(
+        insert(Message)
+        .values(
+            thread_id=db_thread.id,
+            app_id=app_id,
+            seq=1,
+            role="assistant",
+            content=t("SIM_GREETING"),
+            content_json={"source": "system"},
+            created_at=now,
+        )
+        .returning(Message)
     )
-    await db.refresh(db_thread)
 
-    return ThreadCreateResponse(
+    result = ThreadCreateResponse(
         thread=ThreadRead.model_validate(db_thread),
         initial_message=MessageRead.model_validate(greeting_msg),
     )
+    await publish_thread_updated(
+        db, app_id, db_thread.id, result.thread.model_dump(mode="json")
+    )
+    await publish_message_created(db, app_id, greeting_msg)
+    if idempotency:
+        await idempotency.save(db, result)
+    await db.commit()
+    return result
 
 
 @router.get("/apps/{app_id}/threads", response_model=CursorPage[ThreadRead])
 async def list_threads(
     app_id: UUID,
-    db: AsyncSession = Depends(get_async_session),
+    response: Response,
+    db: AsyncSession = Depends(get_read_session),
     app: App = Depends(get_app_for_request),
     limit: int = Query(25, ge=1, le=200, description="Max items to return"),
     cursor: str | None = Query(None, description="Opaque cursor for pagination"),
     customer_id: str | None = Query(None, description="Filter by customer ID"),
     status: str | None = Query(None, description="Filter by status"),
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return (e.g. id,title)"
+    ),
+    if_none_match: str | None = Header(None),
 ):
-    """List threads for the specified app, ordered by updated_at desc. Auth: JWT or X-App-Id + X-App-Secret."""
+    """List threads for the specified app, ordered by updated_at desc.
+
+    ``fields`` selects only those columns in SQL (``id`` is always included).
 
+    The ETag is derived from the page's own rows (one index range scan of at
+    most ``limit + 1`` threads, whatever the size of the app); a matching
+    If-None-Match gets a 304 without serializing the page.
+    Auth: JWT or X-App-Id + X-App-Secret.
+    """
+
+    selected = parse_fields(fields, ThreadRead)
     limit = min(limit, 200)
-    query = select(Thread).filter(Thread.app_id == app_id)
+    # Cursor columns are always read, even when not returned
+    columns = dict.fromkeys(
+        [*(selected or ThreadRead.model_fields), "updated_at", "id"]
+    )
+    query = select(*(getattr(Thread, name) for name in columns)).filter(
+        Thread.app_id == app_id
+    )
 
     if customer_id:
         query = query.filter(Thread.customer_id == customer_id)
@@ -138,10 +209,19 @@ async def list_threads(
         query = query.filter(pagination_clause)
 
     result = await db.execute(query.limit(limit + 1))
-    rows = result.scalars().all()
+    rows = result.all()
+    # The extra row stands for has_more (and so next_cursor)
+    etag = make_etag(
+        "threads", app_id, limit, cursor, customer_id, status, selected, *rows
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
     has_more = len(rows) > limit
     visible_rows = rows[:limit]
-    items = [ThreadRead.model_validate(row) for row in visible_rows]
+    items = [row._asdict() for row in visible_rows]
 
     next_cursor = None
     if has_more and visible_rows:
@@ -153,16 +233,41 @@ async def list_threads(
             }
         )
 
-    return CursorPage(items=items, next_cursor=next_cursor)
+    body = row_adapter(ThreadRead, selected, shape="page").dump_json(
+        {"items": items, "next_cursor": next_cursor}
+    )
+    return json_response(body, response.headers)
 
 
 @router.get("/threads/{thread_id}", response_model=ThreadRead)
 async def get_thread(
     thread_id: UUID,
+    response: Response,
     db: AsyncSession = Depends(get_async_session),
     user: User = Depends(current_active_user),
+    if_none_match: str | None = Header(None),
 ):
-    """Get a specific thread by ID."""
+    """Get a specific thread by ID. Supports If-None-Match (ETag from updated_at)."""
+    validator = (
+        await db.execute(
+            select(Thread.updated_at, Thread.next_seq)
+            .join(App)
+            .filter(
+                Thread.id == thread_id,
+                App.user_id == user.id,
+                App.deleted_at.is_(None),
+            )
+        )
+    ).first()
+    if validator is None:
+        raise HTTPException(status_code=404, detail="ERROR_THREAD_NOT_FOUND")
+
+    etag = make_etag("thread", thread_id, *validator)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
     thread = await get_thread_by_id(thread_id, db, user)
     return thread
 
@@ -185,6 +290,12 @@ async def update_thread(
     # Update timestamp
     thread.updated_at = datetime.now(timezone.utc)
 
+    await publish_thread_updated(
+        db,
+        thread.app_id,
+        thread.id,
+        ThreadRead.model_validate(thread).model_dump(mode="json"),
+    )
     await db.commit()
     await db.refresh(thread)
     return thread
@@ -199,8 +310,10 @@ async def delete_thread(
     """Delete a thread."""
     thread = await get_thread_by_id(thread_id, db, user)
 
+    app_id = thread.app_id
     subscriber_id = thread.subscriber_id
     await db.delete(thread)
+    changes = [(THREAD_DELETED, thread_id, thread_id)]
 
     # Clean up orphaned subscriber
     if subscriber_id:
@@ -212,8 +325,11 @@ async def delete_thread(
         if result.scalar() == 0:
             subscriber = await db.get(Subscriber, subscriber_id)
             if subscriber:
+                await uncount_subscriber(db, subscriber)
                 await db.delete(subscriber)
+                changes.append((SUBSCRIBER_DELETED, subscriber_id, None))
 
+    await record_changes(db, app_id, changes)
     await db.commit()
 
     return {"message": "ACTION_THREAD_DELETED"}
@@ -63,7 +63,9 @@ async def webhook_test(
     """Test a webhook URL with a sample payload. Does NOT persist any messages."""
     # Verify app ownership
     result = await db.execute(
-        select(App).filter(App.id == app_id, App.user_id == user.id)
+        select(App).filter(
+            App.id == app_id, App.user_id == user.id, App.deleted_at.is_(None)
+        )
     )
     app = result.scalars().first()
     if not app:
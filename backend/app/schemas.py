@@ -1,9 +1,18 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Literal, Any, TypeVar, Generic
 
 from fastapi_users import schemas
-from pydantic import BaseModel, Field, field_validator
+from pydantic import (
+    BaseModel,
+    Field,
+    TypeAdapter,
+    computed_field,
+    field_validator,
+    model_validator,
+)
+from typing_extensions import TypedDict
 from uuid import UUID
 
 T = TypeVar("T")
@@ -20,6 +29,36 @@ class CursorPage(BaseModel, Generic[T]):
     next_cursor: str | None = None
 
 
+@lru_cache(maxsize=64)
+def row_adapter(
+    model: type[BaseModel],
+    fields: tuple[str, ...] | None = None,
+    shape: Literal["row", "list", "page"] = "list",
+) -> TypeAdapter:
+    """JSON serializer for database rows shaped like ``model``.
+
+    Rows (as dicts) are dumped without validation, so list endpoints go from
+    Core rows to response bytes without building model instances. ``fields``
+    limits the output to a sparse fieldset; keys not in it are dropped.
+    ``shape`` selects one row, a list of rows, or the ``CursorPage`` shape.
+    """
+    names = fields or tuple(model.model_fields)
+    row_type = TypedDict(
+        f"{model.__name__}Row",
+        {name: model.model_fields[name].annotation for name in names},
+    )
+    if shape == "row":
+        return TypeAdapter(row_type)
+    if shape == "list":
+        return TypeAdapter(list[row_type])
+    return TypeAdapter(
+        TypedDict(
+            f"{model.__name__}RowPage",
+            {"items": list[row_type], "next_cursor": str | None},
+        )
+    )
+
+
 class UserRead(schemas.BaseUser[uuid.UUID]):
     locale: str = DEFAULT_LOCALE
 
@@ -41,6 +80,28 @@ class UserUpdate(schemas.BaseUserUpdate):
         return v
 
 
+class RetentionPolicy(BaseModel):
+    """config_json["retention"]: age limits enforced by the retention worker.
+
+    messages_days deletes messages older than that; threads_inactive_days
+    deletes whole threads not updated for that long. Unset keeps everything.
+    archive_inactive_days moves threads not updated for that long to cold
+    storage (overrides THREAD_ARCHIVE_AFTER_DAYS).
+    """
+
+    model_config = {"extra": "forbid"}
+
+    messages_days: int | None = Field(None, ge=1)
+    threads_inactive_days: int | None = Field(None, ge=1)
+    archive_inactive_days: int | None = Field(None, ge=1)
+
+
+def _validate_retention(config: dict[str, Any] | None) -> dict[str, Any] | None:
+    if config and "retention" in config:
+        RetentionPolicy.model_validate(config["retention"])
+    return config
+
+
 class AppBase(BaseModel):
     name: str
     description: str | None = None
@@ -51,6 +112,8 @@ class AppCreate(AppBase):
     webhook_secret: str | None = None
     config_json: dict[str, Any] = Field(default_factory=dict)
 
+    _check_retention = field_validator("config_json")(_validate_retention)
+
 
 class AppUpdate(BaseModel):
     name: str | None = None
@@ -59,6 +122,8 @@ class AppUpdate(BaseModel):
     webhook_secret: str | None = None
     config_json: dict[str, Any] | None = None
 
+    _check_retention = field_validator("config_json")(_validate_retention)
+
 
 class AppRead(AppBase):
     id: UUID
@@ -77,6 +142,25 @@ class AppRead(AppBase):
         return app
 
 
+class AppPurgeJobRead(BaseModel):
+    """Progress of a background app deletion."""
+
+    id: UUID
+    app_id: UUID
+    status: Literal["pending", "running", "completed", "failed"]
+    threads_deleted: int
+    messages_deleted: int
+    subscribers_deleted: int
+    error: str | None = None
+    attempts: int = 0
+    retry_at: datetime | None = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: datetime | None = None
+
+    model_config = {"from_attributes": True}
+
+
 # --- Run / Orchestration schemas ---
 
 
@@ -93,6 +177,50 @@ class RunResponse(BaseModel):
     error: str | None = None
 
 
+class BulkRunFilter(BaseModel):
+    """Select threads for a bulk run by attribute instead of explicit ids."""
+
+    status: Literal["active", "archived", "deleted"] | None = "active"
+    customer_id: str | None = Field(None, max_length=128)
+
+
+class BulkRunRequest(BaseModel):
+    """Run the orchestrator for many threads of one app.
+
+    Exactly one of ``thread_ids`` or ``filter`` must be provided.
+    """
+
+    thread_ids: list[UUID] | None = Field(None, min_length=1, max_length=10000)
+    filter: BulkRunFilter | None = None
+    concurrency: int = Field(8, ge=1, le=64)
+
+    @model_validator(mode="after")
+    def exactly_one_selector(self) -> "BulkRunRequest":
+        if (self.thread_ids is None) == (self.filter is None):
+            raise ValueError("exactly one of thread_ids or filter is required")
+        return self
+
+
+class BulkRunItem(BaseModel):
+    """One NDJSON line of a bulk run response."""
+
+    thread_id: UUID
+    status: Literal["completed", "error"]
+    assistant_message: "MessageRead | None" = None
+    error: str | None = None
+
+
+# --- WebSocket chat gateway ---
+
+
+class ChatSocketInbound(BaseModel):
+    """A frame sent by the client over the thread WebSocket."""
+
+    type: Literal["message", "ping"]
+    content: str | None = None
+    content_json: dict[str, Any] = Field(default_factory=dict)
+
+
 # --- Canonical webhook payload (single source of truth) ---
 
 
@@ -204,6 +332,142 @@ class MessageRead(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class MessageSearchHit(BaseModel):
+    """A message matching a full-text search, with a highlighted snippet."""
+
+    id: UUID
+    thread_id: UUID
+    seq: int
+    role: Literal["user", "assistant", "system", "tool"]
+    created_at: datetime
+    rank: float
+    snippet: str
+
+
+class DurationStats(BaseModel):
+    count: int
+    avg_ms: float
+    max_ms: float
+
+
+class PoolStats(BaseModel):
+    """Gauges and checkout counters of one engine's connection pool."""
+
+    name: str
+    pool_class: str
+    size: int
+    max_overflow: int
+    in_use: int
+    idle: int
+    overflow: int
+    checkout_wait: DurationStats
+    checkout_timeouts: int
+
+
+class RouteHoldStats(DurationStats):
+    """How long a route's requests held their connections."""
+
+    route: str
+    long_holds: int
+
+
+class HeldConnection(BaseModel):
+    pool: str
+    route: str
+    held_seconds: float
+
+
+class DatabaseMetrics(BaseModel):
+    """Connection pool metrics of the serving worker, since it started."""
+
+    hold_warn_seconds: float
+    pools: list[PoolStats]
+    routes: list[RouteHoldStats]
+    long_held: list[HeldConnection]
+
+
+class RetentionRunRead(BaseModel):
+    """One pass of the retention worker over an app."""
+
+    id: UUID
+    status: Literal["running", "completed", "failed"]
+    messages_deleted: int
+    threads_deleted: int
+    subscribers_deleted: int
+    batches: int
+    error: str | None = None
+    started_at: datetime
+    finished_at: datetime | None = None
+
+    model_config = {"from_attributes": True}
+
+    @computed_field
+    @property
+    def rows_per_second(self) -> float | None:
+        """Messages and threads deleted per second, pauses included."""
+        if self.finished_at is None:
+            return None
+        seconds = (self.finished_at - self.started_at).total_seconds()
+        rows = self.messages_deleted + self.threads_deleted
+        return round(rows / seconds, 1) if seconds > 0 else None
+
+
+class AppChangeRead(BaseModel):
+    """A change feed entry; refetch the entity for its current state."""
+
+    position: str
+    kind: str
+    entity_id: UUID
+    thread_id: UUID | None
+    created_at: datetime
+
+
+class ChangeFeedPage(BaseModel):
+    """Changes after ``since``; pass next_since back to continue."""
+
+    items: list[AppChangeRead]
+    next_since: str | None
+    has_more: bool
+
+
+class MessageBulkItem(MessageCreateInternal):
+    """A message to import; created_at defaults to now (set it for history imports).
+
+    A created_at without a UTC offset is taken as UTC.
+    """
+
+    thread_id: UUID
+    created_at: datetime | None = None
+
+    @field_validator("created_at")
+    @classmethod
+    def created_at_in_utc(cls, v: datetime | None) -> datetime | None:
+        if v is None:
+            return v
+        if v.tzinfo is None:
+            return v.replace(tzinfo=timezone.utc)
+        return v.astimezone(timezone.utc)
+
+
+class MessageBulkCreate(BaseModel):
+    """Batch of messages for one or many threads of an app, appended in list order."""
+
+    messages: list[MessageBulkItem] = Field(min_length=1, max_length=10000)
+
+
+class MessageBulkThreadResult(BaseModel):
+    """Seq range allocated to one thread by a bulk import."""
+
+    thread_id: UUID
+    first_seq: int
+    last_seq: int
+
+
+class MessageBulkResponse(BaseModel):
+    inserted: int
+    threads: list[MessageBulkThreadResult]
+
+
 class ThreadCreateResponse(BaseModel):
     """Response when creating a thread: thread plus initial greeting (when no user message)."""
 
@@ -227,6 +491,18 @@ class SubscriberUpdate(BaseModel):
     metadata_json: dict[str, Any] | None = None
 
 
+class SubscriberImportRow(BaseModel):
+    """One CSV/NDJSON row of a bulk subscriber import.
+
+    display_name and metadata_json left out (or empty in CSV) keep an existing
+    subscriber's values.
+    """
+
+    customer_id: str = Field(min_length=1)
+    display_name: str | None = None
+    metadata_json: dict[str, Any] | None = None
+
+
 class SubscriberRead(SubscriberBase):
     id: UUID
     app_id: UUID
@@ -237,6 +513,37 @@ class SubscriberRead(SubscriberBase):
     model_config = {"from_attributes": True}
 
 
+class SubscriberFilter(BaseModel):
+    """Subscriber metadata filter; both conditions must hold when both are set.
+
+    ``metadata`` matches subscribers whose metadata_json contains the object
+    (JSONB ``@>``); ``metadata_path`` is a jsonpath predicate such as
+    ``$.score > 50`` (JSONB ``@@``).
+    """
+
+    metadata: dict[str, Any] | None = None
+    metadata_path: str | None = Field(None, min_length=1, max_length=1000)
+
+
+class SegmentCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=200)
+    filter_json: SubscriberFilter
+
+
+class SegmentRead(BaseModel):
+    """A saved segment with its cached member count."""
+
+    id: UUID
+    app_id: UUID
+    name: str
+    filter_json: SubscriberFilter
+    member_count: int
+    counted_at: datetime | None = None
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
 class SubscriberSummary(BaseModel):
     """Subscriber summary with thread count for list views."""
 
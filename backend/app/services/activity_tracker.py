@@ -0,0 +1,144 @@
+"""Debounced subscriber activity writes.
+
+Every user message used to rewrite ``last_seen_at``/``last_message_at`` on its
+subscriber row, so one chatty customer meant one row update (and row lock) per
+message. Instead, message paths record activity here; the tracker keeps only
+the latest timestamps per subscriber in memory and writes them in bulk on an
+interval, and once more on shutdown.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import Subscriber
+
+logger = get_logger(__name__)
+
+
+def _latest(current: datetime | None, candidate: datetime | None) -> datetime | None:
+    if current is None:
+        return candidate
+    if candidate is None:
+        return current
+    return max(current, candidate)
+
+
+class ActivityTracker:
+    """Buffers subscriber activity timestamps and flushes them in bulk."""
+
+    def __init__(self, flush_interval: float) -> None:
+        self.flush_interval = flush_interval
+        # subscriber_id -> (last_seen_at, last_message_at)
+        self._pending: dict[UUID, tuple[datetime | None, datetime | None]] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def record(
+        self,
+        subscriber_id: UUID,
+        at: datetime,
+        *,
+        message: bool = True,
+    ) -> None:
+        """Note that a subscriber was seen (and sent a message, by default) at ``at``."""
+        seen, messaged = self._pending.get(subscriber_id, (None, None))
+        self._pending[subscriber_id] = (
+            _latest(seen, at),
+            _latest(messaged, at if message else None),
+        )
+
+    async def flush(self, db: AsyncSession | None = None) -> int:
+        """Write buffered timestamps with one executemany UPDATE; returns rows queued.
+
+        Timestamps only ever move forward (GREATEST), so a late flush never
+        overwrites newer activity. On failure the batch is re-queued.
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+
+        subscribers = Subscriber.__table__
+        stmt = (
+            update(subscribers)
+            .where(subscribers.c.id == bindparam("b_id"))
+            .values(
+                last_seen_at=func.greatest(
+                    subscribers.c.last_seen_at, bindparam("b_seen")
+                ),
+                last_message_at=func.greatest(
+                    subscribers.c.last_message_at, bindparam("b_message")
+                ),
+            )
+        )
+        params = [
+            {"b_id": subscriber_id, "b_seen": seen, "b_message": messaged}
+            for subscriber_id, (seen, messaged) in pending.items()
+        ]
+
+        try:
+            if db is not None:
+                await db.execute(stmt, params)
+                await db.commit()
+            else:
+                # Imported lazily: app.database builds the engine at import time.
+                from app.database import shards
+
+                # Subscribers are not tracked by shard: every shard gets the
+                # batch, updating the rows it has.
+                for shard in shards:
+                    async with shard.session_maker() as session:
+                        await session.execute(stmt, params)
+                        await session.commit()
+        except Exception:
+            for subscriber_id, (seen, messaged) in pending.items():
+                current_seen, current_messaged = self._pending.get(
+                    subscriber_id, (None, None)
+                )
+                self._pending[subscriber_id] = (
+                    _latest(current_seen, seen),
+                    _latest(current_messaged, messaged),
+                )
+            raise
+
+        return len(params)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Subscriber activity flush failed")
+
+    def start(self) -> None:
+        """Start the periodic flush loop on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final subscriber activity flush failed")
+
+
+activity_tracker = ActivityTracker(settings.SUBSCRIBER_ACTIVITY_FLUSH_SECONDS)
@@ -0,0 +1,255 @@
+"""Background purge of large apps in bounded batches.
+
+Deleting an app row cascades to every thread, message and subscriber in one
+statement. For big apps that is one long transaction holding locks on
+millions of rows, so delete_app instead hides the app (``deleted_at``) and
+schedules a purge job here. The job deletes messages, threads and
+subscribers in small committed batches, records progress on its
+AppPurgeJob row, and finally deletes the app itself.
+
+Every worker looks for unfinished jobs at startup and every
+APP_PURGE_CHECK_SECONDS; a per-job advisory lock (held like
+``app.services.worker_lock``) makes sure only one of them runs a job. A
+failed job is retried after APP_PURGE_RETRY_SECONDS, doubling per attempt,
+and given up after APP_PURGE_MAX_ATTEMPTS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import delete, func, or_, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.database import shard_router
+from app.logging_config import get_logger
+from app.models import App, AppChange, AppPurgeJob, Message, Subscriber, Thread
+from app.services.message_search import in_app
+
+logger = get_logger(__name__)
+
+# Thread rows deleted per statement (each cascades to its archive blob)
+_THREAD_CHUNK_SIZE = 100
+
+_running: dict[UUID, asyncio.Task] = {}
+_task: asyncio.Task | None = None
+
+
+async def count_app_messages(db: AsyncSession, app_id: UUID, limit: int) -> int:
+    """Count an app's messages, stopping at ``limit`` (cheap for huge apps)."""
+    capped = select(Message.id).filter(in_app(app_id)).limit(limit).subquery()
+    return await db.scalar(select(func.count()).select_from(capped))
+
+
+def _message_batch(app_id: UUID, batch_size: int):
+    """Delete up to a batch of the app's messages by their full primary key."""
+    batch = (
+        select(Message.id, Message.created_at).filter(in_app(app_id)).limit(batch_size)
+    )
+    return delete(Message).where(tuple_(Message.id, Message.created_at).in_(batch))
+
+
+async def _delete_batch(db: AsyncSession, stmt) -> int:
+    result = await db.execute(stmt.execution_options(synchronize_session=False))
+    return result.rowcount or 0
+
+
+async def _record_progress(db: AsyncSession, job_id: UUID, **values) -> None:
+    """Update the job row and commit, together with the batch just deleted."""
+    await db.execute(
+        update(AppPurgeJob)
+        .where(AppPurgeJob.id == job_id)
+        .values(updated_at=datetime.now(timezone.utc), **values)
+    )
+    await db.commit()
+
+
+def _lock_key(job_id: UUID) -> int:
+    """Advisory lock key of a job (the first 64 bits of its id)."""
+    return int.from_bytes(job_id.bytes[:8], "big", signed=True)
+
+
+async def purge_app(job_id: UUID, session_factory: async_sessionmaker) -> None:
+    """Run (or resume) a purge job until the app and all its rows are gone,
+    unless another worker is already running it."""
+    # The lock lives in a transaction left open on a session of its own
+    async with session_factory() as lock_db:
+        locked = await lock_db.scalar(
+            select(func.pg_try_advisory_xact_lock(_lock_key(job_id)))
+        )
+        if locked:
+            await _purge_app(job_id, session_factory)
+
+
+async def _purge_app(job_id: UUID, session_factory: async_sessionmaker) -> None:
+    batch_size = settings.APP_PURGE_BATCH_SIZE
+    pause = settings.APP_PURGE_PAUSE_SECONDS
+
+    async with session_factory() as db:
+        job = await db.get(AppPurgeJob, job_id)
+        if job is None or job.status == "completed":
+            return
+        attempts = job.attempts
+        app_id = job.app_id
+        messages_deleted = job.messages_deleted
+        threads_deleted = job.threads_deleted
+        subscribers_deleted = job.subscribers_deleted
+        await _record_progress(db, job_id, status="running", retry_at=None)
+
+        try:
+            while True:
+                deleted = await _delete_batch(db, _message_batch(app_id, batch_size))
+                messages_deleted += deleted
+                await _record_progress(db, job_id, messages_deleted=messages_deleted)
+                if deleted < batch_size:
+                    break
+                await asyncio.sleep(pause)
+
+            while True:
+                deleted = await _delete_batch(
+                    db,
+                    delete(Thread).where(
+                        Thread.id.in_(
+                            select(Thread.id)
+                            .filter(Thread.app_id == app_id)
+                            .limit(_THREAD_CHUNK_SIZE)
+                        )
+                    ),
+                )
+                threads_deleted += deleted
+                await _record_progress(db, job_id, threads_deleted=threads_deleted)
+                if deleted < _THREAD_CHUNK_SIZE:
+                    break
+                await asyncio.sleep(pause)
+
+            while True:
+                deleted = await _delete_batch(
+                    db,
+                    delete(Subscriber).where(
+                        Subscriber.id.in_(
+                            select(Subscriber.id)
+                            .filter(Subscriber.app_id == app_id)
+                            .limit(batch_size)
+                        )
+                    ),
+                )
+                subscribers_deleted += deleted
+                await _record_progress(
+                    db, job_id, subscribers_deleted=subscribers_deleted
+                )
+                if deleted < batch_size:
+                    break
+                await asyncio.sleep(pause)
+
+            # The change feed goes with the app; batched like the rows it logs
+            while True:
+                deleted = await _delete_batch(
+                    db,
+                    delete(AppChange).where(
+                        AppChange.seq.in_(
+                            select(AppChange.seq)
+                            .filter(AppChange.app_id == app_id)
+                            .limit(batch_size)
+                        )
+                    ),
+                )
+                if deleted < batch_size:
+                    break
+                await asyncio.sleep(pause)
+
+            await _delete_batch(db, delete(App).where(App.id == app_id))
+            await db.commit()
+            # Placement after the app, so a retry after a failure here redoes it
+            await shard_router.unassign(app_id)
+            await _record_progress(
+                db,
+                job_id,
+                status="completed",
+                completed_at=datetime.now(timezone.utc),
+            )
+        except asyncio.CancelledError:
+            # Shutdown: the job stays "running" and is resumed on next startup.
+            raise
+        except Exception as exc:
+            attempts += 1
+            retry_at = None
+            if attempts < settings.APP_PURGE_MAX_ATTEMPTS:
+                delay = settings.APP_PURGE_RETRY_SECONDS * 2 ** (attempts - 1)
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            logger.exception(
+                "App purge job %s failed (attempt %d, retry at %s)",
+                job_id,
+                attempts,
+                retry_at,
+            )
+            await db.rollback()
+            await _record_progress(
+                db,
+                job_id,
+                status="failed",
+                error=str(exc)[:500],
+                attempts=attempts,
+                retry_at=retry_at,
+            )
+
+
+def schedule_app_purge(job_id: UUID, session_factory: async_sessionmaker) -> None:
+    """Run a purge job in the background on the current event loop."""
+    if job_id in _running:
+        return
+    task = asyncio.create_task(purge_app(job_id, session_factory))
+    _running[job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job_id, None))
+
+
+async def resume_app_purges(session_factory: async_sessionmaker) -> None:
+    """Schedule unfinished purge jobs: interrupted ones and failed ones due
+    for a retry. Jobs running in another worker are skipped by their lock."""
+    async with session_factory() as db:
+        job_ids = (
+            await db.scalars(
+                select(AppPurgeJob.id).filter(
+                    or_(
+                        AppPurgeJob.status.in_(("pending", "running")),
+                        (AppPurgeJob.status == "failed")
+                        & (AppPurgeJob.retry_at <= func.now()),
+                    )
+                )
+            )
+        ).all()
+    for job_id in job_ids:
+        schedule_app_purge(job_id, session_factory)
+
+
+async def _run(session_factories: tuple[async_sessionmaker, ...]) -> None:
+    while True:
+        for session_factory in session_factories:
+            try:
+                await resume_app_purges(session_factory)
+            except Exception:
+                logger.exception("Could not resume app purge jobs")
+        await asyncio.sleep(settings.APP_PURGE_CHECK_SECONDS)
+
+
+def start_app_purge_worker(*session_factories: async_sessionmaker) -> None:
+    """Pick up unfinished purge jobs of each database (shard) now and every
+    APP_PURGE_CHECK_SECONDS on the current loop."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run(session_factories))
+
+
+async def stop_app_purges() -> None:
+    """Stop the worker and cancel running purge jobs (they resume on next
+    startup, or in another worker)."""
+    global _task
+    task, _task = _task, None
+    tasks = [task] if task is not None else []
+    tasks += _running.values()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
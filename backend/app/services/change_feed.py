@@ -0,0 +1,220 @@
+"""Append-only per-app change feed for incremental sync.
+
+Write paths append one (kind, entity_id, thread_id) entry per change to
+app_changes inside their own transaction, so the feed holds exactly the
+committed changes. Consumers page through it with a position cursor and
+apply the entries to a mirror (refetching entities as needed) instead of
+re-reading whole tables.
+
+Entries are ordered by (tx_id, seq). A bare seq cursor is not safe: sequence
+values are taken at insert time but become visible at commit, so a slow
+transaction can commit seq 10 after a reader has already moved past seq 11.
+Readers therefore only see entries of transactions older than every
+transaction still running (``pg_snapshot_xmin``); anything appended later
+sorts after the returned positions. The cost is that the feed lags behind the
+oldest in-flight write transaction.
+
+The retention worker prunes entries older than CHANGE_FEED_RETENTION_DAYS
+from the head of the feed and records, per app, the newest pruned position
+(AppChangeHorizon). Reading after a position before that horizon is refused
+with 410 ERROR_CHANGE_FEED_EXPIRED: the reader has missed entries and must
+resync (export, then continue from ``since=now``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import Row, delete, func, insert, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import AppChange, AppChangeHorizon
+from app.utils import decode_cursor, encode_cursor, parse_int
+
+logger = get_logger(__name__)
+
+MESSAGE_CREATED = "message.created"
+THREAD_UPDATED = "thread.updated"
+THREAD_DELETED = "thread.deleted"
+SUBSCRIBER_CREATED = "subscriber.created"
+SUBSCRIBER_UPDATED = "subscriber.updated"
+SUBSCRIBER_DELETED = "subscriber.deleted"
+
+# Realtime event that wakes change feed streams; not sent to SSE clients
+CHANGES_APPENDED = "changes.appended"
+
+# (kind, entity_id, thread_id)
+Change = tuple[str, UUID, UUID | None]
+
+# Transactions with a smaller id have all finished
+_VISIBLE_HORIZON = literal_column(
+    "(pg_snapshot_xmin(pg_current_snapshot())::text)::bigint"
+)
+_POSITION_SCHEMA = {"tx": parse_int, "seq": parse_int}
+
+
+def encode_position(tx_id: int, seq: int) -> str:
+    return encode_cursor({"tx": tx_id, "seq": seq})
+
+
+def decode_position(value: str) -> tuple[int, int]:
+    """(tx_id, seq) of a position token; 400 ERROR_INVALID_CURSOR if malformed."""
+    position = decode_cursor(value, _POSITION_SCHEMA)
+    return position["tx"], position["seq"]
+
+
+async def record_changes(
+    db: AsyncSession,
+    app_id: UUID,
+    changes: Sequence[Change],
+    *,
+    notify: bool = True,
+) -> None:
+    """Append entries to the app's feed; visible once the transaction commits.
+
+    With ``notify`` a wake-up is sent to change feed streams on commit (Postgres
+    sends identical notifications once per transaction). Callers that already
+    publish a realtime event for the app pass ``notify=False``.
+    """
+    if not changes:
+        return
+    await db.execute(
+        insert(AppChange),
+        [
+            {"app_id": app_id, "kind": kind, "entity_id": entity_id, "thread_id": tid}
+            for kind, entity_id, tid in changes
+        ],
+    )
+    if notify:
+        await notify_appended(db, app_id)
+
+
+async def notify_appended(db: AsyncSession, app_id: UUID) -> None:
+    """Wake the app's change feed streams when the transaction commits.
+
+    For writes that append entries with SQL of their own.
+    """
+    payload = json.dumps(
+        {"event": CHANGES_APPENDED, "app_id": str(app_id), "data": {}},
+        separators=(",", ":"),
+    )
+    await db.execute(select(func.pg_notify(settings.REALTIME_CHANNEL, payload)))
+
+
+async def read_changes(
+    db: AsyncSession, app_id: UUID, after: tuple[int, int] | None, limit: int
+) -> Sequence[Row[Any]]:
+    """Up to ``limit`` visible entries after position ``after``, oldest first."""
+    query = select(
+        AppChange.tx_id,
+        AppChange.seq,
+        AppChange.kind,
+        AppChange.entity_id,
+        AppChange.thread_id,
+        AppChange.created_at,
+    ).filter(AppChange.app_id == app_id, AppChange.tx_id < _VISIBLE_HORIZON)
+    if after is not None:
+        query = query.filter(tuple_(AppChange.tx_id, AppChange.seq) > tuple_(*after))
+    query = query.order_by(AppChange.tx_id, AppChange.seq).limit(limit)
+    return (await db.execute(query)).all()
+
+
+async def ensure_retained(
+    db: AsyncSession, app_id: UUID, after: tuple[int, int] | None
+) -> None:
+    """410 ERROR_CHANGE_FEED_EXPIRED if entries after ``after`` were pruned."""
+    if after is None:
+        return
+    horizon = (
+        await db.execute(
+            select(AppChangeHorizon.tx_id, AppChangeHorizon.seq).filter(
+                AppChangeHorizon.app_id == app_id
+            )
+        )
+    ).first()
+    if horizon is not None and after < tuple(horizon):
+        raise HTTPException(status_code=410, detail="ERROR_CHANGE_FEED_EXPIRED")
+
+
+async def prune_changes(session_factory: async_sessionmaker) -> int:
+    """Delete entries older than CHANGE_FEED_RETENTION_DAYS; returns the count.
+
+    Walks the head of the feed in seq order, RETENTION_BATCH_SIZE entries per
+    committed statement, and stops at the first entry still retained, so each
+    batch is a primary key range read. Entries of long transactions that sit
+    behind it are pruned once the head has passed them. Each app's horizon is
+    raised to the newest position pruned for it.
+    """
+    if settings.CHANGE_FEED_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        days=settings.CHANGE_FEED_RETENTION_DAYS
+    )
+    pruned = 0
+    async with session_factory() as db:
+        while True:
+            head = (
+                await db.execute(
+                    select(AppChange.seq, AppChange.created_at)
+                    .order_by(AppChange.seq)
+                    .limit(settings.RETENTION_BATCH_SIZE)
+                )
+            ).all()
+            expired = 0
+            while expired < len(head) and head[expired].created_at < cutoff:
+                expired += 1
+            if not expired:
+                await db.rollback()
+                break
+            rows = (
+                await db.execute(
+                    delete(AppChange)
+                    .where(AppChange.seq <= head[expired - 1].seq)
+                    .returning(AppChange.app_id, AppChange.tx_id, AppChange.seq)
+                )
+            ).all()
+            horizons: dict[UUID, tuple[int, int]] = {}
+            for row in rows:
+                position = (row.tx_id, row.seq)
+                if position > horizons.get(row.app_id, (0, 0)):
+                    horizons[row.app_id] = position
+            if horizons:
+                stmt = pg_insert(AppChangeHorizon).values(
+                    [
+                        {"app_id": app_id, "tx_id": tx_id, "seq": seq}
+                        for app_id, (tx_id, seq) in horizons.items()
+                    ]
+                )
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[AppChangeHorizon.app_id],
+                        set_={"tx_id": stmt.excluded.tx_id, "seq": stmt.excluded.seq},
+                        where=tuple_(AppChangeHorizon.tx_id, AppChangeHorizon.seq)
+                        < tuple_(stmt.excluded.tx_id, stmt.excluded.seq),
+                    )
+                )
+            await db.commit()
+            pruned += len(rows)
+            if expired < len(head):
+                break
+            await asyncio.sleep(settings.RETENTION_PAUSE_SECONDS)
+    if pruned:
+        logger.info("Pruned %d change feed entries", pruned)
+    return pruned
+
+
+async def current_position(db: AsyncSession) -> tuple[int, int]:
+    """A position after every entry visible now (for mirrors taking a snapshot).
+
+    Entries of running and future transactions all sort after it.
+    """
+    return await db.scalar(select(_VISIBLE_HORIZON)), 0
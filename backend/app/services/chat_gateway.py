@@ -0,0 +1,268 @@
+"""WebSocket chat gateway: one long-lived connection per thread.
+
+The client sends user messages; the gateway persists each one, runs the
+orchestrator (``ChatOrchestrator.run_stream``) and pushes the assistant
+deltas, the persisted messages and status frames back. Messages written to
+the thread by anyone else (dashboard agent replies, partner callbacks, other
+sockets) arrive through the realtime hub and are forwarded too; those whose
+notification was truncated for size are read back from the database first.
+
+Flow control per connection:
+
+- inbound frames above WS_MAX_MESSAGE_BYTES are rejected;
+- turns run one at a time, with at most WS_MAX_PENDING_MESSAGES queued;
+- outbound frames go through a bounded queue, so a client that reads slowly
+  pauses its own orchestrator stream instead of growing server memory, and a
+  client that stops reading for WS_SEND_TIMEOUT_SECONDS is disconnected.
+
+Frames are JSON objects with a ``type``. Server to client: ``message``
+(a persisted message), ``status`` (``running``/``idle``), ``meta``, ``delta``,
+``raw`` (partner SSE proxied as text), ``done``, ``thread``, ``error``,
+``resync`` and ``pong``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import App, Message, Thread
+from app.schemas import ChatSocketInbound, MessageRead
+from app.services.message_service import (
+    get_history,
+    persist_assistant_message,
+    persist_user_message,
+)
+from app.services.orchestrator import ChatOrchestrator
+from app.services.realtime import (
+    MESSAGE_CREATED,
+    RESYNC,
+    RealtimeHub,
+    Subscription,
+)
+
+logger = get_logger(__name__)
+
+# Message ids remembered per connection so each message is sent only once
+_DELIVERED_MEMORY = 1000
+
+
+class ChatGateway:
+    """Serves one accepted WebSocket bound to a thread."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        app_id: UUID,
+        thread_id: UUID,
+        session_factory: async_sessionmaker,
+        hub: RealtimeHub,
+    ) -> None:
+        self.websocket = websocket
+        self.app_id = app_id
+        self.thread_id = thread_id
+        self.session_factory = session_factory
+        self.hub = hub
+        self._outbox: asyncio.Queue[dict[str, Any]] = asyncio.Queue(
+            settings.WS_SEND_QUEUE_SIZE
+        )
+        self._pending: asyncio.Queue[ChatSocketInbound] = asyncio.Queue(
+            settings.WS_MAX_PENDING_MESSAGES
+        )
+        self._delivered: OrderedDict[str, None] = OrderedDict()
+
+    async def serve(self) -> None:
+        """Run until the client disconnects or stops reading."""
+        # Subscribe before reading so no reply committed meanwhile is missed.
+        async with self.hub.subscribe(self.app_id, self.thread_id) as subscription:
+            tasks = [
+                asyncio.create_task(self._write_loop()),
+                asyncio.create_task(self._turn_loop()),
+                asyncio.create_task(self._forward_loop(subscription)),
+                asyncio.create_task(self._read_loop()),
+            ]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                        raise exc
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _send(self, frame: dict[str, Any]) -> None:
+        """Queue a frame; waits while the client is behind (backpressure)."""
+        await self._outbox.put(frame)
+
+    async def _send_message(self, message: dict[str, Any]) -> None:
+        """Send a persisted message unless this socket already sent it."""
+        message_id = str(message["id"])
+        if message_id in self._delivered:
+            return
+        if message.get("truncated"):
+            message = await self._load_message(message)
+            if message is None:
+                return
+        self._delivered[message_id] = None
+        while len(self._delivered) > _DELIVERED_MEMORY:
+            self._delivered.popitem(last=False)
+        await self._send({"type": "message", "message": message})
+
+    async def _write_loop(self) -> None:
+        while True:
+            frame = await self._outbox.get()
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_text(json.dumps(frame, default=str)),
+                    timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+                )
+            except TimeoutError:
+                logger.warning(
+                    "Closing chat socket for thread %s: client stalled", self.thread_id
+                )
+                await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return
+
+    async def _read_loop(self) -> None:
+        while True:
+            raw = await self.websocket.receive_text()
+            if len(raw.encode("utf-8")) > settings.WS_MAX_MESSAGE_BYTES:
+                await self._send(
+                    {"type": "error", "error": "ERROR_WS_MESSAGE_TOO_LARGE"}
+                )
+                continue
+            try:
+                frame = ChatSocketInbound.model_validate_json(raw)
+            except ValidationError:
+                await self._send({"type": "error", "error": "ERROR_WS_INVALID_FRAME"})
+                continue
+
+            if frame.type == "ping":
+                await self._send({"type": "pong"})
+                continue
+            try:
+                self._pending.put_nowait(frame)
+            except asyncio.QueueFull:
+                await self._send(
+                    {"type": "error", "error": "ERROR_WS_TOO_MANY_PENDING_MESSAGES"}
+                )
+
+    async def _turn_loop(self) -> None:
+        while True:
+            frame = await self._pending.get()
+            try:
+                await self._run_turn(frame)
+            except Exception:
+                logger.exception("Chat turn failed for thread %s", self.thread_id)
+                await self._send({"type": "error", "error": "ERROR_INTERNAL"})
+                await self._send({"type": "status", "status": "idle"})
+
+    async def _run_turn(self, frame: ChatSocketInbound) -> None:
+        """Persist the user message, stream the reply, persist the reply."""
+        async with self.session_factory() as db:
+            user_msg = await persist_user_message(
+                self.thread_id, frame.content, db, content_json=frame.content_json
+            )
+            app = await db.get(App, self.app_id)
+            thread = await db.get(Thread, self.thread_id)
+            history = await get_history(self.thread_id, db)
+        await self._send_message(
+            MessageRead.model_validate(user_msg).model_dump(mode="json")
+        )
+        await self._send({"type": "status", "status": "running"})
+
+        full_text = ""
+        source = "simulator"
+        reason = None
+        async for event in ChatOrchestrator.run_stream(
+            app, thread, user_msg.content or "", message=user_msg, history=history
+        ):
+            event_type = event["event"]
+            data = event["data"]
+
+            if event_type == "meta":
+                source = data.get("source", "simulator")
+                reason = data.get("reason")
+                await self._send({"type": "meta", **data})
+            elif event_type == "raw":
+                text = (
+                    data.decode("utf-8", errors="replace")
+                    if isinstance(data, bytes)
+                    else str(data)
+                )
+                await self._send({"type": "raw", "data": text})
+            elif event_type == "delta":
+                full_text += data.get("text", "")
+                await self._send({"type": "delta", "text": data.get("text", "")})
+            elif event_type == "error":
+                await self._send(
+                    {"type": "error", "error": data.get("message", "ERROR_NO_REPLY")}
+                )
+            elif event_type == "done":
+                done: dict[str, Any] = {
+                    "type": "done",
+                    "status": data.get("status", "completed"),
+                }
+                if done["status"] == "completed" and full_text:
+                    content_json: dict = {"source": source}
+                    if reason:
+                        content_json["reason"] = reason
+                    async with self.session_factory() as db:
+                        reply = await persist_assistant_message(
+                            thread, full_text, db, content_json=content_json
+                        )
+                    await self._send_message(
+                        MessageRead.model_validate(reply).model_dump(mode="json")
+                    )
+                    done["message_id"] = str(reply.id)
+                    done["seq"] = reply.seq
+                await self._send(done)
+
+        await self._send({"type": "status", "status": "idle"})
+
+    async def _load_message(self, stub: dict[str, Any]) -> dict[str, Any] | None:
+        """Read a message whose notification was too large to carry its
+        content; None if it is gone (deleted or archived) by now."""
+        async with self.session_factory() as db:
+            message = await db.scalar(
+                select(Message).filter(
+                    Message.id == UUID(stub["id"]),
+                    Message.created_at == datetime.fromisoformat(stub["created_at"]),
+                    Message.thread_id == self.thread_id,
+                )
+            )
+        if message is None:
+            return None
+        return MessageRead.model_validate(message).model_dump(mode="json")
+
+    async def _forward(self, subscription: Subscription) -> None:
+        """Forward events until the subscription asks for a resync."""
+        while True:
+            event = await subscription.get()
+            if event["event"] == RESYNC:
+                await self._send({"type": "resync"})
+                return
+            if event["event"] == MESSAGE_CREATED:
+                await self._send_message(event["data"])
+            else:
+                await self._send({"type": "thread", "thread": event["data"]})
+
+    async def _forward_loop(self, subscription: Subscription) -> None:
+        """Forward thread events written elsewhere (agent replies, callbacks)."""
+        await self._forward(subscription)
+        while True:
+            async with self.hub.subscribe(self.app_id, self.thread_id) as fresh:
+                await self._forward(fresh)
@@ -0,0 +1,137 @@
+"""Columnar (Arrow IPC stream / Parquet) exports of an app's tables.
+
+Uses the same source batches (archived messages included) as the NDJSON
+export (``app.services.export``): every batch of EXPORT_BATCH_SIZE rows is
+written as one Arrow record batch, or one Parquet row group, and the encoded
+bytes are yielded right away. UUIDs are written as strings and JSON columns
+as JSON text so any Arrow or Parquet reader can load the output. pyarrow is
+imported on first use to keep it out of the API's startup.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+from collections.abc import AsyncIterator, Callable, Mapping, Sequence
+from datetime import datetime
+from functools import lru_cache
+from types import UnionType
+from typing import Any, Literal, Union, get_args, get_origin
+from uuid import UUID
+
+from pydantic import BaseModel
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.services.export import EXPORT_SOURCES, export_batches
+
+ColumnarFormat = Literal["arrow", "parquet"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+FILE_EXTENSIONS: dict[str, str] = {"arrow": "arrows", "parquet": "parquet"}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes out per chunk.
+
+    ``tell`` keeps counting across drains, which the Parquet writer needs for
+    the row group offsets in the footer.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_column(annotation: Any) -> tuple[Any, Callable[[Any], Any] | None]:
+    """Arrow type and value converter for a schema field annotation."""
+    import pyarrow as pa
+
+    if get_origin(annotation) in (Union, UnionType):
+        annotation = next(a for a in get_args(annotation) if a is not type(None))
+    base = get_origin(annotation) or annotation
+    if base is UUID:
+        return pa.string(), str
+    if base is datetime:
+        return pa.timestamp("us", tz="UTC"), None
+    if base is int:
+        return pa.int64(), None
+    if base is dict:
+        return pa.string(), json.dumps
+    return pa.string(), None  # str and Literal[...] values
+
+
+@lru_cache(maxsize=None)
+def arrow_schema(model: type[BaseModel]):
+    """Arrow schema and per-column converters for rows shaped like ``model``."""
+    import pyarrow as pa
+
+    fields, converters = [], []
+    for name, info in model.model_fields.items():
+        arrow_type, convert = _arrow_column(info.annotation)
+        fields.append(pa.field(name, arrow_type))
+        converters.append(convert)
+    return pa.schema(fields), tuple(converters)
+
+
+def record_batch(model: type[BaseModel], rows: Sequence[Row]):
+    """Build one Arrow record batch from rows selected in ``model`` field order."""
+    import pyarrow as pa
+
+    schema, converters = arrow_schema(model)
+    arrays = []
+    for index, (field, convert) in enumerate(zip(schema, converters)):
+        values = [row[index] for row in rows]
+        if convert is not None:
+            values = [None if value is None else convert(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+async def export_columnar(
+    session_factory: async_sessionmaker,
+    table: str,
+    app_id: UUID,
+    fmt: ColumnarFormat,
+    after: Mapping[str, Any] | None = None,
+) -> AsyncIterator[bytes]:
+    """Yield an Arrow IPC stream or a Parquet file of one of EXPORT_SOURCES."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source = EXPORT_SOURCES[table]
+    schema, _ = arrow_schema(source.model)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(
+            sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+        )
+
+    async for batch in export_batches(session_factory, table, app_id, after):
+        writer.write_batch(record_batch(source.model, batch))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
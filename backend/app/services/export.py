@@ -0,0 +1,249 @@
+"""Streaming exports of an app's threads, messages and subscribers.
+
+Rows are read through a server-side cursor (``AsyncSession.stream`` with
+``yield_per``) in batches of EXPORT_BATCH_SIZE, so worker memory stays flat
+whatever the app size. The export holds one database connection until it
+finishes.
+
+NDJSON exports write one object per line. After each batch a checkpoint line
+``{"resume_token": "..."}`` carries the keyset of the last exported row;
+passing it back as ``resume_token`` continues right after that row. The
+stream ends with ``{"complete": true, "exported": n}``, so a client can tell
+a finished export from an interrupted one.
+
+The messages export includes archived threads (``app.services.thread_archive``):
+their archives are read through a second cursor in the same REPEATABLE READ
+transaction and merged in (thread_id, seq) order, archived seqs first.
+"""
+
+from __future__ import annotations
+
+import json
+import zlib
+from collections import namedtuple
+from collections.abc import AsyncIterator, Callable, Mapping, Sequence
+from typing import Any, NamedTuple
+from uuid import UUID
+
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Row, Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.models import ArchivedThread, Message, Subscriber, Thread
+from app.schemas import MessageRead, SubscriberRead, ThreadRead, row_adapter
+from app.services.thread_archive import unpack_messages
+from app.utils import encode_cursor, parse_datetime, parse_int, parse_uuid
+
+
+def threads_query(app_id: UUID, after: Mapping[str, Any] | None = None) -> Select:
+    """An app's threads in (created_at, id) order, optionally after a resume key."""
+    query = (
+        select(*(getattr(Thread, name) for name in ThreadRead.model_fields))
+        .filter(Thread.app_id == app_id)
+        .order_by(Thread.created_at, Thread.id)
+    )
+    if after is not None:
+        query = query.filter(
+            tuple_(Thread.created_at, Thread.id)
+            > tuple_(after["created_at"], after["id"])
+        )
+    return query
+
+
+def messages_query(app_id: UUID, after: Mapping[str, Any] | None = None) -> Select:
+    """An app's messages in (thread_id, seq) order, optionally after a resume key."""
+    query = (
+        select(*(getattr(Message, name) for name in MessageRead.model_fields))
+        .join(Thread, Thread.id == Message.thread_id)
+        .filter(Thread.app_id == app_id)
+        .order_by(Message.thread_id, Message.seq)
+    )
+    if after is not None:
+        query = query.filter(
+            tuple_(Message.thread_id, Message.seq)
+            > tuple_(after["thread_id"], after["seq"])
+        )
+    return query
+
+
+def subscribers_query(app_id: UUID, after: Mapping[str, Any] | None = None) -> Select:
+    """An app's subscribers in (created_at, id) order, optionally after a resume key."""
+    query = (
+        select(*(getattr(Subscriber, name) for name in SubscriberRead.model_fields))
+        .filter(Subscriber.app_id == app_id)
+        .order_by(Subscriber.created_at, Subscriber.id)
+    )
+    if after is not None:
+        query = query.filter(
+            tuple_(Subscriber.created_at, Subscriber.id)
+            > tuple_(after["created_at"], after["id"])
+        )
+    return query
+
+
+# Archived messages in the shape of messages_query rows
+ArchivedMessageRow = namedtuple("ArchivedMessageRow", tuple(MessageRead.model_fields))
+
+# Archives (one per thread, holding all its archived messages) per fetch
+_ARCHIVES_PER_FETCH = 16
+
+
+async def merge_archived_messages(
+    db: AsyncSession,
+    app_id: UUID,
+    after: Mapping[str, Any] | None,
+    batches: AsyncIterator[Sequence[Row]],
+) -> AsyncIterator[Sequence[Row]]:
+    """Merge the app's archived messages into hot message batches in
+    (thread_id, seq) order; ``db`` must hold the snapshot ``batches`` read."""
+    query = (
+        select(ArchivedThread.thread_id, ArchivedThread.payload)
+        .join(Thread, Thread.id == ArchivedThread.thread_id)
+        .filter(Thread.app_id == app_id)
+        .order_by(ArchivedThread.thread_id)
+    )
+    if after is not None:
+        query = query.filter(ArchivedThread.thread_id >= after["thread_id"])
+    archives = await db.stream(query.execution_options(yield_per=_ARCHIVES_PER_FETCH))
+    archive = await anext(archives, None)
+    merged: list = []
+
+    def take_archive(archive) -> None:
+        for message in unpack_messages(archive.payload, archive.thread_id):
+            row = ArchivedMessageRow(**message)
+            if after is None or (row.thread_id, row.seq) > (
+                after["thread_id"],
+                after["seq"],
+            ):
+                merged.append(row)
+
+    size = settings.EXPORT_BATCH_SIZE
+    async for batch in batches:
+        for row in batch:
+            # Every archived seq of a thread precedes its hot seqs
+            while archive is not None and archive.thread_id <= row.thread_id:
+                take_archive(archive)
+                archive = await anext(archives, None)
+            merged.append(row)
+        while len(merged) >= size:
+            yield merged[:size]
+            del merged[:size]
+    while archive is not None:
+        take_archive(archive)
+        archive = await anext(archives, None)
+        while len(merged) >= size:
+            yield merged[:size]
+            del merged[:size]
+    if merged:
+        yield merged
+
+
+class ExportSource(NamedTuple):
+    """An exportable table: its query, row schema and resume key."""
+
+    query: Callable[[UUID, Mapping[str, Any] | None], Select]
+    model: type[BaseModel]
+    # Resume token payload: the ordering key of the last exported row
+    resume_schema: Mapping[str, Callable[[Any], Any]]
+    resume_key: Callable[[Row], dict[str, Any]]
+    # Rows merged into the query's batches from elsewhere (the archive)
+    merge: Callable[..., AsyncIterator[Sequence[Row]]] | None = None
+
+
+EXPORT_SOURCES: dict[str, ExportSource] = {
+    "threads": ExportSource(
+        threads_query,
+        ThreadRead,
+        {"created_at": parse_datetime, "id": parse_uuid},
+        lambda row: {"created_at": row.created_at, "id": row.id},
+    ),
+    "messages": ExportSource(
+        messages_query,
+        MessageRead,
+        {"thread_id": parse_uuid, "seq": parse_int},
+        lambda row: {"thread_id": row.thread_id, "seq": row.seq},
+        merge_archived_messages,
+    ),
+    "subscribers": ExportSource(
+        subscribers_query,
+        SubscriberRead,
+        {"created_at": parse_datetime, "id": parse_uuid},
+        lambda row: {"created_at": row.created_at, "id": row.id},
+    ),
+}
+
+
+async def stream_batches(
+    session_factory: async_sessionmaker, query: Select
+) -> AsyncIterator[Sequence[Row]]:
+    """Yield the query's rows in EXPORT_BATCH_SIZE batches from a server-side cursor."""
+    async with session_factory() as db:
+        result = await db.stream(
+            query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            yield batch
+
+
+async def export_batches(
+    session_factory: async_sessionmaker,
+    table: str,
+    app_id: UUID,
+    after: Mapping[str, Any] | None = None,
+) -> AsyncIterator[Sequence[Row]]:
+    """Row batches of one of EXPORT_SOURCES for an app, merged rows included."""
+    source = EXPORT_SOURCES[table]
+    query = source.query(app_id, after)
+    if source.merge is None:
+        async for batch in stream_batches(session_factory, query):
+            yield batch
+        return
+    async with session_factory() as db:
+        # Both cursors read one snapshot, so a thread archived mid-export is
+        # neither skipped nor exported twice
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        result = await db.stream(
+            query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for batch in source.merge(db, app_id, after, result.partitions()):
+            yield batch
+
+
+async def ndjson_export(
+    batches: AsyncIterator[Sequence[Row]],
+    serializer: TypeAdapter,
+    resume_key: Callable[[Row], dict[str, Any]],
+) -> AsyncIterator[bytes]:
+    """Serialize row batches as NDJSON with a checkpoint line after each batch."""
+    exported = 0
+    async for batch in batches:
+        lines = [serializer.dump_json(row._asdict()) for row in batch]
+        exported += len(batch)
+        checkpoint = {"resume_token": encode_cursor(resume_key(batch[-1]))}
+        lines.append(json.dumps(checkpoint).encode())
+        yield b"\n".join(lines) + b"\n"
+    yield json.dumps({"complete": True, "exported": exported}).encode() + b"\n"
+
+
+def export_ndjson(
+    session_factory: async_sessionmaker,
+    table: str,
+    app_id: UUID,
+    after: Mapping[str, Any] | None = None,
+) -> AsyncIterator[bytes]:
+    """NDJSON export of one of EXPORT_SOURCES for an app."""
+    source = EXPORT_SOURCES[table]
+    return ndjson_export(
+        export_batches(session_factory, table, app_id, after),
+        row_adapter(source.model, shape="row"),
+        source.resume_key,
+    )
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip a byte stream, flushing after every chunk so partial output decodes."""
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,212 @@
+"""Idempotency-Key support for write endpoints.
+
+A retried request carrying the same key (per app) gets the stored response
+back instead of repeating the write or the partner call. The key row is
+claimed inside the request's transaction, so a concurrent duplicate blocks on
+the primary key until the first request commits and then replays its result.
+Runs commit the claim before calling the partner, so a duplicate arriving
+during the call gets 409 instead of waiting on the lock.
+Stored responses are fronted by a small in-process LRU cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, event, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import IdempotencyKey
+
+IDEMPOTENT_REPLAY_HEADER = "Idempotent-Replayed"
+
+# Expired rows are purged opportunistically every N claims, in small batches.
+_PURGE_EVERY = 1000
+_PURGE_BATCH_SIZE = 500
+_PENDING_INFO_KEY = "idempotency_pending"
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: Any
+    expires_at: datetime
+
+
+_cache: OrderedDict[tuple[UUID, str], StoredResponse] = OrderedDict()
+_claims_since_purge = 0
+
+
+def _cache_get(app_id: UUID, key: str) -> StoredResponse | None:
+    entry = _cache.get((app_id, key))
+    if entry is None:
+        return None
+    if entry.expires_at <= datetime.now(timezone.utc):
+        _cache.pop((app_id, key), None)
+        return None
+    _cache.move_to_end((app_id, key))
+    return entry
+
+
+def _cache_put(app_id: UUID, key: str, entry: StoredResponse) -> None:
+    _cache[(app_id, key)] = entry
+    _cache.move_to_end((app_id, key))
+    while len(_cache) > settings.IDEMPOTENCY_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_responses(session: Session) -> None:
+    for (app_id, key), entry in session.info.pop(_PENDING_INFO_KEY, {}).items():
+        _cache_put(app_id, key, entry)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_uncommitted_responses(session: Session) -> None:
+    session.info.pop(_PENDING_INFO_KEY, None)
+
+
+def clear_cache() -> None:
+    """Drop all hot-cache entries (tests and app shutdown)."""
+    _cache.clear()
+
+
+def hash_request(method: str, path: str, body: bytes) -> str:
+    """Fingerprint a request so a key reused for a different request is rejected."""
+    digest = hashlib.sha256()
+    digest.update(method.encode("utf-8"))
+    digest.update(b" ")
+    digest.update(path.encode("utf-8"))
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def purge_expired_keys(db: AsyncSession, limit: int = _PURGE_BATCH_SIZE) -> int:
+    """Delete up to ``limit`` expired keys. Does not commit."""
+    expired = (
+        select(IdempotencyKey.app_id, IdempotencyKey.key)
+        .filter(IdempotencyKey.expires_at < datetime.now(timezone.utc))
+        .limit(limit)
+    )
+    result = await db.execute(
+        delete(IdempotencyKey)
+        .where(tuple_(IdempotencyKey.app_id, IdempotencyKey.key).in_(expired))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+class IdempotencyRequest:
+    """An Idempotency-Key attached to one write request."""
+
+    def __init__(self, app_id: UUID, key: str, request_hash: str) -> None:
+        self.app_id = app_id
+        self.key = key
+        self.request_hash = request_hash
+
+    def _check_stored(self, request_hash: str) -> None:
+        if request_hash != self.request_hash:
+            raise HTTPException(status_code=422, detail="ERROR_IDEMPOTENCY_KEY_REUSED")
+
+    async def claim(self, db: AsyncSession) -> Any | None:
+        """Reserve the key in the current transaction.
+
+        Returns None when this request owns the key and should do the work, or
+        the stored response body when the key was already used for this request.
+        Raises 422 if the key was used for a different request and 409 if the
+        original request has not finished yet.
+        """
+        global _claims_since_purge
+
+        cached = _cache_get(self.app_id, self.key)
+        if cached is not None:
+            self._check_stored(cached.request_hash)
+            return cached.body
+
+        _claims_since_purge += 1
+        if _claims_since_purge >= _PURGE_EVERY:
+            _claims_since_purge = 0
+            await purge_expired_keys(db)
+
+        now = datetime.now(timezone.utc)
+        insert_stmt = pg_insert(IdempotencyKey).values(
+            app_id=self.app_id,
+            key=self.key,
+            request_hash=self.request_hash,
+            created_at=now,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        )
+        # An expired key is reclaimed as if it had never been used.
+        claim_stmt = insert_stmt.on_conflict_do_update(
+            constraint="pk_idempotency_keys",
+            set_={
+                "request_hash": insert_stmt.excluded.request_hash,
+                "status_code": None,
+                "response_json": None,
+                "created_at": insert_stmt.excluded.created_at,
+                "expires_at": insert_stmt.excluded.expires_at,
+            },
+            where=IdempotencyKey.expires_at < now,
+        ).returning(IdempotencyKey.key)
+        if (await db.execute(claim_stmt)).first() is not None:
+            return None
+
+        result = await db.execute(
+            select(IdempotencyKey).filter(
+                IdempotencyKey.app_id == self.app_id, IdempotencyKey.key == self.key
+            )
+        )
+        stored = result.scalars().first()
+        self._check_stored(stored.request_hash)
+        if stored.status_code is None:
+            raise HTTPException(
+                status_code=409, detail="ERROR_IDEMPOTENCY_KEY_IN_PROGRESS"
+            )
+
+        _cache_put(
+            self.app_id,
+            self.key,
+            StoredResponse(
+                stored.request_hash,
+                stored.status_code,
+                stored.response_json,
+                stored.expires_at,
+            ),
+        )
+        return stored.response_json
+
+    async def save(self, db: AsyncSession, body: Any, status_code: int = 200) -> None:
+        """Record the response on the claimed key; persisted by the caller's commit."""
+        encoded = jsonable_encoder(body)
+        result = await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.app_id == self.app_id, IdempotencyKey.key == self.key)
+            .values(status_code=status_code, response_json=encoded)
+            .returning(IdempotencyKey.expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        expires_at = result.scalar_one()
+        # Cached by _cache_committed_responses once the response is durable.
+        db.info.setdefault(_PENDING_INFO_KEY, {})[(self.app_id, self.key)] = (
+            StoredResponse(self.request_hash, status_code, encoded, expires_at)
+        )
+
+    async def release(self, db: AsyncSession) -> None:
+        """Give the key up (e.g. on a retryable failure) and commit."""
+        await db.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.app_id == self.app_id, IdempotencyKey.key == self.key)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
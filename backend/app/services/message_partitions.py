@@ -0,0 +1,196 @@
+"""Monthly range partitions of the messages table.
+
+messages is partitioned by created_at, one partition per calendar month (UTC)
+named ``messages_yYYYYmMM``. Each partition has its own UNIQUE (thread_id,
+seq) constraint; across partitions seqs stay unique because they are only
+ever taken from Thread.next_seq under the thread row lock.
+
+Partitions for the current month and MESSAGE_PARTITIONS_AHEAD months ahead
+are created at startup and every MESSAGE_PARTITION_CHECK_SECONDS; writes with
+explicit timestamps (bulk history imports) call ``ensure_partitions`` for
+their months first. With MESSAGE_RETENTION_MONTHS set, older months are
+detached and dropped whole instead of deleting rows. Both operations avoid
+ACCESS EXCLUSIVE locks on messages, so reads and writes carry on meanwhile.
+
+Thread.messages_from bounds the created_at of a thread's messages from below,
+so reads of one thread skip the partitions before it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from sqlalchemy import Connection, event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import Message
+from app.services.worker_lock import worker_lock
+
+logger = get_logger(__name__)
+
+PARENT = Message.__tablename__
+PARTITION_NAME = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+# Advisory lock serializing partition DDL across workers
+_LOCK_KEY = 7_305_011
+
+_LIST_PARTITIONS = text(
+    "SELECT c.relname, i.inhdetachpending FROM pg_inherits i "
+    "JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = CAST(:parent AS regclass)"
+)
+
+_task: asyncio.Task | None = None
+
+
+def month_start(at: datetime) -> datetime:
+    at = at.astimezone(timezone.utc)
+    return datetime(at.year, at.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> datetime | None:
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+
+
+def _create_statements(month: datetime) -> list[str]:
+    """DDL creating a month's partition as a plain table, then attaching it.
+
+    ATTACH PARTITION takes only a SHARE UPDATE EXCLUSIVE lock on messages,
+    where CREATE TABLE ... PARTITION OF would block every reader.
+    """
+    name = partition_name(month)
+    return [
+        f"CREATE TABLE {name} (LIKE {PARENT} "
+        "INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE)",
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_uq_thread_seq "
+        "UNIQUE (thread_id, seq)",
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES "
+        f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')",
+    ]
+
+
+async def _partitions(conn: AsyncConnection) -> dict[str, bool]:
+    """Attached partitions of messages -> whether a detach is pending."""
+    result = await conn.execute(_LIST_PARTITIONS, {"parent": PARENT})
+    return dict(result.tuples().all())
+
+
+async def ensure_partitions(
+    engine: AsyncEngine, months: Iterable[datetime]
+) -> list[str]:
+    """Create the missing partitions for ``months``; returns the names created.
+
+    Runs in its own short transaction. Gives up after a 5s lock_timeout
+    instead of queueing behind other DDL on messages.
+    """
+    wanted = {partition_name(month): month_start(month) for month in months}
+    if not wanted:
+        return []
+    async with engine.begin() as conn:
+        if wanted.keys() <= (await _partitions(conn)).keys():
+            return []
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(select(func.pg_advisory_xact_lock(_LOCK_KEY)))
+        missing = sorted(wanted.keys() - (await _partitions(conn)).keys())
+        for name in missing:
+            for statement in _create_statements(wanted[name]):
+                await conn.exec_driver_sql(statement)
+    logger.info("Created message partitions: %s", ", ".join(missing))
+    return missing
+
+
+async def drop_partitions_before(engine: AsyncEngine, cutoff: datetime) -> list[str]:
+    """Detach and drop the partitions ending on or before ``cutoff``.
+
+    DETACH PARTITION ... CONCURRENTLY does not block messages but cannot run
+    in a transaction block, hence the autocommit connection. A detach left
+    pending by an interrupted run is finalized.
+    """
+    async with worker_lock(engine, _LOCK_KEY) as locked, engine.connect() as conn:
+        if not locked:
+            return []
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        expired = sorted(
+            (name, pending)
+            for name, pending in (await _partitions(conn)).items()
+            if (month := partition_month(name)) is not None
+            and add_months(month, 1) <= cutoff
+        )
+        for name, pending in expired:
+            mode = "FINALIZE" if pending else "CONCURRENTLY"
+            await conn.exec_driver_sql(
+                f"ALTER TABLE {PARENT} DETACH PARTITION {name} {mode}"
+            )
+            await conn.exec_driver_sql(f"DROP TABLE {name}")
+    dropped = [name for name, _ in expired]
+    if dropped:
+        logger.info("Dropped expired message partitions: %s", ", ".join(dropped))
+    return dropped
+
+
+async def maintain_partitions(engine: AsyncEngine) -> None:
+    """Create upcoming partitions and drop the months past retention."""
+    current = month_start(datetime.now(timezone.utc))
+    await ensure_partitions(
+        engine,
+        (add_months(current, n) for n in range(settings.MESSAGE_PARTITIONS_AHEAD + 1)),
+    )
+    if settings.MESSAGE_RETENTION_MONTHS > 0:
+        await drop_partitions_before(
+            engine, add_months(current, -settings.MESSAGE_RETENTION_MONTHS)
+        )
+
+
+async def _run(engines: tuple[AsyncEngine, ...]) -> None:
+    while True:
+        for engine in engines:
+            try:
+                await maintain_partitions(engine)
+            except Exception:
+                logger.exception("Message partition maintenance failed")
+        await asyncio.sleep(settings.MESSAGE_PARTITION_CHECK_SECONDS)
+
+
+def start_partition_maintenance(*engines: AsyncEngine) -> None:
+    """Run maintain_partitions on each database (shard) now and then
+    periodically on the current loop."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run(engines))
+
+
+async def stop_partition_maintenance() -> None:
+    global _task
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+@event.listens_for(Message.__table__, "after_create")
+def _create_initial_partitions(target, connection: Connection, **kw) -> None:
+    """Partitions around the current month when create_all builds messages.
+
+    Migrated databases get theirs from the migration and maintenance.
+    """
+    current = month_start(datetime.now(timezone.utc))
+    for n in range(-1, settings.MESSAGE_PARTITIONS_AHEAD + 1):
+        for statement in _create_statements(add_months(current, n)):
+            connection.exec_driver_sql(statement)
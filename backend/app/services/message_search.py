@@ -0,0 +1,119 @@
+"""Full-text search over an app's message content.
+
+Message.content_tsv is a stored generated tsvector, so the database keeps it
+current and matching never parses message text. The GIN index covers
+(ARRAY[app_id], content_tsv): a search reads the posting lists of its own app
+only, however many other apps match the same terms. A search runs as one
+statement in three steps:
+
+1. candidates: the app's messages matching the query (GIN index), keeping
+   the SEARCH_MAX_CANDIDATES newest, which bounds the ranking work for common
+   terms on very large apps;
+2. page: candidates ranked with ts_rank_cd on the stored vectors, one keyset
+   page ordered by (rank, created_at, id) descending;
+3. snippets: ts_headline for the page rows only, since it re-parses the text;
+   the page is joined back on the full (id, created_at) key so only the
+   partitions holding page rows are read.
+
+Snippets mark matches with ``<mark>``; the rest of the text is HTML-escaped.
+Archived messages (compressed blobs in archived_threads) have no tsvector and
+are not searched.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import Select, and_, cast, func, literal, literal_column
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.models import SEARCH_TEXT_CONFIG, Message
+from app.utils import build_desc_pagination_filter
+
+_CONFIG = literal_column(f"'{SEARCH_TEXT_CONFIG}'::regconfig")
+_HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, "
+    'MaxFragments=2, FragmentDelimiter=" … "'
+)
+
+
+def _html_escaped(text):
+    escaped = func.replace(text, "&", "&amp;")
+    escaped = func.replace(escaped, "<", "&lt;")
+    return func.replace(escaped, ">", "&gt;")
+
+
+def in_app(app_id: UUID):
+    """Filter on a message's app written as the GIN index expression, so it is
+    an index condition (there is no btree on messages.app_id)."""
+    return array([Message.app_id]).contains(array([cast(app_id, Message.app_id.type)]))
+
+
+def search_query(
+    app_id: UUID, q: str, limit: int, after: Mapping[str, Any] | None = None
+) -> Select:
+    """Ranked hits for web-search syntax ``q`` (quotes, OR, -term) in an app."""
+    tsquery = func.websearch_to_tsquery(_CONFIG, q)
+    candidates = (
+        select(
+            Message.id,
+            Message.thread_id,
+            Message.seq,
+            Message.role,
+            Message.created_at,
+            Message.content_tsv,
+        )
+        .filter(
+            in_app(app_id),
+            Message.content_tsv.op("@@")(tsquery),
+        )
+        .order_by(Message.created_at.desc())
+        .limit(settings.SEARCH_MAX_CANDIDATES)
+        .subquery("candidates")
+    )
+
+    rank = func.ts_rank_cd(candidates.c.content_tsv, tsquery)
+    ordering = [rank, candidates.c.created_at, candidates.c.id]
+    page = select(
+        candidates.c.id,
+        candidates.c.thread_id,
+        candidates.c.seq,
+        candidates.c.role,
+        candidates.c.created_at,
+        rank.label("rank"),
+    )
+    if after is not None:
+        page = page.filter(
+            build_desc_pagination_filter(
+                ordering, [after["rank"], after["created_at"], after["id"]]
+            )
+        )
+    page = (
+        page.order_by(*(column.desc() for column in ordering))
+        .limit(limit)
+        .subquery("page")
+    )
+
+    snippet = func.ts_headline(
+        _CONFIG, _html_escaped(Message.content), tsquery, literal(_HEADLINE_OPTIONS)
+    )
+    return (
+        select(
+            page.c.id,
+            page.c.thread_id,
+            page.c.seq,
+            page.c.role,
+            page.c.created_at,
+            page.c.rank,
+            snippet.label("snippet"),
+        )
+        .join(
+            Message,
+            and_(Message.id == page.c.id, Message.created_at == page.c.created_at),
+        )
+        .order_by(page.c.rank.desc(), page.c.created_at.desc(), page.c.id.desc())
+    )
@@ -1,11 +1,110 @@
 """Service for creating and persisting messages."""
 
+from collections import defaultdict
+from collections.abc import Sequence
 from datetime import datetime, timezone
+from uuid import UUID
 
+from sqlalchemy import DateTime, Integer, column, func, insert, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.models import Message, Thread
+from app.schemas import MessageRead
+from app.services.activity_tracker import activity_tracker
+from app.services.idempotency import IdempotencyRequest
+from app.services.realtime import publish_message_created, publish_messages_created
+from app.services.subscriber_service import resolve_subscriber
+from app.services.thread_archive import archived_messages
+
+# Messages sent to the orchestrator as conversation history
+HISTORY_LIMIT = 10
+
+
+async def get_history(
+    thread_id: UUID, db: AsyncSession, limit: int = HISTORY_LIMIT
+) -> list[Message]:
+    """Get the last ``limit`` messages of a thread, oldest first (history_tail).
+
+    Filled up from the thread's cold-storage archive when the hot messages
+    are fewer than ``limit``.
+    """
+    thread = (
+        await db.execute(
+            select(Thread.id, Thread.messages_from, Thread.archived_seq).filter(
+                Thread.id == thread_id
+            )
+        )
+    ).one()
+    result = await db.execute(
+        select(Message)
+        .filter(
+            Message.thread_id == thread_id, Message.created_at >= thread.messages_from
+        )
+        .order_by(Message.seq.desc())
+        .limit(limit)
+    )
+    messages = list(result.scalars().all())
+    messages.reverse()  # Oldest first
+    if len(messages) < limit and thread.archived_seq is not None:
+        archived = await archived_messages(db, thread)
+        missing = limit - len(messages)
+        messages = [Message(**m) for m in archived[-missing:]] + messages
+    return messages
+
+
+async def persist_user_message(
+    thread_id: UUID,
+    content: str | None,
+    db: AsyncSession,
+    *,
+    content_json: dict | None = None,
+    idempotency: IdempotencyRequest | None = None,
+) -> Message:
+    """Append a user message with atomically allocated seq and commit.
+
+    The thread row is locked for seq allocation, the subscriber is resolved
+    from the thread's customer_id when needed, and subscriber activity is
+    recorded after commit. A claimed ``idempotency`` key gets the message as
+    its response in the same transaction.
+    """
+    result = await db.execute(
+        select(Thread).filter(Thread.id == thread_id).with_for_update()
+    )
+    locked_thread = result.scalars().first()
+
+    now = datetime.now(timezone.utc)
+    allocated_seq = locked_thread.next_seq
+    locked_thread.next_seq += 1
+    locked_thread.updated_at = now
+
+    subscriber_id = locked_thread.subscriber_id
+    if not subscriber_id and locked_thread.customer_id:
+        subscriber = await resolve_subscriber(
+            db, app_id=locked_thread.app_id, customer_id=locked_thread.customer_id
+        )
+        subscriber_id = locked_thread.subscriber_id = subscriber.id
+
+    msg = Message(
+        thread_id=thread_id,
+        app_id=locked_thread.app_id,
+        seq=allocated_seq,
+        role="user",
+        content=content,
+        content_json=content_json or {},
+    )
+    db.add(msg)
+    await db.flush()
+    await publish_message_created(db, locked_thread.app_id, msg)
+    if idempotency:
+        await idempotency.save(db, MessageRead.model_validate(msg))
+    await db.commit()
+    await db.refresh(msg)
+
+    if subscriber_id:
+        activity_tracker.record(subscriber_id, now)
+    return msg
 
 
 async def persist_assistant_message(
@@ -14,8 +113,13 @@ async def persist_assistant_message(
     db: AsyncSession,
     *,
     content_json: dict | None = None,
+    commit: bool = True,
 ) -> Message:
-    """Create an assistant message with atomically allocated seq."""
+    """Create an assistant message with atomically allocated seq.
+
+    With ``commit=False`` the message is only flushed and the caller commits,
+    e.g. after storing an idempotent response in the same transaction.
+    """
     result = await db.execute(
         select(Thread).filter(Thread.id == thread.id).with_for_update()
     )
@@ -27,12 +131,123 @@ async def persist_assistant_message(
 
     msg = Message(
         thread_id=thread.id,
+        app_id=thread.app_id,
         seq=allocated_seq,
         role="assistant",
         content=content,
         content_json=content_json or {},
     )
     db.add(msg)
-    await db.commit()
-    await db.refresh(msg)
+    await db.flush()
+    await publish_message_created(db, thread.app_id, msg)
+    if commit:
+        await db.commit()
+        await db.refresh(msg)
     return msg
+
+
+async def persist_assistant_messages(
+    replies: Sequence[tuple[UUID, str, dict]],
+    db: AsyncSession,
+) -> list[Message]:
+    """Persist assistant replies for many threads in one transaction.
+
+    Each entry is ``(thread_id, content, content_json)``; thread ids must be
+    unique. Seqs are allocated with a single ``UPDATE ... RETURNING`` (after
+    locking the rows in id order to avoid deadlocks with concurrent writers)
+    and the messages are written with one multi-row ``INSERT``.
+    """
+    if not replies:
+        return []
+
+    thread_ids = [thread_id for thread_id, _, _ in replies]
+    await db.execute(
+        select(Thread.id)
+        .filter(Thread.id.in_(thread_ids))
+        .order_by(Thread.id)
+        .with_for_update()
+    )
+    result = await db.execute(
+        update(Thread)
+        .where(Thread.id.in_(thread_ids))
+        .values(next_seq=Thread.next_seq + 1, updated_at=datetime.now(timezone.utc))
+        .returning(Thread.id, Thread.app_id, Thread.next_seq)
+        .execution_options(synchronize_session=False)
+    )
+    allocated = {}
+    app_ids = {}
+    for row in result:
+        allocated[row.id] = row.next_seq - 1
+        app_ids[row.id] = row.app_id
+
+    rows = [
+        {
+            "thread_id": thread_id,
+            "app_id": app_ids[thread_id],
+            "seq": allocated[thread_id],
+            "role": "assistant",
+            "content": content,
+            "content_json": content_json or {},
+        }
+        for thread_id, content, content_json in replies
+        if thread_id in allocated
+    ]
+    if not rows:
+        return []
+
+    messages = (await db.scalars(insert(Message).returning(Message), rows)).all()
+    by_app: dict[UUID, list[Message]] = defaultdict(list)
+    for msg in messages:
+        by_app[app_ids[msg.thread_id]].append(msg)
+    for app_id, app_messages in by_app.items():
+        await publish_messages_created(db, app_id, app_messages)
+    await db.commit()
+    return list(messages)
+
+
+async def allocate_seq_ranges(
+    db: AsyncSession,
+    app_id: UUID,
+    counts: dict[UUID, int],
+    earliest: dict[UUID, datetime] | None = None,
+) -> dict[UUID, tuple[int, UUID | None]]:
+    """Reserve ``counts[thread_id]`` consecutive seqs for each thread of an app.
+
+    Locks the thread rows in id order, then bumps every ``next_seq`` with a
+    single ``UPDATE ... FROM (VALUES ...) RETURNING``. ``earliest`` gives the
+    oldest created_at about to be written per thread, lowering
+    ``messages_from`` for backdated messages. Returns
+    ``{thread_id: (first_seq, subscriber_id)}``; threads missing from the app
+    are absent from the result. Does not commit.
+    """
+    if not counts:
+        return {}
+    earliest = earliest or {}
+
+    await db.execute(
+        select(Thread.id)
+        .filter(Thread.app_id == app_id, Thread.id.in_(list(counts)))
+        .order_by(Thread.id)
+        .with_for_update()
+    )
+    seq_counts = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("n", Integer),
+        column("earliest", DateTime(timezone=True)),
+        name="seq_counts",
+    ).data([(thread_id, n, earliest.get(thread_id)) for thread_id, n in counts.items()])
+    result = await db.execute(
+        update(Thread)
+        .where(Thread.id == seq_counts.c.id, Thread.app_id == app_id)
+        .values(
+            next_seq=Thread.next_seq + seq_counts.c.n,
+            updated_at=datetime.now(timezone.utc),
+            # least() ignores NULL
+            messages_from=func.least(Thread.messages_from, seq_counts.c.earliest),
+        )
+        .returning(Thread.id, Thread.next_seq, Thread.subscriber_id)
+        .execution_options(synchronize_session=False)
+    )
+    return {
+        row.id: (row.next_seq - counts[row.id], row.subscriber_id) for row in result
+    }
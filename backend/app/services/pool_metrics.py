@@ -0,0 +1,265 @@
+"""Connection pool and session instrumentation.
+
+Every engine (shards and replicas) is registered with ``instrument``. Pool
+events time how long each connection is held, from checkout to checkin, and
+attribute it to the route of the request that checked it out (set by
+PoolMetricsMiddleware); connections taken outside requests count as
+"background". The pool classes below time the checkout itself (the wait for
+a free connection; for NullPool, the connect) and count pool timeouts.
+
+While a connection is held longer than DATABASE_HOLD_WARN_SECONDS a warning
+is logged once, without waiting for the checkin: a session that lives as long
+as an SSE stream would otherwise only show up when the stream ends.
+
+``snapshot`` backs GET /metrics/database. Counters are per worker process,
+since it started.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import AsyncAdaptedQueuePool, NullPool, QueuePool, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+BACKGROUND = "background"
+
+_request_scope: ContextVar[Scope | None] = ContextVar(
+    "pool_metrics_request_scope", default=None
+)
+
+_task: asyncio.Task | None = None
+
+
+class _Durations:
+    """Count, total and maximum of durations in seconds."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def read(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+class _Checkout:
+    __slots__ = ("started", "scope", "warned")
+
+    def __init__(self, scope: Scope | None) -> None:
+        self.started = time.perf_counter()
+        self.scope = scope
+        self.warned = False
+
+
+class PoolMetrics:
+    """Checkout waits, timeouts and open checkouts of one engine's pool."""
+
+    def __init__(self, name: str, engine: AsyncEngine) -> None:
+        self.name = name
+        self.engine = engine
+        self.wait = _Durations()
+        self.timeouts = 0
+        # id(connection record) -> checkout, while the connection is held
+        self.open: dict[int, _Checkout] = {}
+
+
+_pools: list[PoolMetrics] = []
+# Route label -> hold durations, and holds over the warning threshold
+_holds: defaultdict[str, _Durations] = defaultdict(_Durations)
+_long_holds: Counter[str] = Counter()
+
+
+def route_label(scope: Scope | None) -> str:
+    """``METHOD /path/{template}`` of a request scope (WS for WebSockets)."""
+    if scope is None:
+        return BACKGROUND
+    method = scope.get("method", "WS")
+    route = scope.get("route")
+    return f"{method} {route.path}" if route is not None else f"{method} (unmatched)"
+
+
+class _TimedCheckout:
+    """Times the pool's checkout (set ``metrics`` to record)."""
+
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        metrics = self.metrics
+        if metrics is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.wait.add(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def instrument(engine: AsyncEngine, name: str) -> PoolMetrics:
+    """Record checkout waits and connection holds of ``engine``."""
+    metrics = PoolMetrics(name, engine)
+    sync_engine = engine.sync_engine
+
+    def attach(*_) -> None:
+        # dispose() replaces the pool
+        if isinstance(sync_engine.pool, _TimedCheckout):
+            sync_engine.pool.metrics = metrics
+
+    def on_checkout(dbapi_connection, record, proxy) -> None:
+        metrics.open[id(record)] = _Checkout(_request_scope.get())
+
+    def on_checkin(dbapi_connection, record) -> None:
+        checkout = metrics.open.pop(id(record), None)
+        if checkout is None:
+            return
+        held = time.perf_counter() - checkout.started
+        label = route_label(checkout.scope)
+        _holds[label].add(held)
+        if held >= settings.DATABASE_HOLD_WARN_SECONDS:
+            _long_holds[label] += 1
+            if not checkout.warned:
+                _warn(metrics, checkout, held)
+
+    attach()
+    event.listen(sync_engine, "engine_disposed", attach)
+    event.listen(sync_engine, "checkout", on_checkout)
+    event.listen(sync_engine, "checkin", on_checkin)
+    _pools.append(metrics)
+    return metrics
+
+
+def _warn(metrics: PoolMetrics, checkout: _Checkout, held: float) -> None:
+    checkout.warned = True
+    logger.warning(
+        "Database connection (%s) held for %.0fs by %s",
+        metrics.name,
+        held,
+        route_label(checkout.scope),
+    )
+
+
+def warn_long_held() -> int:
+    """Warn (once each) about connections held past the threshold; returns
+    how many are currently held that long."""
+    now = time.perf_counter()
+    count = 0
+    for metrics in _pools:
+        for checkout in list(metrics.open.values()):
+            held = now - checkout.started
+            if held >= settings.DATABASE_HOLD_WARN_SECONDS:
+                count += 1
+                if not checkout.warned:
+                    _warn(metrics, checkout, held)
+    return count
+
+
+def snapshot() -> dict[str, Any]:
+    """Pool gauges and counters, hold times per route, and long-held connections."""
+    now = time.perf_counter()
+    pools = []
+    held = []
+    for metrics in _pools:
+        pool = metrics.engine.sync_engine.pool
+        queue = isinstance(pool, QueuePool)
+        pools.append(
+            {
+                "name": metrics.name,
+                "pool_class": type(pool).__name__,
+                "size": pool.size() if queue else 0,
+                "max_overflow": settings.DATABASE_MAX_OVERFLOW if queue else 0,
+                "in_use": len(metrics.open),
+                "idle": pool.checkedin() if queue else 0,
+                "overflow": max(pool.overflow(), 0) if queue else 0,
+                "checkout_wait": metrics.wait.read(),
+                "checkout_timeouts": metrics.timeouts,
+            }
+        )
+        held += [
+            {
+                "pool": metrics.name,
+                "route": route_label(checkout.scope),
+                "held_seconds": now - checkout.started,
+            }
+            for checkout in metrics.open.values()
+            if now - checkout.started >= settings.DATABASE_HOLD_WARN_SECONDS
+        ]
+    return {
+        "hold_warn_seconds": settings.DATABASE_HOLD_WARN_SECONDS,
+        "pools": pools,
+        "routes": [
+            {"route": label, **durations.read(), "long_holds": _long_holds[label]}
+            for label, durations in sorted(_holds.items())
+        ],
+        "long_held": sorted(held, key=lambda h: -h["held_seconds"]),
+    }
+
+
+class PoolMetricsMiddleware:
+    """Makes the request visible to the pool events (route attribution)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(settings.DATABASE_HOLD_WARN_SECONDS / 2)
+        warn_long_held()
+
+
+def start_pool_monitor() -> None:
+    """Check for long-held connections twice per DATABASE_HOLD_WARN_SECONDS."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run())
+
+
+async def stop_pool_monitor() -> None:
+    global _task
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
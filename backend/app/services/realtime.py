@@ -0,0 +1,293 @@
+"""Realtime message/thread events over Postgres LISTEN/NOTIFY.
+
+Write paths call ``publish_*`` inside their transaction; Postgres delivers the
+NOTIFY only when that transaction commits, so subscribers never see events
+for rolled-back writes. Each worker keeps one dedicated LISTEN connection
+(``RealtimeHub``) and fans notifications out to in-process subscriptions,
+which back the SSE endpoints in ``app.routes.realtime``. Published events are
+also appended to the app's change feed (``app.services.change_feed``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from typing import Any
+from uuid import UUID
+
+import asyncpg
+from sqlalchemy import Text, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import Message
+from app.schemas import MessageRead
+from app.services.change_feed import (
+    CHANGES_APPENDED,
+    MESSAGE_CREATED,
+    THREAD_UPDATED,
+    record_changes,
+)
+
+logger = get_logger(__name__)
+
+RESYNC = "resync"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+_MAX_PAYLOAD_BYTES = 7900
+
+
+def _encode(event: str, app_id: UUID, thread_id: UUID, data: dict[str, Any]) -> str:
+    return json.dumps(
+        {
+            "event": event,
+            "app_id": str(app_id),
+            "thread_id": str(thread_id),
+            "data": data,
+        },
+        default=str,
+        separators=(",", ":"),
+    )
+
+
+async def _notify(db: AsyncSession, payload: str) -> None:
+    await db.execute(select(func.pg_notify(settings.REALTIME_CHANNEL, payload)))
+
+
+async def _notify_many(db: AsyncSession, payloads: list[str]) -> None:
+    """Send many notifications with a single statement."""
+    payload = func.unnest(
+        bindparam("payloads", value=payloads, type_=ARRAY(Text))
+    ).column_valued("payload")
+    await db.execute(select(func.pg_notify(settings.REALTIME_CHANNEL, payload)))
+
+
+def _message_payload(app_id: UUID, message: Message) -> str:
+    """message.created payload; messages too large for a NOTIFY payload are
+    sent without content and flagged ``truncated`` so clients refetch them."""
+    data = MessageRead.model_validate(message).model_dump(mode="json")
+    payload = _encode(MESSAGE_CREATED, app_id, message.thread_id, data)
+    if len(payload.encode("utf-8")) > _MAX_PAYLOAD_BYTES:
+        data = {
+            "id": data["id"],
+            "thread_id": data["thread_id"],
+            "seq": data["seq"],
+            "role": data["role"],
+            "created_at": data["created_at"],
+            "truncated": True,
+        }
+        payload = _encode(MESSAGE_CREATED, app_id, message.thread_id, data)
+    return payload
+
+
+async def publish_message_created(
+    db: AsyncSession, app_id: UUID, message: Message
+) -> None:
+    """Queue a message.created event; sent when the transaction commits.
+
+    The message must be flushed.
+    """
+    await _notify(db, _message_payload(app_id, message))
+    await record_changes(
+        db, app_id, [(MESSAGE_CREATED, message.id, message.thread_id)], notify=False
+    )
+
+
+async def publish_messages_created(
+    db: AsyncSession, app_id: UUID, messages: Sequence[Message]
+) -> None:
+    """Queue one message.created event per message with a single statement."""
+    if messages:
+        await _notify_many(
+            db, [_message_payload(app_id, message) for message in messages]
+        )
+        await record_changes(
+            db,
+            app_id,
+            [(MESSAGE_CREATED, message.id, message.thread_id) for message in messages],
+            notify=False,
+        )
+
+
+async def publish_thread_updated(
+    db: AsyncSession, app_id: UUID, thread_id: UUID, fields: dict[str, Any]
+) -> None:
+    """Queue a thread.updated event carrying the thread's (changed) ``fields``."""
+    await _notify(db, _encode(THREAD_UPDATED, app_id, thread_id, fields))
+    await record_changes(
+        db, app_id, [(THREAD_UPDATED, thread_id, thread_id)], notify=False
+    )
+
+
+async def publish_threads_updated(
+    db: AsyncSession, app_id: UUID, updates: dict[UUID, dict[str, Any]]
+) -> None:
+    """Queue one thread.updated event per thread (``{thread_id: fields}``)."""
+    if updates:
+        await _notify_many(
+            db,
+            [
+                _encode(THREAD_UPDATED, app_id, thread_id, fields)
+                for thread_id, fields in updates.items()
+            ],
+        )
+        await record_changes(
+            db,
+            app_id,
+            [(THREAD_UPDATED, thread_id, thread_id) for thread_id in updates],
+            notify=False,
+        )
+
+
+class Subscription:
+    """Events for one SSE client: a whole app, or a single thread of it."""
+
+    def __init__(self, app_id: UUID, thread_id: UUID | None, maxsize: int) -> None:
+        self.app_id = app_id
+        self.thread_id = thread_id
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def push(self, event: dict[str, Any]) -> None:
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: tell the client to refetch, then stop.
+            self.close()
+
+    def close(self) -> None:
+        """Deliver a final resync event (dropping anything still queued)."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"event": RESYNC, "data": {}})
+
+    async def get(self) -> dict[str, Any]:
+        return await self.queue.get()
+
+
+class RealtimeHub:
+    """One LISTEN connection per worker, fanned out to local subscriptions.
+
+    With app-level sharding there is one connection per shard: a NOTIFY is
+    only delivered on the database its transaction wrote to.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        channel: str,
+        queue_size: int,
+        shard_urls: Sequence[str] = (),
+    ) -> None:
+        self.dsns = [
+            make_url(url).set(drivername="postgresql")
+            for url in (database_url, *shard_urls)
+        ]
+        self.channel = channel
+        self.queue_size = queue_size
+        self._conns: dict[int, asyncpg.Connection] = {}
+        self._lock = asyncio.Lock()
+        # ("app" | "thread", id) -> subscriptions
+        self._subscriptions: dict[tuple[str, UUID], set[Subscription]] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def _listening(self) -> bool:
+        return len(self._conns) == len(self.dsns) and not any(
+            conn.is_closed() for conn in self._conns.values()
+        )
+
+    async def start(self) -> None:
+        """Open the LISTEN connections that are not already open."""
+        if self._listening():
+            return
+        async with self._lock:
+            for index, dsn in enumerate(self.dsns):
+                conn = self._conns.get(index)
+                if conn is not None and not conn.is_closed():
+                    continue
+                conn = await asyncpg.connect(dsn.render_as_string(hide_password=False))
+                await conn.add_listener(self.channel, self._on_notify)
+                conn.add_termination_listener(self._on_connection_lost)
+                self._conns[index] = conn
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            keys = [("app", UUID(event["app_id"]))]
+            # Change feed wake-ups are app-wide
+            if event["event"] != CHANGES_APPENDED:
+                keys.append(("thread", UUID(event["thread_id"])))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed realtime payload: %.200s", payload)
+            return
+        for key in keys:
+            for subscription in list(self._subscriptions.get(key, ())):
+                subscription.push(event)
+
+    def _on_connection_lost(self, conn) -> None:
+        # Notifications sent while disconnected are lost: make every client
+        # resync (SSE clients reconnect, which re-establishes LISTEN).
+        logger.warning("Realtime LISTEN connection lost")
+        self._conns = {i: c for i, c in self._conns.items() if c is not conn}
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    @asynccontextmanager
+    async def subscribe(
+        self, app_id: UUID, thread_id: UUID | None = None
+    ) -> AsyncIterator[Subscription]:
+        """Receive events for an app, or only for one of its threads."""
+        await self.start()
+        subscription = Subscription(app_id, thread_id, self.queue_size)
+        key = ("thread", thread_id) if thread_id is not None else ("app", app_id)
+        self._subscriptions.setdefault(key, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscriptions.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[key]
+
+    async def close(self) -> None:
+        """Close the LISTEN connections and end all subscriptions."""
+        conns, self._conns = self._conns, {}
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+        for conn in conns.values():
+            if not conn.is_closed():
+                conn.remove_termination_listener(self._on_connection_lost)
+                await conn.close()
+
+
+_listen_urls = settings.REALTIME_DATABASE_URLS or [
+    settings.DATABASE_URL,
+    *settings.DATABASE_SHARD_URLS,
+]
+realtime_hub = RealtimeHub(
+    _listen_urls[0],
+    settings.REALTIME_CHANNEL,
+    settings.REALTIME_QUEUE_SIZE,
+    _listen_urls[1:],
+)
+
+
+def get_realtime_hub() -> RealtimeHub:
+    """Return the worker's hub (a dependency so tests can point it elsewhere)."""
+    return realtime_hub
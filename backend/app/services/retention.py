@@ -0,0 +1,343 @@
+"""Per-app data retention, enforced in small batches in the background.
+
+An app opts in with a policy in ``config_json["retention"]`` (see
+RetentionPolicy). Every RETENTION_CHECK_SECONDS one worker (the others skip
+on an advisory lock) makes a pass over each such app:
+
+* messages older than ``messages_days`` are deleted, walking the app's
+  threads in id order (keyset) and deleting at most RETENTION_BATCH_SIZE
+  messages per committed statement. The cutoff on created_at prunes the
+  partitions that cannot hold expired rows. Only threads that still hold
+  (hot or archived) messages older than the cutoff are visited, so threads
+  with nothing to trim are neither locked nor rewritten. Afterwards
+  Thread.messages_from is raised to the cutoff, which makes reads skip the
+  trimmed months. Archived messages past the cutoff are dropped from the
+  thread's archive.
+* threads not updated for ``threads_inactive_days`` are deleted: their
+  messages first in the same batches, then the thread rows, customers left
+  without threads, and their segment counts, with change feed entries like
+  delete_thread.
+
+Batches pick their rows with ``FOR UPDATE SKIP LOCKED`` so they never wait on
+(or block) concurrent writers; skipped rows are retried on the next pass.
+Messages are addressed by their primary key (id, created_at): ctid is only
+unique within one partition. A pause of RETENTION_PAUSE_SECONDS between
+batches leaves room for regular traffic and autovacuum. Each pass is recorded
+as a RetentionRun with its counts and timing (throughput). Cold threads are
+then moved to cold storage (app.services.thread_archive), and change feed
+entries past CHANGE_FEED_RETENTION_DAYS are pruned (app.services.change_feed).
+
+Deleted messages are not in the change feed; mirrors apply the same policy.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import delete, exists, func, or_, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import (
+    App,
+    ArchivedThread,
+    Message,
+    RetentionRun,
+    Subscriber,
+    Thread,
+)
+from app.schemas import RetentionPolicy
+from app.services.change_feed import (
+    SUBSCRIBER_DELETED,
+    THREAD_DELETED,
+    prune_changes,
+    record_changes,
+)
+from app.services.thread_archive import archive_threads, trim_archives
+from app.services.worker_lock import worker_lock
+from app.services.segments import (
+    app_segments,
+    apply_member_deltas,
+    count_members_among,
+)
+
+logger = get_logger(__name__)
+
+# Threads handled per chunk (messages of a chunk are deleted in batches)
+_THREAD_CHUNK_SIZE = 100
+
+# Advisory lock held by the worker making a pass
+_LOCK_KEY = 7_305_012
+
+_task: asyncio.Task | None = None
+
+
+class _Progress:
+    """Counters of a pass, written to its RetentionRun with every batch."""
+
+    def __init__(self, run_id: UUID) -> None:
+        self.run_id = run_id
+        self.messages_deleted = 0
+        self.threads_deleted = 0
+        self.subscribers_deleted = 0
+        self.batches = 0
+
+    async def commit(self, db: AsyncSession, **values) -> None:
+        await db.execute(
+            update(RetentionRun)
+            .where(RetentionRun.id == self.run_id)
+            .values(
+                messages_deleted=self.messages_deleted,
+                threads_deleted=self.threads_deleted,
+                subscribers_deleted=self.subscribers_deleted,
+                batches=self.batches,
+                **values,
+            )
+        )
+        await db.commit()
+
+
+def _message_batch(thread_ids, cutoff: datetime | None = None):
+    """Delete up to a batch of the threads' messages (older than ``cutoff``)."""
+    conditions = [] if cutoff is None else [Message.created_at < cutoff]
+    batch = (
+        select(Message.id, Message.created_at)
+        .filter(Message.thread_id.in_(thread_ids), *conditions)
+        .limit(settings.RETENTION_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(Message).where(
+        *conditions, tuple_(Message.id, Message.created_at).in_(batch)
+    )
+
+
+async def _delete_in_batches(db: AsyncSession, stmt, progress: _Progress) -> None:
+    while True:
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        deleted = result.rowcount or 0
+        progress.messages_deleted += deleted
+        progress.batches += 1
+        await progress.commit(db)
+        if deleted < settings.RETENTION_BATCH_SIZE:
+            return
+        await asyncio.sleep(settings.RETENTION_PAUSE_SECONDS)
+
+
+async def _trim_messages(
+    db: AsyncSession, app_id: UUID, cutoff: datetime, progress: _Progress
+) -> None:
+    # The cutoff moves with every pass, so messages_from < cutoff alone would
+    # match every thread again; the existence checks are index lookups
+    expired = or_(
+        exists().where(Message.thread_id == Thread.id, Message.created_at < cutoff),
+        exists().where(
+            ArchivedThread.thread_id == Thread.id, ArchivedThread.oldest_at < cutoff
+        ),
+    )
+    last_id = None
+    while True:
+        query = select(Thread.id).filter(
+            Thread.app_id == app_id, Thread.messages_from < cutoff, expired
+        )
+        if last_id is not None:
+            query = query.filter(Thread.id > last_id)
+        thread_ids = (
+            await db.scalars(query.order_by(Thread.id).limit(_THREAD_CHUNK_SIZE))
+        ).all()
+        if not thread_ids:
+            return
+        last_id = thread_ids[-1]
+
+        await _delete_in_batches(db, _message_batch(thread_ids, cutoff), progress)
+
+        # Under the thread lock (backdated imports lower messages_from under it
+        # too), raise the bound of threads with nothing older left.
+        locked = (
+            select(Thread.id)
+            .filter(Thread.id.in_(thread_ids))
+            .with_for_update(skip_locked=True)
+        )
+        locked_ids = (await db.scalars(locked)).all()
+        progress.messages_deleted += await trim_archives(db, locked_ids, cutoff)
+        await db.execute(
+            update(Thread)
+            .where(
+                Thread.id.in_(locked_ids),
+                Thread.messages_from < cutoff,
+                ~exists().where(
+                    Message.thread_id == Thread.id, Message.created_at < cutoff
+                ),
+            )
+            .values(
+                messages_from=func.greatest(Thread.messages_from, cutoff),
+                # Not activity: the thread must still age towards expiry
+                updated_at=Thread.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+async def _delete_threads(
+    db: AsyncSession, app_id: UUID, cutoff: datetime, progress: _Progress
+) -> None:
+    last = None
+    while True:
+        query = select(Thread.updated_at, Thread.id).filter(
+            Thread.app_id == app_id, Thread.updated_at < cutoff
+        )
+        if last is not None:
+            query = query.filter(tuple_(Thread.updated_at, Thread.id) > tuple_(*last))
+        chunk = (
+            await db.execute(
+                query.order_by(Thread.updated_at, Thread.id).limit(_THREAD_CHUNK_SIZE)
+            )
+        ).all()
+        if not chunk:
+            return
+        last = tuple(chunk[-1])
+
+        # Still inactive: a thread revived meanwhile keeps its messages
+        inactive = select(Thread.id).filter(
+            Thread.id.in_([row.id for row in chunk]), Thread.updated_at < cutoff
+        )
+        await _delete_in_batches(db, _message_batch(inactive), progress)
+
+        deleted = (
+            await db.execute(
+                delete(Thread)
+                .where(Thread.id.in_(inactive.with_for_update(skip_locked=True)))
+                .returning(Thread.id, Thread.subscriber_id)
+                .execution_options(synchronize_session=False)
+            )
+        ).all()
+        changes = [(THREAD_DELETED, row.id, row.id) for row in deleted]
+
+        subscriber_ids = {row.subscriber_id for row in deleted if row.subscriber_id}
+        if subscriber_ids:
+            orphaned = Subscriber.id.in_(subscriber_ids) & ~exists().where(
+                Thread.subscriber_id == Subscriber.id
+            )
+            segments = await app_segments(db, app_id)
+            if segments:
+                members = await count_members_among(db, app_id, segments, orphaned)
+                await apply_member_deltas(db, segments, members, [0] * len(segments))
+            removed = (
+                await db.scalars(
+                    delete(Subscriber)
+                    .where(orphaned)
+                    .returning(Subscriber.id)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            changes += [(SUBSCRIBER_DELETED, sid, None) for sid in removed]
+            progress.subscribers_deleted += len(removed)
+
+        await record_changes(db, app_id, changes)
+        progress.threads_deleted += len(deleted)
+        progress.batches += 1
+        await progress.commit(db)
+        await asyncio.sleep(settings.RETENTION_PAUSE_SECONDS)
+
+
+async def enforce_retention(
+    session_factory: async_sessionmaker, app_id: UUID, policy: RetentionPolicy
+) -> UUID:
+    """Make one pass of ``policy`` over an app; returns the RetentionRun id."""
+    now = datetime.now(timezone.utc)
+    async with session_factory() as db:
+        run = RetentionRun(app_id=app_id, started_at=now)
+        db.add(run)
+        await db.commit()
+        progress = _Progress(run.id)
+        try:
+            if policy.messages_days is not None:
+                cutoff = now - timedelta(days=policy.messages_days)
+                await _trim_messages(db, app_id, cutoff, progress)
+            if policy.threads_inactive_days is not None:
+                cutoff = now - timedelta(days=policy.threads_inactive_days)
+                await _delete_threads(db, app_id, cutoff, progress)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Retention pass over app %s failed", app_id)
+            await db.rollback()
+            await progress.commit(
+                db,
+                status="failed",
+                error=str(exc)[:500],
+                finished_at=datetime.now(timezone.utc),
+            )
+            return progress.run_id
+
+        finished = datetime.now(timezone.utc)
+        await progress.commit(db, status="completed", finished_at=finished)
+    seconds = (finished - now).total_seconds()
+    rows = progress.messages_deleted + progress.threads_deleted
+    if rows:
+        logger.info(
+            "Retention for app %s: %d messages, %d threads in %d batches, "
+            "%.1fs (%.0f rows/s)",
+            app_id,
+            progress.messages_deleted,
+            progress.threads_deleted,
+            progress.batches,
+            seconds,
+            rows / seconds if seconds > 0 else 0,
+        )
+    return progress.run_id
+
+
+async def run_retention(engine: AsyncEngine) -> None:
+    """One pass over every app with a retention policy, then archival of cold
+    threads and change feed pruning, unless another worker is already running
+    one."""
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with worker_lock(engine, _LOCK_KEY) as locked:
+        if not locked:
+            return
+        async with session_factory() as db:
+            apps = (
+                await db.execute(
+                    select(App.id, App.config_json["retention"]).filter(
+                        App.config_json.has_key("retention"),
+                        App.deleted_at.is_(None),
+                    )
+                )
+            ).all()
+        for app_id, retention in apps:
+            await enforce_retention(
+                session_factory, app_id, RetentionPolicy.model_validate(retention)
+            )
+        await archive_threads(engine)
+        await prune_changes(session_factory)
+
+
+async def _run(engines: tuple[AsyncEngine, ...]) -> None:
+    while True:
+        await asyncio.sleep(settings.RETENTION_CHECK_SECONDS)
+        for engine in engines:
+            try:
+                await run_retention(engine)
+            except Exception:
+                logger.exception("Retention pass failed")
+
+
+def start_retention_worker(*engines: AsyncEngine) -> None:
+    """Run retention passes over each database (shard) every
+    RETENTION_CHECK_SECONDS on the current loop."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run(engines))
+
+
+async def stop_retention_worker() -> None:
+    global _task
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
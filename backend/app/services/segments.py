@@ -0,0 +1,149 @@
+"""Subscriber metadata filters and saved segments with cached member counts.
+
+Filters translate to JSONB containment (``@>``) and jsonpath (``@@``)
+conditions, both served by the ix_subscribers_metadata GIN (jsonb_path_ops)
+index. A segment's member_count is counted in full when the segment is
+created or refreshed; afterwards every write that changes subscribers applies
+a delta computed over just the rows it touched, so counts stay current
+without rescanning the app.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import ColumnElement, and_, cast, func, literal, true, update
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import Subscriber, SubscriberSegment
+from app.schemas import SubscriberFilter
+
+
+def filter_conditions(
+    subscriber_filter: SubscriberFilter,
+    metadata: ColumnElement = Subscriber.metadata_json,
+) -> list[ColumnElement[bool]]:
+    """SQL conditions of a metadata filter (none for an empty filter)."""
+    conditions = []
+    if subscriber_filter.metadata is not None:
+        conditions.append(metadata.contains(subscriber_filter.metadata))
+    if subscriber_filter.metadata_path is not None:
+        path = cast(literal(subscriber_filter.metadata_path), JSONPATH)
+        conditions.append(metadata.op("@@")(path))
+    return conditions
+
+
+async def matches_empty(db: AsyncSession, subscriber_filter: SubscriberFilter) -> bool:
+    """Whether a subscriber without metadata matches the filter.
+
+    Also validates the jsonpath: an invalid one is rejected with 400
+    ERROR_INVALID_METADATA_FILTER (inside a savepoint, so ``db`` stays usable).
+    """
+    empty = cast(literal("{}"), JSONB)
+    query = select(and_(true(), *filter_conditions(subscriber_filter, empty)))
+    try:
+        async with db.begin_nested():
+            return bool(await db.scalar(query))
+    except DBAPIError:
+        raise HTTPException(status_code=400, detail="ERROR_INVALID_METADATA_FILTER")
+
+
+async def get_segment(
+    db: AsyncSession, app_id: UUID, segment_id: UUID
+) -> SubscriberSegment | None:
+    result = await db.execute(
+        select(SubscriberSegment).filter(
+            SubscriberSegment.id == segment_id, SubscriberSegment.app_id == app_id
+        )
+    )
+    return result.scalars().first()
+
+
+async def refresh_segment(db: AsyncSession, segment: SubscriberSegment) -> None:
+    """Recount a segment's members in full (uses the metadata GIN index)."""
+    subscriber_filter = SubscriberFilter.model_validate(segment.filter_json)
+    segment.member_count = await db.scalar(
+        select(func.count())
+        .select_from(Subscriber)
+        .filter(
+            Subscriber.app_id == segment.app_id,
+            *filter_conditions(subscriber_filter),
+        )
+    )
+    segment.counted_at = datetime.now(timezone.utc)
+
+
+async def app_segments(db: AsyncSession, app_id: UUID) -> list[SubscriberSegment]:
+    result = await db.execute(
+        select(SubscriberSegment).filter(SubscriberSegment.app_id == app_id)
+    )
+    return list(result.scalars())
+
+
+async def count_members_among(
+    db: AsyncSession,
+    app_id: UUID,
+    segments: Sequence[SubscriberSegment],
+    scope: ColumnElement[bool],
+) -> list[int]:
+    """Members of each segment among the subscribers matching ``scope``.
+
+    One scan of the scoped rows with a FILTER aggregate per segment.
+    """
+    counts = [
+        func.count().filter(
+            and_(
+                true(),
+                *filter_conditions(SubscriberFilter.model_validate(s.filter_json)),
+            )
+        )
+        for s in segments
+    ]
+    result = await db.execute(
+        select(*counts).filter(Subscriber.app_id == app_id, scope)
+    )
+    return list(result.one())
+
+
+async def apply_member_deltas(
+    db: AsyncSession,
+    segments: Sequence[SubscriberSegment],
+    before: Sequence[int],
+    after: Sequence[int],
+) -> None:
+    """Add each segment's change in members to its cached count."""
+    for segment, old, new in zip(segments, before, after):
+        if new != old:
+            await db.execute(
+                update(SubscriberSegment)
+                .where(SubscriberSegment.id == segment.id)
+                .values(member_count=SubscriberSegment.member_count + (new - old))
+            )
+
+
+async def count_new_subscriber(db: AsyncSession, app_id: UUID) -> None:
+    """Count a just-created subscriber (empty metadata) in matching segments."""
+    await db.execute(
+        update(SubscriberSegment)
+        .where(
+            SubscriberSegment.app_id == app_id,
+            SubscriberSegment.matches_empty.is_(True),
+        )
+        .values(member_count=SubscriberSegment.member_count + 1)
+    )
+
+
+async def uncount_subscriber(db: AsyncSession, subscriber: Subscriber) -> None:
+    """Remove a subscriber that is about to be deleted from segment counts."""
+    segments = await app_segments(db, subscriber.app_id)
+    if not segments:
+        return
+    scope = Subscriber.id == subscriber.id
+    members = await count_members_among(db, subscriber.app_id, segments, scope)
+    await apply_member_deltas(db, segments, members, [0] * len(segments))
@@ -0,0 +1,222 @@
+"""Bulk import of subscribers from CSV or NDJSON.
+
+Rows are validated as they are read and written in batches of
+SUBSCRIBER_IMPORT_BATCH_SIZE: each batch is COPYed into a temporary staging
+table and merged into subscribers with one ``INSERT ... SELECT ... ON CONFLICT
+(app_id, customer_id) DO UPDATE``, then committed. An interrupted import
+keeps the batches already merged, and importing the same file again is safe.
+
+A provided display_name replaces the stored one; metadata_json keys are merged
+into the stored metadata. When a customer_id appears more than once, its last
+row wins.
+
+Progress is reported as events: ``{"error": {"line": n, "message": ...}}`` for
+each rejected row, ``{"progress": {...}}`` after each batch and
+``{"complete": true, ...}`` with the final counters.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+from collections.abc import AsyncIterator, Iterable, Iterator
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Literal
+from uuid import UUID
+
+from pydantic import ValidationError
+from sqlalchemy import column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.models import AppChange, Subscriber
+from app.schemas import SubscriberImportRow
+from app.services import segments as segment_service
+from app.services.change_feed import (
+    SUBSCRIBER_CREATED,
+    SUBSCRIBER_UPDATED,
+    notify_appended,
+)
+
+ImportFormat = Literal["csv", "ndjson"]
+
+_STAGING_TABLE = "subscriber_import"
+_COPY_COLUMNS = ["line", "customer_id", "display_name", "metadata_json"]
+
+# The app's subscribers touched by the staged batch
+_STAGED_SUBSCRIBERS = Subscriber.customer_id.in_(
+    select(column("customer_id")).select_from(table(_STAGING_TABLE))
+)
+
+_CREATE_STAGING = text(
+    f"CREATE TEMPORARY TABLE {_STAGING_TABLE} ("
+    "line integer NOT NULL, customer_id text NOT NULL, display_name text, "
+    "metadata_json text NOT NULL) ON COMMIT DROP"
+)
+
+# DISTINCT ON keeps one row per customer_id (ON CONFLICT cannot touch a row
+# twice in one statement); xmax = 0 only for freshly inserted rows. Each merged
+# row is appended to the change feed in the same statement.
+_MERGE_STAGING = text(
+    f"""
+    WITH merged AS (
+        INSERT INTO subscribers
+            (id, app_id, customer_id, display_name, metadata_json, created_at)
+        SELECT DISTINCT ON (customer_id)
+            gen_random_uuid(), CAST(:app_id AS uuid), customer_id, display_name,
+            CAST(metadata_json AS jsonb), CAST(:now AS timestamptz)
+        FROM {_STAGING_TABLE}
+        ORDER BY customer_id, line DESC
+        ON CONFLICT ON CONSTRAINT uq_subscriber_app_customer DO UPDATE SET
+            display_name = coalesce(excluded.display_name, subscribers.display_name),
+            metadata_json = subscribers.metadata_json || excluded.metadata_json
+        RETURNING id, xmax = 0 AS inserted
+    ), logged AS (
+        INSERT INTO {AppChange.__tablename__} (app_id, kind, entity_id)
+        SELECT CAST(:app_id AS uuid),
+            CASE WHEN inserted THEN '{SUBSCRIBER_CREATED}'
+                ELSE '{SUBSCRIBER_UPDATED}' END,
+            id
+        FROM merged
+    )
+    SELECT inserted FROM merged
+    """
+)
+
+
+class ImportHeaderError(ValueError):
+    """The CSV header has no customer_id column."""
+
+
+def read_records(lines: Iterable[str], fmt: ImportFormat) -> Iterator[tuple[int, Any]]:
+    """(line number, raw record) pairs of an import file.
+
+    Raises ImportHeaderError up front when a CSV header lacks customer_id.
+    A record that cannot be decoded is yielded as the error message string.
+    """
+    if fmt == "ndjson":
+        return _ndjson_records(lines)
+    reader = csv.DictReader(lines)
+    if "customer_id" not in (reader.fieldnames or ()):
+        raise ImportHeaderError("CSV header must include customer_id")
+    return _csv_records(reader)
+
+
+def _ndjson_records(lines: Iterable[str]) -> Iterator[tuple[int, Any]]:
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, "invalid JSON"
+
+
+def _csv_records(reader: csv.DictReader) -> Iterator[tuple[int, Any]]:
+    for record in reader:
+        # Empty cells mean "not provided"; metadata_json holds JSON text
+        row: dict[str, Any] = {"customer_id": record["customer_id"]}
+        if record.get("display_name"):
+            row["display_name"] = record["display_name"]
+        if record.get("metadata_json"):
+            try:
+                row["metadata_json"] = json.loads(record["metadata_json"])
+            except ValueError:
+                yield reader.line_num, "metadata_json: invalid JSON"
+                continue
+        yield reader.line_num, row
+
+
+def _validate(record: Any) -> SubscriberImportRow | str:
+    """The validated row, or an error message."""
+    if isinstance(record, str):
+        return record
+    try:
+        return SubscriberImportRow.model_validate(record)
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+def _next_batch(
+    records: Iterator[tuple[int, Any]], size: int
+) -> list[tuple[int, SubscriberImportRow | str]]:
+    return [(line, _validate(record)) for line, record in islice(records, size)]
+
+
+async def _merge_batch(
+    db: AsyncSession, app_id: UUID, rows: list[tuple[int, SubscriberImportRow]]
+) -> tuple[int, int]:
+    """COPY rows into a staging table and merge them; (inserted, updated).
+
+    Segment counts get the batch's membership delta, counted over the touched
+    subscribers before and after the merge; every merged row is added to the
+    change feed.
+    """
+    await db.execute(_CREATE_STAGING)
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        _STAGING_TABLE,
+        columns=_COPY_COLUMNS,
+        records=[
+            (
+                line,
+                row.customer_id,
+                row.display_name,
+                json.dumps(row.metadata_json or {}),
+            )
+            for line, row in rows
+        ],
+    )
+    segments = await segment_service.app_segments(db, app_id)
+    if segments:
+        before = await segment_service.count_members_among(
+            db, app_id, segments, _STAGED_SUBSCRIBERS
+        )
+    result = await db.execute(
+        _MERGE_STAGING, {"app_id": app_id, "now": datetime.now(timezone.utc)}
+    )
+    inserted_flags = result.scalars().all()
+    if segments:
+        after = await segment_service.count_members_among(
+            db, app_id, segments, _STAGED_SUBSCRIBERS
+        )
+        await segment_service.apply_member_deltas(db, segments, before, after)
+    await notify_appended(db, app_id)
+    await db.commit()
+    inserted = sum(inserted_flags)
+    return inserted, len(inserted_flags) - inserted
+
+
+async def import_subscribers(
+    session_factory: async_sessionmaker,
+    app_id: UUID,
+    records: Iterator[tuple[int, Any]],
+) -> AsyncIterator[dict[str, Any]]:
+    """Validate and merge records from read_records, yielding progress events.
+
+    Files are read and rows validated in a worker thread, one batch at a time.
+    """
+    counts = {"processed": 0, "inserted": 0, "updated": 0, "failed": 0}
+    async with session_factory() as db:
+        while batch := await asyncio.to_thread(
+            _next_batch, records, settings.SUBSCRIBER_IMPORT_BATCH_SIZE
+        ):
+            valid = []
+            for line, row in batch:
+                if isinstance(row, str):
+                    counts["failed"] += 1
+                    yield {"error": {"line": line, "message": row}}
+                else:
+                    valid.append((line, row))
+            if valid:
+                inserted, updated = await _merge_batch(db, app_id, valid)
+                counts["inserted"] += inserted
+                counts["updated"] += updated
+            counts["processed"] += len(batch)
+            yield {"progress": dict(counts)}
+    yield {"complete": True, **counts}
@@ -5,10 +5,13 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from uuid import UUID
 
+from sqlalchemy import Boolean, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 
 from app.models import Subscriber
+from app.services.change_feed import SUBSCRIBER_CREATED, record_changes
+from app.services.segments import count_new_subscriber
 
 
 async def resolve_subscriber(
@@ -18,26 +21,28 @@ async def resolve_subscriber(
     customer_id: str,
     display_name: str | None = None,
 ) -> Subscriber:
-    """Get or create a subscriber for (app, customer)."""
-    result = await db.execute(
-        select(Subscriber).filter(
-            Subscriber.app_id == app_id,
-            Subscriber.customer_id == customer_id,
-        )
-    )
-    subscriber = result.scalars().first()
-    now = datetime.now(timezone.utc)
+    """Get or create a subscriber for (app, customer) and mark it as seen.
 
-    if subscriber:
-        subscriber.last_seen_at = now
-        return subscriber
-
-    subscriber = Subscriber(
+    A single INSERT ... ON CONFLICT DO UPDATE ... RETURNING, so concurrent
+    first contacts for the same customer cannot race on
+    uq_subscriber_app_customer. A newly created subscriber is counted in the
+    app's segments that match empty metadata and added to the change feed.
+    """
+    now = datetime.now(timezone.utc)
+    stmt = pg_insert(Subscriber).values(
         app_id=app_id,
         customer_id=customer_id,
         display_name=display_name or customer_id,
+        created_at=now,
         last_seen_at=now,
     )
-    db.add(subscriber)
-    await db.flush()
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_subscriber_app_customer",
+        set_={"last_seen_at": stmt.excluded.last_seen_at},
+    ).returning(Subscriber, literal_column("xmax = 0", Boolean))
+    result = await db.execute(stmt, execution_options={"populate_existing": True})
+    subscriber, inserted = result.one()
+    if inserted:
+        await count_new_subscriber(db, app_id)
+        await record_changes(db, app_id, [(SUBSCRIBER_CREATED, subscriber.id, None)])
     return subscriber
@@ -0,0 +1,327 @@
+"""Cold storage of inactive threads as compressed blobs.
+
+Threads with status "archived", or not updated for THREAD_ARCHIVE_AFTER_DAYS
+(per app: ``config_json["retention"]["archive_inactive_days"]``), have their
+messages moved out of the partitioned messages table into one compressed
+row per thread in archived_threads. The thread row itself stays, so thread
+lists and get_thread are unaffected, and Thread.archived_seq records the
+highest seq in the archive.
+
+Reads merge the archive with the hot table: every archived seq is lower than
+any seq written after archiving (seqs only grow), so the archive is simply
+the start of the thread. A thread that receives new messages keeps its
+archive and is re-archived (archive + new messages) once it goes cold again.
+Unpacked archives are kept in a per-worker LRU cache of
+THREAD_ARCHIVE_CACHE_SIZE threads, keyed by the thread's archive state so a
+re-archived or trimmed archive is never served stale.
+
+Message lists, run history, thread and subscriber summaries and the messages
+export read archives too; full-text search does not (archives have no
+tsvector).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import zlib
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import and_, delete, func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import App, ArchivedThread, Message, Thread
+from app.schemas import MessageRead
+
+logger = get_logger(__name__)
+
+# Blob format: zlib-compressed JSON array of messages (without thread_id)
+CODEC = "zlib+json"
+
+_FIELDS = tuple(name for name in MessageRead.model_fields if name != "thread_id")
+
+# (thread_id, archived_seq, messages_from) -> messages, oldest first
+_cache: OrderedDict[tuple, list[dict[str, Any]]] = OrderedDict()
+
+
+def pack_messages(messages: Sequence[dict[str, Any]]) -> bytes:
+    rows = [
+        {
+            **{name: message[name] for name in _FIELDS},
+            "id": str(message["id"]),
+            "created_at": message["created_at"].isoformat(),
+        }
+        for message in messages
+    ]
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode(), 6)
+
+
+def unpack_messages(payload: bytes, thread_id: UUID) -> list[dict[str, Any]]:
+    return [
+        {
+            **row,
+            "id": UUID(row["id"]),
+            "thread_id": thread_id,
+            "created_at": datetime.fromisoformat(row["created_at"]),
+        }
+        for row in json.loads(zlib.decompress(payload))
+    ]
+
+
+def _cache_key(thread) -> tuple:
+    return (thread.id, thread.archived_seq, thread.messages_from)
+
+
+def clear_cache() -> None:
+    """Drop all cached archives (tests)."""
+    _cache.clear()
+
+
+async def archived_messages(db: AsyncSession, thread) -> list[dict[str, Any]]:
+    """The archived messages of ``thread`` (a Thread or row with id,
+    archived_seq and messages_from), oldest first; empty if not archived."""
+    if thread.archived_seq is None:
+        return []
+    key = _cache_key(thread)
+    messages = _cache.get(key)
+    if messages is None:
+        # One statement, so the payload and the thread's archive state are
+        # from the same snapshot
+        row = (
+            await db.execute(
+                select(
+                    ArchivedThread.payload,
+                    and_(
+                        Thread.archived_seq == thread.archived_seq,
+                        Thread.messages_from == thread.messages_from,
+                    ).label("current"),
+                )
+                .join(Thread, Thread.id == ArchivedThread.thread_id)
+                .filter(ArchivedThread.thread_id == thread.id)
+            )
+        ).first()
+        messages = unpack_messages(row.payload, thread.id) if row else []
+        if row is None or not row.current:
+            # The archive moved on since ``thread`` was read: not cached under
+            # the old key
+            return messages
+        _cache[key] = messages
+        while len(_cache) > settings.THREAD_ARCHIVE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    _cache.move_to_end(key)
+    return messages
+
+
+def _archivable() -> tuple:
+    """Filters (with threads joined to apps) for cold threads with hot messages."""
+    app_days = App.config_json["retention"]["archive_inactive_days"].as_integer()
+    if settings.THREAD_ARCHIVE_AFTER_DAYS > 0:
+        app_days = func.coalesce(app_days, settings.THREAD_ARCHIVE_AFTER_DAYS)
+    cold = or_(
+        Thread.status == "archived",
+        Thread.updated_at < func.now() - app_days * timedelta(days=1),
+    )
+    has_hot = Thread.next_seq - 1 > func.coalesce(Thread.archived_seq, 0)
+    return App.deleted_at.is_(None), cold, has_hot
+
+
+async def _archive_chunk(db: AsyncSession, thread_ids: Sequence[UUID]) -> int:
+    """Move the hot messages of (unlocked) threads into their archives."""
+    # The filters are checked again under the lock: a thread reopened or
+    # written to since it was picked is left alone
+    threads = (
+        await db.execute(
+            select(Thread.id, Thread.archived_seq, Thread.messages_from)
+            .join(App, App.id == Thread.app_id)
+            .filter(Thread.id.in_(thread_ids), *_archivable())
+            .with_for_update(of=Thread, skip_locked=True)
+        )
+    ).all()
+    if not threads:
+        return 0
+    ids = [thread.id for thread in threads]
+    # Prunes the partitions older than every thread of the chunk
+    in_chunk = (
+        Message.thread_id.in_(ids),
+        Message.created_at >= min(thread.messages_from for thread in threads),
+    )
+    rows = (
+        await db.execute(
+            select(Message.thread_id, *(getattr(Message, name) for name in _FIELDS))
+            .filter(*in_chunk)
+            .order_by(Message.thread_id, Message.seq)
+        )
+    ).all()
+    hot: dict[UUID, list[dict[str, Any]]] = {thread_id: [] for thread_id in ids}
+    for row in rows:
+        hot[row.thread_id].append(row._asdict())
+    # The blob being replaced is read under the lock, never from the cache
+    stored = dict(
+        (
+            await db.execute(
+                select(ArchivedThread.thread_id, ArchivedThread.payload).filter(
+                    ArchivedThread.thread_id.in_(
+                        [
+                            thread.id
+                            for thread in threads
+                            if thread.archived_seq is not None
+                        ]
+                    )
+                )
+            )
+        ).all()
+    )
+
+    values = []
+    for thread in threads:
+        archived = (
+            unpack_messages(stored[thread.id], thread.id) if thread.id in stored else []
+        )
+        messages = archived + hot[thread.id]
+        if not messages:
+            continue
+        values.append(
+            {
+                "thread_id": thread.id,
+                "codec": CODEC,
+                "payload": pack_messages(messages),
+                "message_count": len(messages),
+                "oldest_at": min(m["created_at"] for m in messages),
+                "archived_at": datetime.now(timezone.utc),
+                "archived_seq": messages[-1]["seq"],
+            }
+        )
+    if not values:
+        return 0
+    stmt = insert(ArchivedThread)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ArchivedThread.thread_id],
+            set_={
+                name: stmt.excluded[name]
+                for name in (
+                    "codec",
+                    "payload",
+                    "message_count",
+                    "oldest_at",
+                    "archived_at",
+                )
+            },
+        ),
+        [{k: v for k, v in row.items() if k != "archived_seq"} for row in values],
+    )
+    for row in values:
+        await db.execute(
+            update(Thread)
+            .where(Thread.id == row["thread_id"])
+            .values(archived_seq=row["archived_seq"], updated_at=Thread.updated_at)
+        )
+    await db.execute(
+        delete(Message).where(*in_chunk).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return len(values)
+
+
+async def archive_threads(engine: AsyncEngine) -> int:
+    """Archive every cold thread that has hot messages; returns the count.
+
+    Threads are taken THREAD_ARCHIVE_BATCH_SIZE per transaction, locked with
+    SKIP LOCKED (a thread being written to is left for the next pass).
+    """
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    archived = 0
+    last_id = None
+    async with session_factory() as db:
+        while True:
+            query = (
+                select(Thread.id)
+                .join(App, App.id == Thread.app_id)
+                .filter(*_archivable())
+            )
+            if last_id is not None:
+                query = query.filter(Thread.id > last_id)
+            thread_ids = (
+                await db.scalars(
+                    query.order_by(Thread.id).limit(settings.THREAD_ARCHIVE_BATCH_SIZE)
+                )
+            ).all()
+            await db.rollback()
+            if not thread_ids:
+                break
+            last_id = thread_ids[-1]
+            archived += await _archive_chunk(db, thread_ids)
+            await asyncio.sleep(settings.RETENTION_PAUSE_SECONDS)
+    if archived:
+        logger.info("Archived %d threads to cold storage", archived)
+    return archived
+
+
+async def trim_archives(
+    db: AsyncSession, thread_ids: Sequence[UUID], cutoff: datetime
+) -> int:
+    """Drop archived messages older than ``cutoff`` (retention); returns the
+    number removed. Runs in the caller's transaction."""
+    threads = (
+        await db.execute(
+            select(Thread.id, ArchivedThread.payload)
+            .join(ArchivedThread, ArchivedThread.thread_id == Thread.id)
+            .filter(Thread.id.in_(thread_ids), ArchivedThread.oldest_at < cutoff)
+            .with_for_update(of=Thread, skip_locked=True)
+        )
+    ).all()
+    removed = 0
+    for thread in threads:
+        # Read under the lock, never from the cache
+        messages = unpack_messages(thread.payload, thread.id)
+        kept = [m for m in messages if m["created_at"] >= cutoff]
+        removed += len(messages) - len(kept)
+        await db.execute(
+            update(ArchivedThread)
+            .where(ArchivedThread.thread_id == thread.id)
+            .values(
+                payload=pack_messages(kept),
+                message_count=len(kept),
+                oldest_at=min((m["created_at"] for m in kept), default=cutoff),
+                archived_at=datetime.now(timezone.utc),
+            )
+        )
+        # A new messages_from changes the cache key of the trimmed archive
+        await db.execute(
+            update(Thread)
+            .where(Thread.id == thread.id)
+            .values(
+                messages_from=func.greatest(Thread.messages_from, cutoff),
+                updated_at=Thread.updated_at,
+            )
+        )
+    return removed
+
+
+def select_archived(
+    messages: Sequence[dict[str, Any]],
+    before_seq: int | None,
+    after_seq: int | None,
+) -> list[dict[str, Any]]:
+    """Archived messages in the (after_seq, before_seq) window, oldest first."""
+    return [
+        m
+        for m in messages
+        if (before_seq is None or m["seq"] < before_seq)
+        and (after_seq is None or m["seq"] > after_seq)
+    ]
+
+
+def reads_archive(thread, after_seq: int | None) -> bool:
+    """Whether a read starting after ``after_seq`` can include archived seqs."""
+    return thread.archived_seq is not None and (
+        after_seq is None or after_seq < thread.archived_seq
+    )
@@ -0,0 +1,24 @@
+"""Advisory locks that elect one worker for a background pass.
+
+The lock is transaction-scoped, held by a transaction left open on a
+connection of its own while the pass works on other connections. Unlike a
+session lock, this also works behind PgBouncer in transaction mode: the open
+transaction keeps its server connection, and ending it releases the lock,
+even when the worker dies. The transaction holds no snapshot between
+statements, so it does not hold back vacuum.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+@asynccontextmanager
+async def worker_lock(engine: AsyncEngine, key: int) -> AsyncIterator[bool]:
+    """Try to take lock ``key``; yields whether this worker got it."""
+    async with engine.connect() as conn, conn.begin():
+        yield await conn.scalar(select(func.pg_try_advisory_xact_lock(key)))
@@ -3,18 +3,24 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
 from datetime import datetime
 from typing import Any, Callable, Mapping, Sequence
 from uuid import UUID
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
 from fastapi.routing import APIRoute
+from pydantic import BaseModel
 from sqlalchemy import and_, or_
 from sqlalchemy.sql import ColumnElement
 
 
 ERROR_INVALID_CURSOR = "ERROR_INVALID_CURSOR"
+ERROR_INVALID_FIELDS = "ERROR_INVALID_FIELDS"
+
+# Conditional GET responses may be stored, but must be revalidated each time.
+ETAG_CACHE_CONTROL = "private, no-cache"
 
 
 def simple_generate_unique_route_id(route: APIRoute) -> str:
@@ -65,6 +71,37 @@ def parse_uuid(value: str) -> UUID:
     return UUID(value)
 
 
+def parse_int(value: Any) -> int:
+    """Parse an integer cursor value (rejects bools and floats)."""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("expected an integer")
+    return value
+
+
+def parse_float(value: Any) -> float:
+    """Parse a numeric cursor value (rejects bools)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("expected a number")
+    return float(value)
+
+
+def parse_fields(
+    value: str | None, model: type[BaseModel], required: Sequence[str] = ("id",)
+) -> tuple[str, ...] | None:
+    """Parse a ``fields=a,b`` sparse fieldset against ``model``'s fields.
+
+    Returns the selected names in the model's declaration order (``required``
+    ones always included), or None when no fieldset was given.
+    """
+    if value is None:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    if not requested or not requested <= model.model_fields.keys():
+        raise HTTPException(status_code=400, detail=ERROR_INVALID_FIELDS)
+    requested.update(required)
+    return tuple(name for name in model.model_fields if name in requested)
+
+
 def build_desc_pagination_filter(
     columns: Sequence[ColumnElement], values: Sequence[Any]
 ) -> ColumnElement:
@@ -79,3 +116,40 @@ def build_desc_pagination_filter(
         clauses.append(clause)
 
     return or_(*clauses)
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a weak ETag from cheap validator values (timestamps, counters,
+    request parameters) instead of hashing the serialized body."""
+    raw = "|".join(
+        value.isoformat() if isinstance(value, datetime) else str(value)
+        for value in parts
+    )
+    digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the current validator."""
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL},
+    )
+
+
+def json_response(body: bytes, headers: Mapping[str, str] | None = None) -> Response:
+    """Return pre-serialized JSON as is, skipping ``response_model`` validation."""
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,168 @@
+"""Benchmark concurrent idle and active chat WebSockets against one worker.
+
+Creates threads through the Partner API, then:
+
+1. opens ``--idle`` sockets that only stay connected (connect latency, and
+   the worker's RSS growth when ``--server-pid`` is given);
+2. while those stay open, runs ``--active`` sockets that each send
+   ``--turns`` messages and wait for the full reply (turn latency, turns/s).
+
+Run against a single uvicorn worker with the simulator integration mode:
+
+    uv run python -m commands.benchmark_chat_gateway \\
+        --app-id <id> --app-secret <secret> --idle 1000 --active 50 --server-pid <pid>
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import httpx
+from websockets.asyncio.client import connect
+
+from app.config import settings
+from app.logging_config import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def _rss_kib(pid: int | None) -> int | None:
+    if pid is None:
+        return None
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return None
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _summary(name: str, values: list[float]) -> str:
+    if not values:
+        return f"{name}: n=0"
+    return (
+        f"{name}: n={len(values)} p50={_percentile(values, 50) * 1000:.1f}ms "
+        f"p95={_percentile(values, 95) * 1000:.1f}ms "
+        f"p99={_percentile(values, 99) * 1000:.1f}ms "
+        f"max={max(values) * 1000:.1f}ms"
+    )
+
+
+async def _create_threads(
+    base_url: str, app_id: str, headers: dict[str, str], count: int
+) -> list[str]:
+    async with httpx.AsyncClient(base_url=base_url, headers=headers) as client:
+        thread_ids = []
+        for i in range(count):
+            response = await client.post(
+                f"/apps/{app_id}/threads", json={"title": f"bench {i}"}
+            )
+            response.raise_for_status()
+            thread_ids.append(response.json()["thread"]["id"])
+        return thread_ids
+
+
+async def _run_turns(ws, turns: int, latencies: list[float]) -> None:
+    for i in range(turns):
+        started = time.perf_counter()
+        await ws.send(json.dumps({"type": "message", "content": f"hello {i}"}))
+        while True:
+            frame = json.loads(await ws.recv())
+            if frame["type"] == "status" and frame["status"] == "idle":
+                break
+        latencies.append(time.perf_counter() - started)
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    headers = {
+        settings.WEBHOOK_HEADER_APP_ID: args.app_id,
+        settings.WEBHOOK_HEADER_APP_SECRET: args.app_secret,
+    }
+    ws_base = args.base_url.replace("http", "ws", 1)
+    thread_ids = await _create_threads(
+        args.base_url, args.app_id, headers, args.threads
+    )
+
+    def socket_url(i: int) -> str:
+        thread_id = thread_ids[i % len(thread_ids)]
+        return f"{ws_base}/apps/{args.app_id}/threads/{thread_id}/ws"
+
+    rss_before = _rss_kib(args.server_pid)
+
+    # Phase 1: idle sockets
+    connect_times: list[float] = []
+    idle = []
+    for start in range(0, args.idle, args.connect_batch):
+        batch = range(start, min(start + args.connect_batch, args.idle))
+
+        async def open_socket(i: int):
+            started = time.perf_counter()
+            ws = await connect(socket_url(i), additional_headers=headers)
+            connect_times.append(time.perf_counter() - started)
+            return ws
+
+        idle.extend(await asyncio.gather(*(open_socket(i) for i in batch)))
+
+    await asyncio.sleep(1)
+    rss_idle = _rss_kib(args.server_pid)
+    logger.info("%d idle sockets open", len(idle))
+    logger.info(_summary("connect", connect_times))
+    if rss_before is not None and rss_idle is not None and idle:
+        logger.info(
+            "worker RSS %d KiB -> %d KiB (%.1f KiB per idle socket)",
+            rss_before,
+            rss_idle,
+            (rss_idle - rss_before) / len(idle),
+        )
+
+    # Phase 2: active sockets, with the idle ones still connected
+    latencies: list[float] = []
+    active = [
+        await connect(socket_url(args.idle + i), additional_headers=headers)
+        for i in range(args.active)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_turns(ws, args.turns, latencies) for ws in active))
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "%d active sockets x %d turns in %.2fs (%.1f turns/s)",
+        args.active,
+        args.turns,
+        elapsed,
+        len(latencies) / elapsed if elapsed else 0.0,
+    )
+    logger.info(_summary("turn", latencies))
+    rss_active = _rss_kib(args.server_pid)
+    if rss_active is not None:
+        logger.info("worker RSS after active phase: %d KiB", rss_active)
+
+    await asyncio.gather(*(ws.close() for ws in idle + active))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=settings.BACKEND_URL)
+    parser.add_argument("--app-id", required=True)
+    parser.add_argument("--app-secret", required=True)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--idle", type=int, default=1000)
+    parser.add_argument("--active", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--connect-batch", type=int, default=20)
+    parser.add_argument(
+        "--server-pid", type=int, help="uvicorn worker pid, to report its RSS"
+    )
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Benchmark worker CPU per request for the message, thread and subscriber lists.
+
+Seeds one app through the Partner API (``--rows`` threads, each with its own
+subscriber, and ``--rows`` messages in the first thread), then calls each list
+endpoint with ``limit=--rows`` and reports latency and the worker's CPU time
+per request, read from ``/proc/<pid>/stat`` of ``--server-pid``.
+
+Run against a single uvicorn worker:
+
+    uv run python -m commands.benchmark_list_endpoints \\
+        --app-id <id> --app-secret <secret> --server-pid <pid>
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from app.config import settings
+from app.logging_config import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _cpu_seconds(pid: int) -> float:
+    # utime and stime are fields 14 and 15; the command name may contain spaces
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def _seed(client: httpx.AsyncClient, app_id: str, rows: int) -> str:
+    run = uuid.uuid4().hex[:8]
+    thread_ids = []
+    for i in range(rows):
+        response = await client.post(
+            f"/apps/{app_id}/threads",
+            json={"title": f"bench {i}", "customer_id": f"bench-{run}-{i}"},
+        )
+        response.raise_for_status()
+        thread_ids.append(response.json()["thread"]["id"])
+    response = await client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {
+                    "thread_id": thread_ids[0],
+                    "role": "user" if i % 2 else "assistant",
+                    "content": f"message {i} " + "lorem ipsum " * 20,
+                    "content_json": {"source": "benchmark", "index": i},
+                }
+                for i in range(rows)
+            ]
+        },
+    )
+    response.raise_for_status()
+    return thread_ids[0]
+
+
+async def _measure(
+    client: httpx.AsyncClient, name: str, path: str, requests: int, pid: int | None
+) -> None:
+    await client.get(path)  # warm up
+    latencies = []
+    cpu_before = _cpu_seconds(pid) if pid else None
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    line = (
+        f"{name}: n={requests} p50={_percentile(latencies, 50) * 1000:.1f}ms "
+        f"p95={_percentile(latencies, 95) * 1000:.1f}ms "
+        f"bytes={len(response.content)}"
+    )
+    if cpu_before is not None:
+        cpu_ms = (_cpu_seconds(pid) - cpu_before) * 1000 / requests
+        line += f" worker_cpu={cpu_ms:.2f}ms/request"
+    logger.info(line)
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    headers = {
+        settings.WEBHOOK_HEADER_APP_ID: args.app_id,
+        settings.WEBHOOK_HEADER_APP_SECRET: args.app_secret,
+    }
+    async with httpx.AsyncClient(
+        base_url=args.base_url, headers=headers, timeout=30
+    ) as client:
+        thread_id = await _seed(client, args.app_id, args.rows)
+        base = f"/apps/{args.app_id}"
+        limit = f"limit={args.rows}"
+        await _measure(
+            client,
+            "messages",
+            f"{base}/threads/{thread_id}/messages?{limit}",
+            args.requests,
+            args.server_pid,
+        )
+        await _measure(
+            client, "threads", f"{base}/threads?{limit}", args.requests, args.server_pid
+        )
+        await _measure(
+            client,
+            "subscribers",
+            f"{base}/subscribers?{limit}",
+            args.requests,
+            args.server_pid,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=settings.BACKEND_URL)
+    parser.add_argument("--app-id", required=True)
+    parser.add_argument("--app-secret", required=True)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--server-pid", type=int, help="uvicorn worker pid, to report its CPU time"
+    )
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark requests per second under each DATABASE_POOL_CLASS.
+
+For every mode a single uvicorn worker is started with that pool class, and
+``--concurrency`` clients list an app's threads through the Partner API for
+``--seconds``. Reported per mode: requests/s and p50/p95 latency.
+
+"bouncer" runs against ``--bouncer-url`` (a PgBouncer in transaction mode in
+front of the same database) when given, else straight against DATABASE_URL,
+which only measures the cost of running without statement caches.
+
+    uv run python -m commands.benchmark_pool_modes \\
+        --app-id <id> --app-secret <secret> --bouncer-url <url>
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.config import settings
+from app.logging_config import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+MODES = ("null", "queue", "bouncer")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _start_server(mode: str, args: argparse.Namespace) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_POOL_CLASS": mode, "LOG_LEVEL": "WARNING"}
+    if mode == "bouncer" and args.bouncer_url:
+        env["DATABASE_URL"] = args.bouncer_url
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port)],
+        env=env,
+    )
+
+
+async def _wait_until_up(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+async def _run_mode(mode: str, args: argparse.Namespace) -> None:
+    headers = {
+        settings.WEBHOOK_HEADER_APP_ID: args.app_id,
+        settings.WEBHOOK_HEADER_APP_SECRET: args.app_secret,
+    }
+    path = f"/apps/{args.app_id}/threads?limit=20"
+    server = _start_server(mode, args)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            headers=headers,
+            timeout=30,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await _wait_until_up(client)
+            (await client.get(path)).raise_for_status()
+            latencies: list[float] = []
+            deadline = time.perf_counter() + args.seconds
+
+            async def worker() -> None:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    logger.info(
+        "%s: %.0f requests/s, p50=%.1fms p95=%.1fms (n=%d, concurrency=%d)",
+        mode,
+        len(latencies) / elapsed,
+        _percentile(latencies, 50) * 1000,
+        _percentile(latencies, 95) * 1000,
+        len(latencies),
+        args.concurrency,
+    )
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    for mode in args.modes:
+        await _run_mode(mode, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-id", required=True)
+    parser.add_argument("--app-secret", required=True)
+    parser.add_argument("--bouncer-url", help="DATABASE_URL of a PgBouncer")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8099)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Export an app's threads, messages or subscribers to a file.
+
+Reads straight from the database (same server-side cursor batches as the
+``/apps/{app_id}/export/{table}`` endpoint) and writes NDJSON, an Arrow IPC
+stream or a Parquet file. An NDJSON output path ending in ``.gz`` is gzipped.
+
+    uv run python -m commands.export_app \\
+        --app-id <id> --table messages --format parquet --output messages.parquet
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from uuid import UUID
+
+from app.database import async_session_maker
+from app.logging_config import configure_logging, get_logger
+from app.services import columnar_export
+from app.services import export as export_service
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+async def export_app(args: argparse.Namespace) -> None:
+    app_id = UUID(args.app_id)
+    if args.format == "ndjson":
+        chunks = export_service.export_ndjson(async_session_maker, args.table, app_id)
+        if args.output.suffix == ".gz":
+            chunks = export_service.gzip_chunks(chunks)
+    else:
+        chunks = columnar_export.export_columnar(
+            async_session_maker, args.table, app_id, args.format
+        )
+
+    started = time.perf_counter()
+    written = 0
+    with args.output.open("wb") as output:
+        async for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+    logger.info(
+        "Exported %s of app %s to %s (%d bytes) in %.2fs",
+        args.table,
+        app_id,
+        args.output,
+        written,
+        time.perf_counter() - started,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-id", required=True)
+    parser.add_argument(
+        "--table", choices=sorted(export_service.EXPORT_SOURCES), required=True
+    )
+    parser.add_argument(
+        "--format", choices=("ndjson", "arrow", "parquet"), default="parquet"
+    )
+    parser.add_argument("--output", type=Path, required=True)
+    asyncio.run(export_app(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
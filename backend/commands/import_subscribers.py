@@ -0,0 +1,65 @@
+"""Import an app's subscribers from a CSV or NDJSON file.
+
+Same COPY + merge batches as ``POST /apps/{app_id}/subscribers/import``:
+rows are upserted on (app_id, customer_id), progress is logged after every
+batch and rejected rows are logged with their line number.
+
+    uv run python -m commands.import_subscribers --app-id <id> --input crm.csv
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from uuid import UUID
+
+from app.database import async_session_maker
+from app.logging_config import configure_logging, get_logger
+from app.services import subscriber_import
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+async def import_subscribers(args: argparse.Namespace) -> None:
+    app_id = UUID(args.app_id)
+    fmt = args.format or ("csv" if args.input.suffix == ".csv" else "ndjson")
+    started = time.perf_counter()
+    with args.input.open(encoding="utf-8-sig", newline="") as lines:
+        records = subscriber_import.read_records(lines, fmt)
+        events = subscriber_import.import_subscribers(
+            async_session_maker, app_id, records
+        )
+        async for event in events:
+            if "error" in event:
+                error = event["error"]
+                logger.warning("Line %d: %s", error["line"], error["message"])
+            elif "progress" in event:
+                logger.info("Progress: %s", event["progress"])
+            else:
+                summary = event
+    logger.info(
+        "Imported %d rows into app %s in %.2fs (%d inserted, %d updated, %d failed)",
+        summary["processed"],
+        app_id,
+        time.perf_counter() - started,
+        summary["inserted"],
+        summary["updated"],
+        summary["failed"],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-id", required=True)
+    parser.add_argument("--input", type=Path, required=True)
+    parser.add_argument(
+        "--format",
+        choices=("csv", "ndjson"),
+        help="Defaults to csv for .csv files, ndjson otherwise",
+    )
+    asyncio.run(import_subscribers(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Apply Alembic migrations to every database of a sharded deployment.
+
+Runs ``alembic <command> <revision>`` against DATABASE_URL (shard 0) and then
+each of DATABASE_SHARD_URLS in order, stopping at the first failure (rerunning
+is safe: shards already at the revision are left alone). Every shard gets the
+full schema; app_shards is only used on shard 0.
+
+    uv run python -m commands.migrate_shards
+    uv run python -m commands.migrate_shards --downgrade <revision>
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+from app.logging_config import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+
+def migrate_shards(action: str, revision: str) -> None:
+    urls = [settings.DATABASE_URL, *settings.DATABASE_SHARD_URLS]
+    for index, url in enumerate(urls):
+        name = make_url(url).render_as_string(hide_password=True)
+        logger.info("Shard %d (%s): alembic %s %s", index, name, action, revision)
+        # One process per shard: alembic_migrations/env.py reads DATABASE_URL
+        result = subprocess.run(
+            [sys.executable, "-m", "alembic", action, revision],
+            env={**os.environ, "DATABASE_URL": url},
+        )
+        if result.returncode != 0:
+            sys.exit(f"Migrating shard {index} failed; later shards were not run")
+    logger.info("Ran alembic %s %s on %d shards", action, revision, len(urls))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--upgrade", metavar="REVISION", default="head")
+    group.add_argument("--downgrade", metavar="REVISION")
+    args = parser.parse_args()
+    if args.downgrade:
+        migrate_shards("downgrade", args.downgrade)
+    else:
+        migrate_shards("upgrade", args.upgrade)
+
+
+if __name__ == "__main__":
+    main()
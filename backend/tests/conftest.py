@@ -10,6 +10,7 @@ from app.models import User, Base
 
 from app.database import get_user_db, get_async_session, get_session_factory
 from app.main import app
+from app.services.realtime import RealtimeHub, get_realtime_hub
 from app.users import get_jwt_strategy
 
 
@@ -111,3 +112,15 @@ async def authenticated_user(test_client, db_session):
         "user": user,
         "user_data": {"email": user_data["email"], "password": "TestPassword123#"},
     }
+
+
+@pytest_asyncio.fixture(scope="function")
+async def hub():
+    """A realtime hub listening on the test database, wired into the app."""
+    test_hub = RealtimeHub(
+        settings.TEST_DATABASE_URL, settings.REALTIME_CHANNEL, queue_size=16
+    )
+    app.dependency_overrides[get_realtime_hub] = lambda: test_hub
+    yield test_hub
+    app.dependency_overrides.pop(get_realtime_hub, None)
+    await test_hub.close()
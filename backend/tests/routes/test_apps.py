@@ -1,7 +1,14 @@
+import asyncio
+from uuid import uuid4
+
 import pytest
 from fastapi import status
-from sqlalchemy import select, insert
-from app.models import App
+from sqlalchemy import func, select, insert, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.config import settings
+from app.models import App, AppPurgeJob, Message, Subscriber, Thread
+from app.services import app_purge
 
 
 class TestApps:
@@ -98,6 +105,178 @@ class TestApps:
         ).scalar()
         assert db_check is None
 
+    @staticmethod
+    async def _create_app_with_messages(db_session, user_id, threads, messages):
+        app = App(name="Busy App", user_id=user_id)
+        db_session.add(app)
+        await db_session.flush()
+        for t in range(threads):
+            subscriber = Subscriber(app_id=app.id, customer_id=f"cust-{t}")
+            db_session.add(subscriber)
+            await db_session.flush()
+            thread = Thread(
+                app_id=app.id,
+                subscriber_id=subscriber.id,
+                customer_id=subscriber.customer_id,
+                next_seq=messages + 1,
+            )
+            db_session.add(thread)
+            await db_session.flush()
+            db_session.add_all(
+                Message(
+                    thread_id=thread.id,
+                    app_id=app.id,
+                    seq=seq,
+                    role="user",
+                    content="hi",
+                )
+                for seq in range(1, messages + 1)
+            )
+        await db_session.commit()
+        return app.id
+
+    @staticmethod
+    async def _count_rows(db_session, model, *criteria):
+        return await db_session.scalar(
+            select(func.count()).select_from(model).filter(*criteria)
+        )
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_delete_app_cascades_in_database(
+        self, test_client, db_session, authenticated_user
+    ):
+        """Small apps are deleted at once; the database cascades to children."""
+        app_id = await self._create_app_with_messages(
+            db_session, authenticated_user["user"].id, threads=2, messages=3
+        )
+
+        response = await test_client.delete(
+            f"/apps/{app_id}", headers=authenticated_user["headers"]
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"message": "ACTION_APP_DELETED"}
+        assert await self._count_rows(db_session, Thread, Thread.app_id == app_id) == 0
+        assert await self._count_rows(db_session, Message) == 0
+        assert (
+            await self._count_rows(db_session, Subscriber, Subscriber.app_id == app_id)
+            == 0
+        )
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_delete_large_app_purges_in_background(
+        self, test_client, db_session, authenticated_user, monkeypatch
+    ):
+        """Apps above the sync threshold get a 202 and a background purge job."""
+        monkeypatch.setattr(settings, "APP_PURGE_SYNC_MAX_MESSAGES", 5)
+        monkeypatch.setattr(settings, "APP_PURGE_BATCH_SIZE", 4)
+        monkeypatch.setattr(settings, "APP_PURGE_PAUSE_SECONDS", 0)
+        headers = authenticated_user["headers"]
+        app_id = await self._create_app_with_messages(
+            db_session, authenticated_user["user"].id, threads=3, messages=5
+        )
+
+        response = await test_client.delete(f"/apps/{app_id}", headers=headers)
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        body = response.json()
+        assert body["message"] == "ACTION_APP_DELETE_SCHEDULED"
+
+        # Hidden right away, even while the purge is still running
+        assert (
+            await test_client.get(f"/apps/{app_id}", headers=headers)
+        ).status_code == status.HTTP_404_NOT_FOUND
+        listed = (await test_client.get("/apps/", headers=headers)).json()
+        assert all(item["id"] != str(app_id) for item in listed["items"])
+
+        job = None
+        for _ in range(100):
+            job = (
+                await test_client.get(
+                    f"/apps/purge-jobs/{body['job_id']}", headers=headers
+                )
+            ).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(0.05)
+
+        assert job["status"] == "completed"
+        assert job["app_id"] == str(app_id)
+        assert job["threads_deleted"] == 3
+        assert job["messages_deleted"] == 15
+        assert job["subscribers_deleted"] == 3
+        assert await self._count_rows(db_session, App, App.id == app_id) == 0
+        assert await self._count_rows(db_session, Message) == 0
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_purge_job_runs_once_and_is_retried_after_failure(
+        self, engine, db_session, authenticated_user, monkeypatch
+    ):
+        """A job locked by another worker is skipped; a failed job is retried."""
+        monkeypatch.setattr(settings, "APP_PURGE_BATCH_SIZE", 4)
+        monkeypatch.setattr(settings, "APP_PURGE_PAUSE_SECONDS", 0)
+        monkeypatch.setattr(settings, "APP_PURGE_RETRY_SECONDS", 0)
+        user_id = authenticated_user["user"].id
+        app_id = await self._create_app_with_messages(
+            db_session, user_id, threads=2, messages=3
+        )
+        job_id = uuid4()
+        db_session.add(AppPurgeJob(id=job_id, app_id=app_id, user_id=user_id))
+        await db_session.commit()
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def job_state():
+            row = await db_session.execute(
+                select(AppPurgeJob.status, AppPurgeJob.attempts).filter(
+                    AppPurgeJob.id == job_id
+                )
+            )
+            return tuple(row.one())
+
+        async with session_factory() as other_worker:
+            await other_worker.scalar(
+                select(func.pg_try_advisory_xact_lock(app_purge._lock_key(job_id)))
+            )
+            await app_purge.purge_app(job_id, session_factory)
+            assert await job_state() == ("pending", 0)
+
+        delete_batch = app_purge._delete_batch
+
+        async def lose_connection(db, stmt):
+            monkeypatch.setattr(app_purge, "_delete_batch", delete_batch)
+            raise RuntimeError("connection lost")
+
+        monkeypatch.setattr(app_purge, "_delete_batch", lose_connection)
+        await app_purge.purge_app(job_id, session_factory)
+        assert await job_state() == ("failed", 1)
+
+        await app_purge.resume_app_purges(session_factory)
+        await asyncio.gather(*app_purge._running.values())
+        assert await job_state() == ("completed", 1)
+        assert await self._count_rows(db_session, App, App.id == app_id) == 0
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_purge_message_batches_use_the_app_index(self, db_session):
+        """Purge batches find the app's messages through the GIN index and
+        delete them by (id, created_at), without joining threads."""
+        stmt = app_purge._message_batch(uuid4(), 100).compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        await db_session.execute(text("SET enable_seqscan = off"))
+        plan = [row[0] for row in await db_session.execute(text(f"EXPLAIN {stmt}"))]
+        assert any("Index Cond" in line and "ARRAY[app_id]" in line for line in plan)
+        assert not any("threads" in line for line in plan)
+        await db_session.rollback()
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_get_purge_job_not_found(self, test_client, authenticated_user):
+        response = await test_client.get(
+            "/apps/purge-jobs/00000000-0000-0000-0000-000000000000",
+            headers=authenticated_user["headers"],
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()["detail"] == "ERROR_PURGE_JOB_NOT_FOUND"
+
     @pytest.mark.asyncio(loop_scope="function")
     async def test_delete_nonexistent_app(self, test_client, authenticated_user):
         """Test deleting an app that doesn't exist."""
@@ -0,0 +1,217 @@
+"""Tests for the per-app change feed."""
+
+import asyncio
+import uuid
+from datetime import timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database import get_session_factory
+from app.main import app
+from app.models import AppChange
+from app.routes.realtime import change_stream
+from app.services.change_feed import decode_position, prune_changes
+
+
+async def _changes(client: AsyncClient, app_id, headers, **params):
+    response = await client.get(
+        f"/apps/{app_id}/changes", params=params, headers=headers
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_change_feed_records_writes_in_order(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Feed App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+
+    empty = await _changes(test_client, app_id, headers)
+    assert empty == {"items": [], "next_since": None, "has_more": False}
+
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads",
+        json={"title": "Hi", "customer_id": "c1"},
+        headers=headers,
+    )
+    thread_id = thread.json()["thread"]["id"]
+    await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/messages",
+        json={"content": "hello"},
+        headers=headers,
+    )
+    await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {"thread_id": thread_id, "role": "user", "content": "imported"}
+            ]
+        },
+        headers=headers,
+    )
+    await test_client.post(
+        f"/apps/{app_id}/subscribers/import",
+        content='{"customer_id": "c1"}\n{"customer_id": "c2"}',
+        headers=headers,
+    )
+    await test_client.delete(f"/threads/{thread_id}", headers=headers)
+
+    page = await _changes(test_client, app_id, headers)
+    kinds = [item["kind"] for item in page["items"]]
+    assert kinds == [
+        "subscriber.created",
+        "thread.updated",
+        "message.created",
+        "message.created",
+        "message.created",
+        "thread.updated",
+        "subscriber.updated",
+        "subscriber.created",
+        "thread.deleted",
+        "subscriber.deleted",  # c1's only thread is gone
+    ]
+    assert page["items"][2]["entity_id"] == thread.json()["initial_message"]["id"]
+    assert page["items"][8]["entity_id"] == thread_id
+    assert page["items"][9]["entity_id"] == page["items"][0]["entity_id"]
+    assert page["has_more"] is False
+    assert page["next_since"] == page["items"][-1]["position"]
+
+    # Paging resumes exactly after the last entry seen
+    first = await _changes(test_client, app_id, headers, limit=4)
+    assert first["has_more"] is True
+    rest = await _changes(
+        test_client, app_id, headers, since=first["next_since"], limit=100
+    )
+    assert first["items"] + rest["items"] == page["items"]
+
+    # Nothing new: the same position comes back
+    idle = await _changes(test_client, app_id, headers, since=page["next_since"])
+    assert idle["items"] == []
+    assert idle["next_since"] == page["next_since"]
+
+    response = await test_client.get(
+        f"/apps/{app_id}/changes", params={"since": "bogus"}, headers=headers
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "ERROR_INVALID_CURSOR"
+
+
+@pytest.mark.asyncio
+async def test_change_feed_since_now_skips_history(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Feed App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Old"}, headers=headers
+    )
+
+    now = await _changes(test_client, app_id, headers, since="now")
+    assert now["items"] == []
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "New"}, headers=headers
+    )
+
+    page = await _changes(test_client, app_id, headers, since=now["next_since"])
+    assert [item["kind"] for item in page["items"]] == [
+        "thread.updated",
+        "message.created",
+    ]
+    assert page["items"][0]["entity_id"] == thread.json()["thread"]["id"]
+
+
+@pytest.mark.asyncio
+async def test_pruned_change_feed_refuses_cursors_behind_it(
+    test_client: AsyncClient, authenticated_user, engine, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Feed App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    for title in ("Old", "New"):
+        await test_client.post(
+            f"/apps/{app_id}/threads", json={"title": title}, headers=headers
+        )
+    items = (await _changes(test_client, app_id, headers))["items"]
+    assert len(items) == 4
+
+    # Everything but the last entry is past retention
+    _, last_seq = decode_position(items[-1]["position"])
+    await db_session.execute(
+        update(AppChange)
+        .where(AppChange.seq < last_seq)
+        .values(created_at=func.now() - timedelta(days=31))
+    )
+    await db_session.commit()
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    assert await prune_changes(session_factory) == 3
+    assert await prune_changes(session_factory) == 0
+
+    for since in (items[0]["position"], items[1]["position"]):
+        response = await test_client.get(
+            f"/apps/{app_id}/changes", params={"since": since}, headers=headers
+        )
+        assert response.status_code == 410
+        assert response.json()["detail"] == "ERROR_CHANGE_FEED_EXPIRED"
+    response = await test_client.get(
+        f"/apps/{app_id}/changes/stream",
+        params={"since": items[0]["position"]},
+        headers=headers,
+    )
+    assert response.status_code == 410
+
+    # From the horizon on, and without since, nothing is missing
+    page = await _changes(test_client, app_id, headers, since=items[2]["position"])
+    assert page["items"] == items[3:]
+    assert (await _changes(test_client, app_id, headers))["items"] == items[3:]
+
+
+@pytest.mark.asyncio
+async def test_change_stream_tails_feed(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Feed App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    session_factory = app.dependency_overrides[get_session_factory]()
+
+    stream = change_stream(hub, session_factory, uuid.UUID(app_id), None)
+    assert await anext(stream) == ": connected\n\n"
+
+    # Subscriber-only writes wake the stream too
+    await test_client.post(
+        f"/apps/{app_id}/subscribers/import",
+        content='{"customer_id": "c1"}',
+        headers=headers,
+    )
+    frame = await asyncio.wait_for(anext(stream), timeout=5)
+    id_line, event_line, data_line = frame.strip().split("\n")
+    assert event_line == "event: subscriber.created"
+    position = id_line.removeprefix("id: ")
+    assert f'"position":"{position}"' in data_line
+    decode_position(position)
+
+    await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Live"}, headers=headers
+    )
+    frames = [await asyncio.wait_for(anext(stream), timeout=5) for _ in range(2)]
+    assert [f.split("\n")[1] for f in frames] == [
+        "event: thread.updated",
+        "event: message.created",
+    ]
+    await stream.aclose()
+    assert hub.subscriber_count == 0
@@ -0,0 +1,260 @@
+"""Tests for the per-thread WebSocket chat gateway."""
+
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.config import settings
+from app.main import app as fastapi_app
+from app.models import Message
+
+
+class _Socket:
+    """Minimal in-process ASGI WebSocket client (runs on the test's event loop)."""
+
+    def __init__(
+        self, path: str, headers: dict | None = None, query: dict | None = None
+    ):
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": urlencode(query or {}).encode(),
+            "headers": [
+                (k.lower().encode(), v.encode()) for k, v in (headers or {}).items()
+            ],
+            "server": ("test", 80),
+            "client": ("test", 1234),
+            "subprotocols": [],
+        }
+        self._task = asyncio.create_task(
+            fastapi_app(scope, self._to_app.get, self._from_app.put)
+        )
+
+    async def _next(self) -> dict:
+        return await asyncio.wait_for(self._from_app.get(), timeout=5)
+
+    async def connect(self) -> dict:
+        await self._to_app.put({"type": "websocket.connect"})
+        return await self._next()
+
+    async def send_json(self, frame: dict) -> None:
+        await self._to_app.put({"type": "websocket.receive", "text": json.dumps(frame)})
+
+    async def send_text(self, text: str) -> None:
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def receive_json(self) -> dict:
+        message = await self._next()
+        assert message["type"] == "websocket.send", message
+        return json.loads(message["text"])
+
+    async def receive_until(self, frame_type: str, **match) -> list[dict]:
+        """Collect frames up to and including the first matching one."""
+        frames = []
+        while True:
+            frame = await self.receive_json()
+            frames.append(frame)
+            if frame["type"] == frame_type and all(
+                frame.get(k) == v for k, v in match.items()
+            ):
+                return frames
+
+    async def close(self) -> None:
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self._task, timeout=5)
+
+
+async def _create_app_and_thread(client: AsyncClient, headers: dict):
+    app_response = await client.post("/apps/", json={"name": "WS App"}, headers=headers)
+    app_id = app_response.json()["id"]
+    thread_response = await client.post(
+        f"/apps/{app_id}/threads", json={"title": "Socket"}, headers=headers
+    )
+    return app_id, thread_response.json()["thread"]["id"]
+
+
+@pytest.mark.asyncio
+async def test_turn_streams_deltas_and_persists_both_messages(
+    test_client: AsyncClient, authenticated_user, db_session, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws", headers=headers)
+    assert (await socket.connect())["type"] == "websocket.accept"
+
+    await socket.send_json({"type": "message", "content": "Hello there"})
+    frames = await socket.receive_until("status", status="idle")
+    await socket.close()
+
+    types = [frame["type"] for frame in frames]
+    assert types[:3] == ["message", "status", "meta"]
+    user_frame = frames[0]["message"]
+    assert user_frame["role"] == "user"
+    assert user_frame["content"] == "Hello there"
+    assert user_frame["seq"] == 2
+
+    deltas = "".join(f["text"] for f in frames if f["type"] == "delta")
+    assistant_frames = [
+        f["message"]
+        for f in frames
+        if f["type"] == "message" and f["message"]["role"] == "assistant"
+    ]
+    # Sent once, even though the realtime hub also reports it
+    assert len(assistant_frames) == 1
+    assert assistant_frames[0]["content"] == deltas
+    assert assistant_frames[0]["seq"] == 3
+    done = next(f for f in frames if f["type"] == "done")
+    assert done["status"] == "completed"
+    assert done["message_id"] == assistant_frames[0]["id"]
+
+    result = await db_session.execute(
+        select(Message).filter(Message.thread_id == thread_id).order_by(Message.seq)
+    )
+    assert [m.role for m in result.scalars().all()] == [
+        "assistant",
+        "user",
+        "assistant",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_agent_reply_is_pushed_to_socket(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws", headers=headers)
+    await socket.connect()
+
+    await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/messages/assistant",
+        json={"content": "Agent here"},
+        headers=headers,
+    )
+    frame = await socket.receive_json()
+    await socket.close()
+
+    assert frame["type"] == "message"
+    assert frame["message"]["content"] == "Agent here"
+    assert frame["message"]["content_json"] == {"source": "dashboard_agent"}
+
+
+@pytest.mark.asyncio
+async def test_truncated_reply_is_read_back_before_forwarding(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    """A message too large for its notification reaches the socket in full."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws", headers=headers)
+    await socket.connect()
+
+    content = "x" * 10000
+    await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/messages/assistant",
+        json={"content": content},
+        headers=headers,
+    )
+    frame = await socket.receive_json()
+    await socket.close()
+
+    assert frame["type"] == "message"
+    assert "truncated" not in frame["message"]
+    assert frame["message"]["content"] == content
+
+
+@pytest.mark.asyncio
+async def test_ping_and_invalid_frames(
+    test_client: AsyncClient, authenticated_user, hub, monkeypatch
+):
+    monkeypatch.setattr(settings, "WS_MAX_MESSAGE_BYTES", 64)
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws", headers=headers)
+    await socket.connect()
+
+    await socket.send_json({"type": "ping"})
+    assert await socket.receive_json() == {"type": "pong"}
+
+    await socket.send_text("not json")
+    assert await socket.receive_json() == {
+        "type": "error",
+        "error": "ERROR_WS_INVALID_FRAME",
+    }
+
+    await socket.send_json({"type": "message", "content": "x" * 100})
+    assert await socket.receive_json() == {
+        "type": "error",
+        "error": "ERROR_WS_MESSAGE_TOO_LARGE",
+    }
+    await socket.close()
+
+
+@pytest.mark.asyncio
+async def test_pending_message_limit(
+    test_client: AsyncClient, authenticated_user, hub, monkeypatch
+):
+    monkeypatch.setattr(settings, "WS_MAX_PENDING_MESSAGES", 1)
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws", headers=headers)
+    await socket.connect()
+
+    for i in range(3):
+        await socket.send_json({"type": "message", "content": f"m{i}"})
+    frames = await socket.receive_until(
+        "error", error="ERROR_WS_TOO_MANY_PENDING_MESSAGES"
+    )
+    await socket.close()
+
+    assert frames[-1]["type"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_token_query_param_auth(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    token = headers["Authorization"].removeprefix("Bearer ")
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws", query={"token": token})
+    assert (await socket.connect())["type"] == "websocket.accept"
+    await socket.close()
+
+
+@pytest.mark.asyncio
+async def test_rejects_unauthenticated_and_unknown_thread(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    socket = _Socket(f"/apps/{app_id}/threads/{thread_id}/ws")
+    message = await socket.connect()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1008
+    assert message["reason"] == "ERROR_PARTNER_API_UNAUTHORIZED"
+
+    socket = _Socket(
+        f"/apps/{app_id}/threads/00000000-0000-0000-0000-000000000000/ws",
+        headers=headers,
+    )
+    message = await socket.connect()
+    assert message["type"] == "websocket.close"
+    assert message["reason"] == "ERROR_THREAD_NOT_FOUND"
@@ -0,0 +1,191 @@
+"""Tests for the export endpoint (NDJSON, Arrow and Parquet)."""
+
+import gzip
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+
+
+def _lines(body: bytes) -> list[dict]:
+    return [json.loads(line) for line in body.splitlines()]
+
+
+async def _create_app_with_threads(client: AsyncClient, headers: dict, count: int):
+    app_response = await client.post(
+        "/apps/", json={"name": "Export App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_ids = []
+    for i in range(count):
+        response = await client.post(
+            f"/apps/{app_id}/threads", json={"title": f"Thread {i}"}, headers=headers
+        )
+        thread_ids.append(response.json()["thread"]["id"])
+    return app_id, thread_ids
+
+
+@pytest.mark.asyncio
+async def test_export_threads_with_checkpoints_and_resume(
+    test_client: AsyncClient, authenticated_user, monkeypatch
+):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    headers = {**authenticated_user["headers"], "Accept-Encoding": "identity"}
+    app_id, thread_ids = await _create_app_with_threads(test_client, headers, 5)
+
+    response = await test_client.get(f"/apps/{app_id}/export/threads", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in response.headers
+    lines = _lines(response.content)
+    records = [line for line in lines if "id" in line]
+    checkpoints = [line["resume_token"] for line in lines if "resume_token" in line]
+    assert [r["id"] for r in records] == thread_ids
+    assert records[0]["title"] == "Thread 0"
+    assert len(checkpoints) == 3
+    assert lines[-1] == {"complete": True, "exported": 5}
+
+    # Resume after the first batch
+    resumed = await test_client.get(
+        f"/apps/{app_id}/export/threads",
+        params={"resume_token": checkpoints[0]},
+        headers=headers,
+    )
+    resumed_lines = _lines(resumed.content)
+    assert [line["id"] for line in resumed_lines if "id" in line] == thread_ids[2:]
+    assert resumed_lines[-1] == {"complete": True, "exported": 3}
+
+
+@pytest.mark.asyncio
+async def test_export_messages_in_thread_and_seq_order(
+    test_client: AsyncClient, authenticated_user, monkeypatch
+):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 3)
+    headers = authenticated_user["headers"]
+    app_id, thread_ids = await _create_app_with_threads(test_client, headers, 2)
+    for thread_id in thread_ids:
+        for i in range(2):
+            await test_client.post(
+                f"/apps/{app_id}/threads/{thread_id}/messages",
+                json={"content": f"Message {i}", "content_json": {"i": i}},
+                headers=headers,
+            )
+
+    response = await test_client.get(f"/apps/{app_id}/export/messages", headers=headers)
+    lines = _lines(response.content)
+    messages = [line for line in lines if "seq" in line]
+
+    assert [(m["thread_id"], m["seq"]) for m in messages] == sorted(
+        (thread_id, seq) for thread_id in thread_ids for seq in (1, 2, 3)
+    )
+    assert all("content_json" in m for m in messages)
+    assert lines[-1] == {"complete": True, "exported": 6}
+
+    token = next(line["resume_token"] for line in lines if "resume_token" in line)
+    resumed = await test_client.get(
+        f"/apps/{app_id}/export/messages",
+        params={"resume_token": token},
+        headers=headers,
+    )
+    assert _lines(resumed.content)[-1] == {"complete": True, "exported": 3}
+
+
+@pytest.mark.asyncio
+async def test_export_gzip(test_client: AsyncClient, authenticated_user):
+    headers = authenticated_user["headers"]
+    app_id, thread_ids = await _create_app_with_threads(test_client, headers, 1)
+
+    async with test_client.stream(
+        "GET",
+        f"/apps/{app_id}/export/threads",
+        headers={**headers, "Accept-Encoding": "gzip"},
+    ) as response:
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+
+    assert response.headers["content-encoding"] == "gzip"
+    lines = _lines(gzip.decompress(raw))
+    assert lines[0]["id"] == thread_ids[0]
+    assert lines[-1] == {"complete": True, "exported": 1}
+
+
+@pytest.mark.asyncio
+async def test_export_rejects_bad_token_and_other_apps(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_id, _ = await _create_app_with_threads(test_client, headers, 0)
+
+    response = await test_client.get(
+        f"/apps/{app_id}/export/messages",
+        params={"resume_token": "not-a-token"},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "ERROR_INVALID_CURSOR"
+
+    response = await test_client.get(
+        "/apps/00000000-0000-0000-0000-000000000000/export/threads", headers=headers
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_export_messages_as_parquet_and_arrow(
+    test_client: AsyncClient, authenticated_user, monkeypatch
+):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    headers = authenticated_user["headers"]
+    app_id, thread_ids = await _create_app_with_threads(test_client, headers, 3)
+
+    response = await test_client.get(
+        f"/apps/{app_id}/export/messages",
+        params={"format": "parquet"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert 'filename="messages.parquet"' in response.headers["content-disposition"]
+    parquet = pq.ParquetFile(pa.BufferReader(response.content))
+    assert parquet.metadata.num_rows == 3
+    assert parquet.num_row_groups == 2  # one per batch
+    table = parquet.read()
+    assert sorted(table.column("thread_id").to_pylist()) == sorted(thread_ids)
+    assert table.schema.field("created_at").type == pa.timestamp("us", tz="UTC")
+    assert json.loads(table.column("content_json")[0].as_py()) == {"source": "system"}
+
+    response = await test_client.get(
+        f"/apps/{app_id}/export/threads", params={"format": "arrow"}, headers=headers
+    )
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("id").to_pylist() == thread_ids
+
+
+@pytest.mark.asyncio
+async def test_export_subscribers(test_client: AsyncClient, authenticated_user):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Export App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    await test_client.post(
+        f"/apps/{app_id}/threads",
+        json={"title": "Hi", "customer_id": "cust-1"},
+        headers=headers,
+    )
+
+    response = await test_client.get(
+        f"/apps/{app_id}/export/subscribers", headers=headers
+    )
+    lines = _lines(response.content)
+    assert lines[0]["customer_id"] == "cust-1"
+    assert lines[0]["metadata_json"] == {}
+    assert lines[-1] == {"complete": True, "exported": 1}
+
+    response = await test_client.get(f"/apps/{app_id}/export/secrets", headers=headers)
+    assert response.status_code == 422
@@ -1,12 +1,21 @@
+import asyncio
 import uuid
+from datetime import datetime, timedelta, timezone
 
 import pytest
 from httpx import AsyncClient
-from sqlalchemy import update
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.config import settings
+from app.database import get_read_session
+from app.i18n import t
+from app.main import app as fastapi_app
 from app.models import App
+from app.services.activity_tracker import activity_tracker
+from app.services.message_search import search_query
+from app.services.message_service import persist_user_message
 
 
 @pytest.mark.asyncio
@@ -171,6 +180,148 @@ async def test_list_messages_with_cursor_pagination(
     assert messages[2]["seq"] == 3
 
 
+async def _create_app_and_thread(client: AsyncClient, headers: dict):
+    app_response = await client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await client.post(
+        f"/apps/{app_id}/threads", json={"title": "Test Thread"}, headers=headers
+    )
+    return app_id, thread_response.json()["thread"]["id"]
+
+
+@pytest.mark.asyncio
+async def test_list_messages_after_seq(test_client: AsyncClient, authenticated_user):
+    """after_seq returns only messages newer than the given seq."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    for i in range(3):
+        await test_client.post(
+            f"/apps/{app_id}/threads/{thread_id}/messages",
+            json={"content": f"Message {i + 1}"},
+            headers=headers,
+        )
+
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages?after_seq=2",
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert [m["seq"] for m in response.json()] == [3, 4]
+
+    # Nothing newer and no wait: empty page right away
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages?after_seq=4",
+        headers=headers,
+    )
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_list_messages_wait_times_out_empty(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages?after_seq=1&wait=0.3",
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_list_messages_wait_returns_new_message(
+    test_client: AsyncClient, authenticated_user, engine, hub
+):
+    """A long-poll is answered as soon as a message is committed."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    poll = asyncio.create_task(
+        test_client.get(
+            f"/apps/{app_id}/threads/{thread_id}/messages?after_seq=1&wait=10",
+            headers=headers,
+        )
+    )
+    while hub.subscriber_count == 0:
+        await asyncio.sleep(0.01)
+
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        await persist_user_message(uuid.UUID(thread_id), "Are you there?", session)
+
+    response = await asyncio.wait_for(poll, timeout=5)
+    assert response.status_code == 200
+    messages = response.json()
+    assert [m["seq"] for m in messages] == [2]
+    assert messages[0]["content"] == "Are you there?"
+
+
+@pytest.mark.asyncio
+async def test_list_messages_wait_is_bounded(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages"
+        f"?after_seq=1&wait={settings.MESSAGES_LONG_POLL_MAX_SECONDS + 1}",
+        headers=headers,
+    )
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_list_messages_conditional_get(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    url = f"/apps/{app_id}/threads/{thread_id}/messages"
+
+    first = await test_client.get(url, headers=headers)
+    etag = first.headers["ETag"]
+    cached = await test_client.get(url, headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    await test_client.post(url, json={"content": "New"}, headers=headers)
+    changed = await test_client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [m["seq"] for m in changed.json()] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_list_messages_sparse_fields(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    url = f"/apps/{app_id}/threads/{thread_id}/messages"
+
+    response = await test_client.get(f"{url}?fields=seq,role", headers=headers)
+
+    assert response.status_code == 200
+    messages = response.json()
+    assert set(messages[0]) == {"id", "seq", "role"}
+    assert messages[0]["seq"] == 1
+
+    full = await test_client.get(url, headers=headers)
+    assert response.headers["ETag"] != full.headers["ETag"]
+    assert "content_json" in full.json()[0]
+
+    invalid = await test_client.get(f"{url}?fields=seq,secret", headers=headers)
+    assert invalid.status_code == 400
+    assert invalid.json()["detail"] == "ERROR_INVALID_FIELDS"
+
+
 @pytest.mark.asyncio
 async def test_get_message(
     test_client: AsyncClient, authenticated_user, db_session: AsyncSession
@@ -399,7 +550,8 @@ async def test_create_message_updates_subscriber_activity(
         headers=authenticated_user["headers"],
     )
 
-    # Refresh and check last_message_at is now set
+    # Activity is buffered; flush it, then check last_message_at is now set
+    await activity_tracker.flush(db_session)
     db_session.expire_all()
     result = await db_session.execute(
         select(Subscriber).filter(Subscriber.id == subscriber_id)
@@ -448,6 +600,7 @@ async def test_create_message_assigns_subscriber_if_missing(
         headers=authenticated_user["headers"],
     )
 
+    await activity_tracker.flush(db_session)
     db_session.expire_all()
     result = await db_session.execute(select(Thread).filter(Thread.id == thread_id))
     thread = result.scalars().first()
@@ -459,3 +612,438 @@ async def test_create_message_assigns_subscriber_if_missing(
     subscriber = sub_result.scalars().first()
     assert subscriber.customer_id == "legacy-1"
     assert subscriber.last_message_at is not None
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_messages_allocates_seq_ranges(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """POST /apps/{app_id}/messages/bulk appends to many threads in list order."""
+    from app.models import Subscriber
+    from sqlalchemy.future import select
+
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Import App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+
+    first = await test_client.post(
+        f"/apps/{app_id}/threads",
+        json={"title": "First", "customer_id": "import-1"},
+        headers=headers,
+    )
+    second = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Second"}, headers=headers
+    )
+    first_id = first.json()["thread"]["id"]
+    second_id = second.json()["thread"]["id"]
+    subscriber_id = first.json()["thread"]["subscriber_id"]
+    ahead = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+    response = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {"thread_id": first_id, "role": "user", "content": "a"},
+                {"thread_id": second_id, "role": "user", "content": "x"},
+                {"thread_id": first_id, "role": "assistant", "content": "b"},
+                {
+                    "thread_id": first_id,
+                    "role": "user",
+                    "content": "c",
+                    "created_at": ahead.isoformat(),
+                },
+            ]
+        },
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 4
+    ranges = {t["thread_id"]: (t["first_seq"], t["last_seq"]) for t in data["threads"]}
+    assert ranges == {first_id: (2, 4), second_id: (2, 2)}
+
+    msgs = await test_client.get(
+        f"/apps/{app_id}/threads/{first_id}/messages", headers=headers
+    )
+    assert [(m["seq"], m["content"]) for m in msgs.json()[1:]] == [
+        (2, "a"),
+        (3, "b"),
+        (4, "c"),
+    ]
+
+    await activity_tracker.flush(db_session)
+    db_session.expire_all()
+    result = await db_session.execute(
+        select(Subscriber).filter(Subscriber.id == subscriber_id)
+    )
+    subscriber = result.scalars().first()
+    assert subscriber.last_message_at == ahead
+
+    # next_seq continues after the imported range
+    follow_up = await test_client.post(
+        f"/apps/{app_id}/threads/{first_id}/messages",
+        json={"content": "d"},
+        headers=headers,
+    )
+    assert follow_up.json()["seq"] == 5
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_messages_mixes_naive_and_omitted_timestamps(
+    test_client: AsyncClient, authenticated_user
+):
+    """A timestamp without offset is taken as UTC, next to defaulted ones."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Import App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Mixed"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+
+    response = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {
+                    "thread_id": thread_id,
+                    "role": "user",
+                    "content": "old",
+                    "created_at": "2024-01-01T00:00:00",
+                },
+                {"thread_id": thread_id, "role": "user", "content": "now"},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+
+    msgs = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    old = next(m for m in msgs.json() if m["content"] == "old")
+    assert old["created_at"].startswith("2024-01-01T00:00:00")
+    assert old["created_at"].endswith(("Z", "+00:00"))
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_messages_bounds_timestamps(
+    test_client: AsyncClient, authenticated_user, monkeypatch
+):
+    """Far-future timestamps and batches over too many months fail with 422
+    before any partition or message is written."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Import App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Bounds"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+
+    def batch(*stamps):
+        return {
+            "messages": [
+                {
+                    "thread_id": thread_id,
+                    "role": "user",
+                    "content": "x",
+                    "created_at": at,
+                }
+                for at in stamps
+            ]
+        }
+
+    future = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json=batch("2024-01-01T00:00:00Z", "9999-12-01T00:00:00Z"),
+        headers=headers,
+    )
+    assert future.status_code == 422
+    assert future.json()["detail"] == "ERROR_CREATED_AT_IN_FUTURE"
+
+    monkeypatch.setattr(settings, "MESSAGE_BULK_MAX_MONTHS", 2)
+    spread = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json=batch(
+            "2024-01-01T00:00:00Z", "2024-02-01T00:00:00Z", "2024-03-01T00:00:00Z"
+        ),
+        headers=headers,
+    )
+    assert spread.status_code == 422
+    assert spread.json()["detail"] == "ERROR_TOO_MANY_MONTHS"
+
+    monkeypatch.setattr(settings, "MESSAGE_RETENTION_MONTHS", 12)
+    expired = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json=batch("2001-01-01T00:00:00Z"),
+        headers=headers,
+    )
+    assert expired.status_code == 422
+    assert expired.json()["detail"] == "ERROR_CREATED_AT_BEFORE_RETENTION"
+
+    msgs = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert len(msgs.json()) == 1  # greeting only
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_messages_rejects_foreign_thread(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """A thread outside the app fails the whole batch with 404."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Import App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Mine"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+
+    response = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {"thread_id": thread_id, "role": "user", "content": "a"},
+                {"thread_id": str(uuid.uuid4()), "role": "user", "content": "b"},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "ERROR_THREAD_NOT_FOUND"
+
+    msgs = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert len(msgs.json()) == 1  # greeting only
+
+
+@pytest.mark.asyncio
+async def test_create_message_idempotency_key_replays_response(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """Retrying with the same Idempotency-Key returns the first message, no duplicate."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Test Thread"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+    url = f"/apps/{app_id}/threads/{thread_id}/messages"
+    idem_headers = {**headers, "Idempotency-Key": "retry-1"}
+
+    first = await test_client.post(url, json={"content": "Hi"}, headers=idem_headers)
+    retry = await test_client.post(url, json={"content": "Hi"}, headers=idem_headers)
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+    messages = await test_client.get(url, headers=headers)
+    assert len(messages.json()) == 2  # greeting + one user message
+
+    # Same key, different body is rejected
+    reused = await test_client.post(
+        url, json={"content": "Other"}, headers=idem_headers
+    )
+    assert reused.status_code == 422
+    assert reused.json()["detail"] == "ERROR_IDEMPOTENCY_KEY_REUSED"
+
+    # A different key performs a new write
+    other = await test_client.post(
+        url, json={"content": "Hi"}, headers={**headers, "Idempotency-Key": "retry-2"}
+    )
+    assert other.json()["seq"] == 3
+
+
+@pytest.mark.asyncio
+async def test_idempotency_replay_from_database(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """Stored responses are replayed from the table when the hot cache is cold."""
+    from app.services.idempotency import clear_cache
+
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Test Thread"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+    url = f"/apps/{app_id}/threads/{thread_id}/messages/assistant"
+    idem_headers = {**headers, "Idempotency-Key": "agent-reply"}
+
+    first = await test_client.post(url, json={"content": "Hi"}, headers=idem_headers)
+    clear_cache()
+    retry = await test_client.post(url, json={"content": "Hi"}, headers=idem_headers)
+
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+
+
+@pytest.mark.asyncio
+async def test_search_messages_ranked_with_snippets(
+    test_client: AsyncClient, authenticated_user
+):
+    """Search returns the app's matching messages, ranked, with snippets."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    other_app_id, other_thread_id = await _create_app_and_thread(test_client, headers)
+    contents = [
+        "My <b>refund</b> has not arrived",
+        "Refund please, the refund for order 42",
+        "Where is my parcel?",
+        "Refunded twice for the same parcel",
+    ]
+    for content in contents:
+        await test_client.post(
+            f"/apps/{app_id}/threads/{thread_id}/messages",
+            json={"content": content},
+            headers=headers,
+        )
+    await test_client.post(
+        f"/apps/{other_app_id}/threads/{other_thread_id}/messages",
+        json={"content": "refund in another app"},
+        headers=headers,
+    )
+
+    response = await test_client.get(
+        f"/apps/{app_id}/messages/search", params={"q": "refund"}, headers=headers
+    )
+
+    assert response.status_code == 200
+    hits = response.json()["items"]
+    # Stemming matches "Refunded"; the message with two matches ranks first
+    assert [hit["seq"] for hit in hits] == [3, 5, 2]
+    assert all(hit["thread_id"] == thread_id for hit in hits)
+    assert hits[0]["rank"] > hits[1]["rank"]
+    assert "<mark>Refund</mark>" in hits[0]["snippet"]
+    assert "<mark>refund</mark>&lt;/b&gt;" in hits[2]["snippet"]
+
+    # Web search syntax and keyset pagination
+    seen = []
+    cursor = None
+    while True:
+        params = {"q": "refund -parcel", "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        page = (
+            await test_client.get(
+                f"/apps/{app_id}/messages/search", params=params, headers=headers
+            )
+        ).json()
+        seen += [hit["seq"] for hit in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [3, 2]
+
+
+@pytest.mark.asyncio
+async def test_search_messages_candidate_cap_and_validation(
+    test_client: AsyncClient, authenticated_user, monkeypatch
+):
+    """Only the newest SEARCH_MAX_CANDIDATES matches are ranked."""
+    monkeypatch.setattr(settings, "SEARCH_MAX_CANDIDATES", 2)
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    for i in range(4):
+        await test_client.post(
+            f"/apps/{app_id}/threads/{thread_id}/messages",
+            json={"content": f"invoice number {i}"},
+            headers=headers,
+        )
+
+    response = await test_client.get(
+        f"/apps/{app_id}/messages/search", params={"q": "invoice"}, headers=headers
+    )
+    assert sorted(hit["seq"] for hit in response.json()["items"]) == [4, 5]
+
+    response = await test_client.get(
+        f"/apps/{app_id}/messages/search", params={"q": "the"}, headers=headers
+    )
+    assert response.json() == {"items": [], "next_cursor": None}
+
+    response = await test_client.get(
+        f"/apps/{app_id}/messages/search",
+        params={"q": "invoice", "cursor": "bad"},
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_reads_only_the_apps_index_entries(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """The app scope is an index condition, not a filter on all apps' matches."""
+    headers = authenticated_user["headers"]
+    app_id, _ = await _create_app_and_thread(test_client, headers)
+    query = search_query(uuid.UUID(app_id), "refund", 10).compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    await db_session.execute(text("SET enable_seqscan = off"))
+    plan = await db_session.execute(text(f"EXPLAIN {query}"))
+    index_conds = [row[0] for row in plan if "Index Cond" in row[0]]
+    assert any("ARRAY[app_id]" in line for line in index_conds)
+    # The page is joined back on the full key of the partitioned table
+    assert any("created_at = " in line for line in index_conds)
+
+
+@pytest.mark.asyncio
+async def test_list_messages_etag_comes_from_the_replica_that_served_it(
+    engine, test_client: AsyncClient, authenticated_user
+):
+    """A lagging replica's page must not carry the primary's validator."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Replica App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Lag"}, headers=headers
+    )
+    url = f"/apps/{app_id}/threads/{thread.json()['thread']['id']}/messages"
+
+    # A snapshot taken now stands in for a replica that stops replaying here
+    lagging = async_sessionmaker(
+        engine.execution_options(isolation_level="REPEATABLE READ"),
+        expire_on_commit=False,
+    )()
+    await lagging.execute(select(1))
+    await test_client.post(url, json={"content": "new"}, headers=headers)
+
+    async def override_get_read_session():
+        yield lagging
+
+    fastapi_app.dependency_overrides[get_read_session] = override_get_read_session
+    try:
+        stale = await test_client.get(url, headers=headers)
+    finally:
+        fastapi_app.dependency_overrides.pop(get_read_session)
+        await lagging.close()
+    assert [m["content"] for m in stale.json()] == [t("SIM_GREETING")]
+
+    fresh = await test_client.get(
+        url, headers={**headers, "If-None-Match": stale.headers["ETag"]}
+    )
+    assert fresh.status_code == 200
+    assert [m["content"] for m in fresh.json()][-1] == "new"
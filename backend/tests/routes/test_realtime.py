@@ -0,0 +1,249 @@
+"""Tests for the realtime SSE subscription endpoints."""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.routes.realtime import event_stream
+
+
+async def _create_app_and_thread(client: AsyncClient, headers: dict):
+    app_response = await client.post(
+        "/apps/", json={"name": "Realtime App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await client.post(
+        f"/apps/{app_id}/threads", json={"title": "Live"}, headers=headers
+    )
+    return app_id, thread_response.json()["thread"]["id"]
+
+
+async def _next_event(stream) -> tuple[str, dict]:
+    """Read the next non-comment SSE frame."""
+    while True:
+        frame = await asyncio.wait_for(anext(stream), timeout=5)
+        if frame.startswith(":"):
+            continue
+        event_line, data_line = frame.strip().split("\n")
+        return event_line.removeprefix("event: "), json.loads(
+            data_line.removeprefix("data: ")
+        )
+
+
+@pytest.mark.asyncio
+async def test_thread_stream_receives_message_created(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    stream = event_stream(hub, uuid.UUID(app_id), uuid.UUID(thread_id))
+    assert await anext(stream) == ": connected\n\n"
+
+    await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/messages",
+        json={"content": "hello"},
+        headers=headers,
+    )
+    await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/messages/assistant",
+        json={"content": "hi there"},
+        headers=headers,
+    )
+
+    event, data = await _next_event(stream)
+    assert event == "message.created"
+    assert data["thread_id"] == thread_id
+    assert data["role"] == "user"
+    assert data["content"] == "hello"
+    assert data["seq"] == 2
+
+    event, data = await _next_event(stream)
+    assert event == "message.created"
+    assert data["role"] == "assistant"
+    assert data["seq"] == 3
+    await stream.aclose()
+    assert hub.subscriber_count == 0
+
+
+@pytest.mark.asyncio
+async def test_app_stream_receives_thread_events(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, _ = await _create_app_and_thread(test_client, headers)
+
+    stream = event_stream(hub, uuid.UUID(app_id))
+    await anext(stream)
+
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "New one"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+    await test_client.patch(
+        f"/threads/{thread_id}", json={"status": "archived"}, headers=headers
+    )
+
+    event, data = await _next_event(stream)
+    assert event == "thread.updated"
+    assert data["id"] == thread_id
+    assert data["title"] == "New one"
+
+    event, data = await _next_event(stream)
+    assert event == "message.created"
+    assert data["thread_id"] == thread_id
+    assert data["seq"] == 1  # greeting
+
+    event, data = await _next_event(stream)
+    assert event == "thread.updated"
+    assert data["status"] == "archived"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_thread_stream_ignores_other_threads(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    other = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Other"}, headers=headers
+    )
+    other_id = other.json()["thread"]["id"]
+
+    stream = event_stream(hub, uuid.UUID(app_id), uuid.UUID(thread_id))
+    await anext(stream)
+
+    await test_client.post(
+        f"/apps/{app_id}/threads/{other_id}/messages",
+        json={"content": "elsewhere"},
+        headers=headers,
+    )
+    await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/messages",
+        json={"content": "here"},
+        headers=headers,
+    )
+
+    event, data = await _next_event(stream)
+    assert data["content"] == "here"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_emits_one_thread_event_per_thread(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    stream = event_stream(hub, uuid.UUID(app_id), uuid.UUID(thread_id))
+    await anext(stream)
+
+    await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {"thread_id": thread_id, "role": "user", "content": f"m{i}"}
+                for i in range(3)
+            ]
+        },
+        headers=headers,
+    )
+
+    event, data = await _next_event(stream)
+    assert event == "thread.updated"
+    assert data == {"thread_id": thread_id, "first_seq": 2, "last_seq": 4}
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_run_emits_one_message_event_per_reply(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    other = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Other"}, headers=headers
+    )
+    thread_ids = [thread_id, other.json()["thread"]["id"]]
+    for tid in thread_ids:
+        await test_client.post(
+            f"/apps/{app_id}/threads/{tid}/messages",
+            json={"content": "hi"},
+            headers=headers,
+        )
+
+    stream = event_stream(hub, uuid.UUID(app_id))
+    await anext(stream)
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk", json={"thread_ids": thread_ids}, headers=headers
+    )
+    assert response.status_code == 200
+
+    replies = set()
+    while len(replies) < 2:
+        event, data = await _next_event(stream)
+        if event == "message.created":
+            assert data["role"] == "assistant"
+            replies.add(data["thread_id"])
+    assert replies == set(thread_ids)
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    hub.queue_size = 1
+
+    stream = event_stream(hub, uuid.UUID(app_id), uuid.UUID(thread_id))
+    await anext(stream)
+
+    for content in ("one", "two"):
+        await test_client.post(
+            f"/apps/{app_id}/threads/{thread_id}/messages",
+            json={"content": content},
+            headers=headers,
+        )
+
+    # Wait for both notifications to reach the (full) subscription
+    for _ in range(100):
+        if any(sub.closed for subs in hub._subscriptions.values() for sub in subs):
+            break
+        await asyncio.sleep(0.05)
+
+    event, data = await _next_event(stream)
+    assert event == "resync"
+    with pytest.raises(StopAsyncIteration):
+        await anext(stream)
+
+
+@pytest.mark.asyncio
+async def test_thread_events_unknown_thread_returns_404(
+    test_client: AsyncClient, authenticated_user, hub
+):
+    headers = authenticated_user["headers"]
+    app_id, _ = await _create_app_and_thread(test_client, headers)
+
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/00000000-0000-0000-0000-000000000000/events",
+        headers=headers,
+    )
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "ERROR_THREAD_NOT_FOUND"
+
+
+@pytest.mark.asyncio
+async def test_app_events_requires_auth(test_client: AsyncClient, hub):
+    response = await test_client.get(
+        "/apps/00000000-0000-0000-0000-000000000000/events"
+    )
+
+    assert response.status_code == 401
@@ -1,9 +1,17 @@
-"""Tests for /run (sync) and /run/stream (SSE) endpoints."""
+"""Tests for /run (sync), /run/stream (SSE) and /run/bulk (NDJSON) endpoints."""
+
+import json
+import uuid
 
 import pytest
+from fastapi import HTTPException
 from httpx import AsyncClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.services.idempotency import IdempotencyRequest
+from app.services.orchestrator import ChatOrchestrator
+
 
 async def _create_app_and_thread(
     test_client: AsyncClient,
@@ -144,6 +152,110 @@ async def test_run_sync_webhook_not_configured_uses_simulator(
     assert data["assistant_message"] is not None
 
 
+@pytest.mark.asyncio
+async def test_run_sync_idempotency_key_skips_second_run(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """POST /run retried with the same Idempotency-Key persists only one reply."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    await _send_user_message(test_client, headers, app_id, thread_id, "Hello")
+    idem_headers = {**headers, "Idempotency-Key": "run-1"}
+
+    first = await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/run", headers=idem_headers
+    )
+    retry = await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/run", headers=idem_headers
+    )
+
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+
+    msgs_resp = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert len(msgs_resp.json()) == 3  # greeting + user + one assistant reply
+
+
+@pytest.mark.asyncio
+async def test_run_sync_failure_before_saving_response_frees_key(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession, monkeypatch
+):
+    """A run that dies before its response is stored leaves no reply and no
+    claimed key behind, so the retry runs instead of answering 409."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    await _send_user_message(test_client, headers, app_id, thread_id, "Hello")
+    idem_headers = {**headers, "Idempotency-Key": "run-crash"}
+
+    save = IdempotencyRequest.save
+
+    async def crash_once(self, db, body, status_code=200):
+        monkeypatch.setattr(IdempotencyRequest, "save", save)
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(IdempotencyRequest, "save", crash_once)
+    with pytest.raises(RuntimeError):
+        await test_client.post(
+            f"/apps/{app_id}/threads/{thread_id}/run", headers=idem_headers
+        )
+
+    retry = await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/run", headers=idem_headers
+    )
+    assert retry.status_code == 200
+    assert retry.json()["status"] == "completed"
+    msgs_resp = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert len(msgs_resp.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_run_sync_duplicate_during_call_gets_409(
+    test_client: AsyncClient,
+    authenticated_user,
+    db_session: AsyncSession,
+    engine,
+    monkeypatch,
+):
+    """A duplicate sent while the partner is answering gets 409 at once instead
+    of waiting on the first request's uncommitted claim."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    await _send_user_message(test_client, headers, app_id, thread_id, "Hello")
+    idem_headers = {**headers, "Idempotency-Key": "run-busy"}
+
+    claims = []
+    claim = IdempotencyRequest.claim
+
+    async def record_claim(self, db):
+        claims.append(self)
+        return await claim(self, db)
+
+    run = ChatOrchestrator.run
+    duplicate_errors = []
+
+    async def run_with_duplicate(*args, **kwargs):
+        async with AsyncSession(engine) as other:
+            await other.execute(text("SET LOCAL lock_timeout = '2s'"))
+            with pytest.raises(HTTPException) as exc_info:
+                await claim(claims[0], other)
+            duplicate_errors.append(exc_info.value)
+        return await run(*args, **kwargs)
+
+    monkeypatch.setattr(IdempotencyRequest, "claim", record_claim)
+    monkeypatch.setattr(ChatOrchestrator, "run", run_with_duplicate)
+    response = await test_client.post(
+        f"/apps/{app_id}/threads/{thread_id}/run", headers=idem_headers
+    )
+
+    assert response.json()["status"] == "completed"
+    assert duplicate_errors[0].status_code == 409
+    assert duplicate_errors[0].detail == "ERROR_IDEMPOTENCY_KEY_IN_PROGRESS"
+
+
 # --- SSE /run/stream endpoint ---
 
 
@@ -198,6 +310,160 @@ async def test_stream_persists_assistant_message(
     assert messages[2]["role"] == "assistant"
 
 
+# --- Bulk /run/bulk endpoint ---
+
+
+def _parse_ndjson(text: str) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+@pytest.mark.asyncio
+async def test_run_bulk_by_thread_ids(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """POST /run/bulk runs every listed thread and persists one reply each."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    other_resp = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Other"}, headers=headers
+    )
+    other_id = other_resp.json()["thread"]["id"]
+    await _send_user_message(test_client, headers, app_id, thread_id, "Hi")
+    await _send_user_message(test_client, headers, app_id, other_id, "Hey")
+
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk",
+        json={"thread_ids": [thread_id, other_id], "concurrency": 2},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert "application/x-ndjson" in response.headers["content-type"]
+    items = _parse_ndjson(response.text)
+    assert {item["thread_id"] for item in items} == {thread_id, other_id}
+    assert all(item["status"] == "completed" for item in items)
+    assert all(item["assistant_message"]["seq"] == 3 for item in items)
+
+    msgs_resp = await test_client.get(
+        f"/apps/{app_id}/threads/{other_id}/messages", headers=headers
+    )
+    messages = msgs_resp.json()
+    assert [m["role"] for m in messages] == ["assistant", "user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_run_bulk_reports_per_thread_errors(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """Threads without user messages or outside the app are reported, not fatal."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    missing_id = str(uuid.uuid4())
+
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk",
+        json={"thread_ids": [thread_id, missing_id]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    items = {item["thread_id"]: item for item in _parse_ndjson(response.text)}
+    assert items[thread_id]["error"] == "ERROR_NO_USER_MESSAGES"
+    assert items[missing_id]["error"] == "ERROR_THREAD_NOT_FOUND"
+
+
+@pytest.mark.asyncio
+async def test_run_bulk_holds_no_transaction_during_calls(
+    test_client: AsyncClient, authenticated_user, engine, monkeypatch
+):
+    """Webhook calls run outside a transaction; a thread deleted meanwhile
+    is reported instead of dropped."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    other_resp = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Other"}, headers=headers
+    )
+    other_id = other_resp.json()["thread"]["id"]
+    await _send_user_message(test_client, headers, app_id, thread_id, "Hi")
+    await _send_user_message(test_client, headers, app_id, other_id, "Hey")
+
+    run = ChatOrchestrator.run
+    idle_in_transaction = []
+
+    async def run_and_delete(app, thread, *args, **kwargs):
+        async with engine.begin() as conn:
+            idle_in_transaction.append(
+                await conn.scalar(
+                    text(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() "
+                        "AND state = 'idle in transaction' "
+                        "AND query ILIKE '%FROM messages%'"
+                    )
+                )
+            )
+            if str(thread.id) == other_id:
+                await conn.execute(
+                    text("DELETE FROM threads WHERE id = :id"), {"id": other_id}
+                )
+        return await run(app, thread, *args, **kwargs)
+
+    monkeypatch.setattr(ChatOrchestrator, "run", run_and_delete)
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk",
+        json={"thread_ids": [thread_id, other_id]},
+        headers=headers,
+    )
+    items = {item["thread_id"]: item for item in _parse_ndjson(response.text)}
+    assert items[thread_id]["status"] == "completed"
+    assert items[other_id]["error"] == "ERROR_THREAD_NOT_FOUND"
+    assert idle_in_transaction == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_run_bulk_by_filter(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """POST /run/bulk with a filter selects threads by customer_id."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+    await test_client.post(
+        f"/apps/{app_id}/threads",
+        json={"title": "Other", "customer_id": "cust-2"},
+        headers=headers,
+    )
+    await _send_user_message(test_client, headers, app_id, thread_id, "Hi")
+
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk",
+        json={"filter": {"customer_id": "cust-1"}},
+        headers=headers,
+    )
+    items = _parse_ndjson(response.text)
+    assert len(items) == 1
+    assert items[0]["thread_id"] == thread_id
+    assert items[0]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_run_bulk_requires_single_selector(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """Either thread_ids or filter must be given, not both or neither."""
+    headers = authenticated_user["headers"]
+    app_id, thread_id = await _create_app_and_thread(test_client, headers)
+
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk", json={}, headers=headers
+    )
+    assert response.status_code == 422
+
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk",
+        json={"thread_ids": [thread_id], "filter": {}},
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+
 def _parse_sse(text: str) -> list[dict]:
     """Parse SSE text into a list of {event, data} dicts."""
     events = []
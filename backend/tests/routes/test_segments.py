@@ -0,0 +1,175 @@
+"""Tests for subscriber metadata filters and saved segments."""
+
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import insert
+
+from app.models import Subscriber
+
+
+async def _create_app_with_subscribers(client: AsyncClient, headers, db_session):
+    app_response = await client.post(
+        "/apps/", json={"name": "Segment App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    await db_session.execute(
+        insert(Subscriber),
+        [
+            {"app_id": app_id, "customer_id": "c1", "metadata_json": {"plan": "pro"}},
+            {
+                "app_id": app_id,
+                "customer_id": "c2",
+                "metadata_json": {"plan": "pro", "score": 80},
+            },
+            {"app_id": app_id, "customer_id": "c3", "metadata_json": {"score": 20}},
+            {"app_id": app_id, "customer_id": "c4", "metadata_json": {}},
+        ],
+    )
+    await db_session.commit()
+    return app_id
+
+
+async def _customer_ids(client: AsyncClient, app_id, headers, **params):
+    response = await client.get(
+        f"/apps/{app_id}/subscribers", params=params, headers=headers
+    )
+    assert response.status_code == 200, response.text
+    return sorted(item["customer_id"] for item in response.json()["items"])
+
+
+@pytest.mark.asyncio
+async def test_list_subscribers_metadata_filters(
+    test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_id = await _create_app_with_subscribers(test_client, headers, db_session)
+
+    assert await _customer_ids(
+        test_client, app_id, headers, metadata='{"plan": "pro"}'
+    ) == ["c1", "c2"]
+    assert await _customer_ids(
+        test_client, app_id, headers, metadata_path="$.score > 50"
+    ) == ["c2"]
+    assert (
+        await _customer_ids(
+            test_client,
+            app_id,
+            headers,
+            metadata='{"plan": "pro"}',
+            metadata_path="$.score < 50",
+        )
+        == []
+    )
+
+    for params in (
+        {"metadata": "[1, 2]"},
+        {"metadata": "{not json"},
+        {"metadata_path": "$.score >>> 1"},
+    ):
+        response = await test_client.get(
+            f"/apps/{app_id}/subscribers", params=params, headers=headers
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "ERROR_INVALID_METADATA_FILTER"
+
+
+@pytest.mark.asyncio
+async def test_segment_counts_stay_current(
+    test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_id = await _create_app_with_subscribers(test_client, headers, db_session)
+
+    pro = await test_client.post(
+        f"/apps/{app_id}/segments",
+        json={"name": "Pro", "filter_json": {"metadata": {"plan": "pro"}}},
+        headers=headers,
+    )
+    assert pro.status_code == 200
+    pro_id = pro.json()["id"]
+    assert pro.json()["member_count"] == 2
+    everyone = await test_client.post(
+        f"/apps/{app_id}/segments",
+        json={"name": "Everyone", "filter_json": {}},
+        headers=headers,
+    )
+    assert everyone.json()["member_count"] == 4
+    assert await _customer_ids(test_client, app_id, headers, segment_id=pro_id) == [
+        "c1",
+        "c2",
+    ]
+
+    # Import: c1 leaves the segment, c3 joins, c5 is new and joins
+    body = "\n".join(
+        json.dumps(row)
+        for row in (
+            {"customer_id": "c1", "metadata_json": {"plan": "free"}},
+            {"customer_id": "c3", "metadata_json": {"plan": "pro"}},
+            {"customer_id": "c5", "metadata_json": {"plan": "pro"}},
+        )
+    )
+    await test_client.post(
+        f"/apps/{app_id}/subscribers/import", content=body, headers=headers
+    )
+    # A thread for a new customer creates a subscriber with empty metadata
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads",
+        json={"title": "Hi", "customer_id": "c6"},
+        headers=headers,
+    )
+
+    segments = await test_client.get(f"/apps/{app_id}/segments", headers=headers)
+    counts = {s["name"]: s["member_count"] for s in segments.json()}
+    assert counts == {"Pro": 3, "Everyone": 6}
+
+    # Deleting the only thread of c6 deletes the subscriber too
+    await test_client.delete(
+        f"/threads/{thread.json()['thread']['id']}", headers=headers
+    )
+    detail = await test_client.get(
+        f"/apps/{app_id}/segments/{everyone.json()['id']}", headers=headers
+    )
+    assert detail.json()["member_count"] == 5
+    refreshed = await test_client.post(
+        f"/apps/{app_id}/segments/{everyone.json()['id']}/refresh", headers=headers
+    )
+    assert refreshed.json()["member_count"] == 5
+    assert refreshed.json()["counted_at"] > everyone.json()["counted_at"]
+
+
+@pytest.mark.asyncio
+async def test_segment_validation_and_delete(
+    test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_id = await _create_app_with_subscribers(test_client, headers, db_session)
+
+    response = await test_client.post(
+        f"/apps/{app_id}/segments",
+        json={"name": "Bad", "filter_json": {"metadata_path": "$$$"}},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "ERROR_INVALID_METADATA_FILTER"
+
+    segment = await test_client.post(
+        f"/apps/{app_id}/segments",
+        json={"name": "Scored", "filter_json": {"metadata_path": "$.score >= 20"}},
+        headers=headers,
+    )
+    segment_id = segment.json()["id"]
+    assert segment.json()["member_count"] == 2
+
+    response = await test_client.delete(
+        f"/apps/{app_id}/segments/{segment_id}", headers=headers
+    )
+    assert response.json() == {"message": "ACTION_SEGMENT_DELETED"}
+    response = await test_client.get(
+        f"/apps/{app_id}/subscribers",
+        params={"segment_id": segment_id},
+        headers=headers,
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "ERROR_SEGMENT_NOT_FOUND"
@@ -7,7 +7,7 @@ import json
 from datetime import datetime, timedelta, timezone
 
 import pytest
-from sqlalchemy import insert, update
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
@@ -202,6 +202,7 @@ class TestSubscribers:
         db_session.add(
             Message(
                 thread_id=threads[0].id,
+                app_id=app.id,
                 seq=1,
                 role="assistant",
                 content="hello",
@@ -228,6 +229,63 @@ class TestSubscribers:
         assert len(second.json()["items"]) == 2
         assert second.json()["next_cursor"] is None
 
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_sparse_fields_on_subscriber_lists(
+        self, test_client, db_session, authenticated_user
+    ):
+        """fields= returns only the requested keys and keeps cursor pagination."""
+        app = await self._create_app(db_session, authenticated_user["user"].id)
+        now = datetime.now(timezone.utc)
+        subscribers = [
+            Subscriber(
+                app_id=app.id,
+                customer_id=f"cust-{idx}",
+                metadata_json={"blob": "x" * 100},
+                created_at=now - timedelta(minutes=idx),
+                last_message_at=now - timedelta(minutes=idx),
+            )
+            for idx in range(3)
+        ]
+        db_session.add_all(subscribers)
+        await db_session.commit()
+        db_session.add(
+            Thread(app_id=app.id, subscriber_id=subscribers[0].id, title="T")
+        )
+        await db_session.commit()
+
+        first = await test_client.get(
+            f"/apps/{app.id}/subscribers?limit=2&fields=customer_id,thread_count",
+            headers=authenticated_user["headers"],
+        )
+        assert first.status_code == 200
+        payload = first.json()
+        assert payload["items"] == [
+            {"id": str(subscribers[0].id), "customer_id": "cust-0", "thread_count": 1},
+            {"id": str(subscribers[1].id), "customer_id": "cust-1", "thread_count": 0},
+        ]
+        second = await test_client.get(
+            f"/apps/{app.id}/subscribers?limit=2&fields=customer_id"
+            f"&cursor={payload['next_cursor']}",
+            headers=authenticated_user["headers"],
+        )
+        assert second.json()["items"] == [
+            {"id": str(subscribers[2].id), "customer_id": "cust-2"}
+        ]
+
+        threads = await test_client.get(
+            f"/apps/{app.id}/subscribers/{subscribers[0].id}/threads?fields=title",
+            headers=authenticated_user["headers"],
+        )
+        assert threads.status_code == 200
+        assert [set(item) for item in threads.json()["items"]] == [{"id", "title"}]
+
+        invalid = await test_client.get(
+            f"/apps/{app.id}/subscribers?fields=metadata_json",
+            headers=authenticated_user["headers"],
+        )
+        assert invalid.status_code == 400
+        assert invalid.json()["detail"] == "ERROR_INVALID_FIELDS"
+
     @pytest.mark.asyncio(loop_scope="function")
     async def test_get_subscriber_detail(
         self, test_client, db_session, authenticated_user
@@ -302,6 +360,113 @@ class TestSubscribers:
             response.json().get("detail") == "ERROR_PARTNER_API_APP_OR_SECRET_INVALID"
         )
 
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_import_subscribers_csv_merges_and_reports(
+        self, test_client, db_session, authenticated_user, monkeypatch
+    ):
+        """CSV import upserts on customer_id and reports progress and row errors."""
+        monkeypatch.setattr(settings, "SUBSCRIBER_IMPORT_BATCH_SIZE", 2)
+        app = await self._create_app(db_session, authenticated_user["user"].id)
+        db_session.add(
+            Subscriber(
+                app_id=app.id,
+                customer_id="cust-1",
+                display_name="Old Name",
+                metadata_json={"plan": "free", "region": "eu"},
+            )
+        )
+        await db_session.commit()
+        body = (
+            "customer_id,display_name,metadata_json\n"
+            'cust-1,,"{""plan"": ""pro""}"\n'
+            "cust-2,Second,\n"
+            ",No Id,\n"
+            "cust-3,Third,not-json\n"
+            "cust-2,Second Again,\n"
+        )
+
+        response = await test_client.post(
+            f"/apps/{app.id}/subscribers/import",
+            content=body,
+            headers={**authenticated_user["headers"], "Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        events = [json.loads(line) for line in response.content.splitlines()]
+        errors = [event["error"] for event in events if "error" in event]
+        assert [error["line"] for error in errors] == [4, 5]
+        assert errors[0]["message"].startswith("customer_id:")
+        assert errors[1]["message"] == "metadata_json: invalid JSON"
+        assert [
+            event["progress"]["processed"]
+            for event in events[:-1]
+            if "progress" in event
+        ] == [2, 4, 5]
+        assert events[-1] == {
+            "complete": True,
+            "processed": 5,
+            "inserted": 1,
+            "updated": 2,
+            "failed": 2,
+        }
+
+        rows = await db_session.execute(
+            select(
+                Subscriber.customer_id,
+                Subscriber.display_name,
+                Subscriber.metadata_json,
+            )
+            .filter(Subscriber.app_id == app.id)
+            .order_by(Subscriber.customer_id)
+        )
+        assert [tuple(row) for row in rows] == [
+            ("cust-1", "Old Name", {"plan": "pro", "region": "eu"}),
+            ("cust-2", "Second Again", {}),
+        ]
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_import_subscribers_ndjson_and_bad_header(
+        self, test_client, db_session, authenticated_user
+    ):
+        """NDJSON rows are validated per line; a CSV without customer_id is 400."""
+        app = await self._create_app(db_session, authenticated_user["user"].id)
+        body = (
+            '{"customer_id": "a", "metadata_json": {"tier": 1}}\n'
+            '{"customer_id": 7}\n'
+            "{broken\n"
+            '{"customer_id": "b", "display_name": "Bee"}\n'
+        )
+
+        response = await test_client.post(
+            f"/apps/{app.id}/subscribers/import",
+            content=body,
+            headers=authenticated_user["headers"],
+        )
+
+        events = [json.loads(line) for line in response.content.splitlines()]
+        assert [event["error"]["line"] for event in events if "error" in event] == [
+            2,
+            3,
+        ]
+        assert events[-1]["inserted"] == 2
+
+        listed = await test_client.get(
+            f"/apps/{app.id}/subscribers", headers=authenticated_user["headers"]
+        )
+        names = {
+            item["customer_id"]: item["display_name"] for item in listed.json()["items"]
+        }
+        assert names == {"a": None, "b": "Bee"}
+
+        response = await test_client.post(
+            f"/apps/{app.id}/subscribers/import?format=csv",
+            content="id,name\n1,x\n",
+            headers=authenticated_user["headers"],
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "ERROR_INVALID_IMPORT_HEADER"
+
     @staticmethod
     async def _create_app(db_session: AsyncSession, user_id):
         result = await db_session.execute(
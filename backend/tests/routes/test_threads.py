@@ -484,3 +484,142 @@ async def test_delete_thread_keeps_subscriber_with_remaining_threads(
         select(Subscriber).filter(Subscriber.id == subscriber_id)
     )
     assert result.scalars().first() is not None
+
+
+@pytest.mark.asyncio
+async def test_create_thread_idempotency_key(
+    test_client: AsyncClient, authenticated_user, db_session: AsyncSession
+):
+    """Retrying create_thread with the same Idempotency-Key does not open a second thread."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    idem_headers = {**headers, "Idempotency-Key": "open-chat-1"}
+
+    first = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Widget"}, headers=idem_headers
+    )
+    retry = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Widget"}, headers=idem_headers
+    )
+
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+
+    threads = await test_client.get(f"/apps/{app_id}/threads", headers=headers)
+    assert len(threads.json()["items"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_list_threads_conditional_get(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "First"}, headers=headers
+    )
+
+    first = await test_client.get(f"/apps/{app_id}/threads", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    cached = await test_client.get(
+        f"/apps/{app_id}/threads", headers={**headers, "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    # Different page parameters have their own validator
+    other_page = await test_client.get(
+        f"/apps/{app_id}/threads?limit=1", headers={**headers, "If-None-Match": etag}
+    )
+    assert other_page.status_code == 200
+
+    await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Second"}, headers=headers
+    )
+    changed = await test_client.get(
+        f"/apps/{app_id}/threads", headers={**headers, "If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert len(changed.json()["items"]) == 2
+    assert changed.headers["ETag"] != etag
+
+    # Deleting a listed thread changes the page, and so the validator
+    await test_client.delete(
+        f"/threads/{changed.json()['items'][0]['id']}", headers=headers
+    )
+    after_delete = await test_client.get(
+        f"/apps/{app_id}/threads",
+        headers={**headers, "If-None-Match": changed.headers["ETag"]},
+    )
+    assert after_delete.status_code == 200
+    assert len(after_delete.json()["items"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_thread_conditional_get(test_client: AsyncClient, authenticated_user):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_response = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Before"}, headers=headers
+    )
+    thread_id = thread_response.json()["thread"]["id"]
+
+    first = await test_client.get(f"/threads/{thread_id}", headers=headers)
+    etag = first.headers["ETag"]
+    cached = await test_client.get(
+        f"/threads/{thread_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+
+    await test_client.patch(
+        f"/threads/{thread_id}", json={"title": "After"}, headers=headers
+    )
+    changed = await test_client.get(
+        f"/threads/{thread_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert changed.json()["title"] == "After"
+
+    missing = await test_client.get(
+        f"/threads/{uuid.uuid4()}", headers={**headers, "If-None-Match": etag}
+    )
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_threads_sparse_fields(test_client: AsyncClient, authenticated_user):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Test App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    for title in ("One", "Two"):
+        await test_client.post(
+            f"/apps/{app_id}/threads", json={"title": title}, headers=headers
+        )
+
+    first = await test_client.get(
+        f"/apps/{app_id}/threads?limit=1&fields=title", headers=headers
+    )
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    page = first.json()
+    assert page["items"] == [{"id": page["items"][0]["id"], "title": "Two"}]
+
+    second = await test_client.get(
+        f"/apps/{app_id}/threads?limit=1&fields=title&cursor={page['next_cursor']}",
+        headers=headers,
+    )
+    assert [item["title"] for item in second.json()["items"]] == ["One"]
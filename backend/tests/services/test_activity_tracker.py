@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import App, Subscriber, User
+from app.services.activity_tracker import ActivityTracker
+
+
+async def _create_subscriber(db: AsyncSession) -> Subscriber:
+    user = User(
+        id=uuid.uuid4(),
+        email=f"{uuid.uuid4()}@example.com",
+        hashed_password="x",
+        is_active=True,
+        is_superuser=False,
+        is_verified=True,
+    )
+    app = App(name="Tracker App", user=user)
+    subscriber = Subscriber(app=app, customer_id="cust-1")
+    db.add_all([user, app, subscriber])
+    await db.commit()
+    return subscriber
+
+
+def test_record_keeps_latest_timestamps():
+    tracker = ActivityTracker(flush_interval=60)
+    subscriber_id = uuid.uuid4()
+    early = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    late = early + timedelta(minutes=5)
+
+    tracker.record(subscriber_id, late)
+    tracker.record(subscriber_id, early)
+    tracker.record(subscriber_id, late + timedelta(minutes=1), message=False)
+
+    assert tracker.pending_count == 1
+    seen, messaged = tracker._pending[subscriber_id]
+    assert seen == late + timedelta(minutes=1)
+    assert messaged == late
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_in_bulk_and_never_moves_backwards(db_session):
+    subscriber_id = (await _create_subscriber(db_session)).id
+    tracker = ActivityTracker(flush_interval=60)
+    now = datetime.now(timezone.utc)
+
+    tracker.record(subscriber_id, now)
+    assert await tracker.flush(db_session) == 1
+    assert tracker.pending_count == 0
+
+    # An older timestamp flushed later does not overwrite newer activity
+    tracker.record(subscriber_id, now - timedelta(hours=1))
+    await tracker.flush(db_session)
+
+    db_session.expire_all()
+    result = await db_session.execute(
+        select(Subscriber).filter(Subscriber.id == subscriber_id)
+    )
+    stored = result.scalars().first()
+    assert stored.last_message_at == now
+    assert stored.last_seen_at == now
+
+
+@pytest.mark.asyncio
+async def test_flush_failure_requeues_pending(mocker):
+    tracker = ActivityTracker(flush_interval=60)
+    subscriber_id = uuid.uuid4()
+    tracker.record(subscriber_id, datetime.now(timezone.utc))
+
+    db = mocker.AsyncMock(spec=AsyncSession)
+    db.execute.side_effect = RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        await tracker.flush(db)
+    assert tracker.pending_count == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_with_nothing_pending_is_noop(mocker):
+    tracker = ActivityTracker(flush_interval=60)
+    db = mocker.AsyncMock(spec=AsyncSession)
+
+    assert await tracker.flush(db) == 0
+    db.execute.assert_not_called()
@@ -0,0 +1,144 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Message
+from app.services.message_partitions import (
+    add_months,
+    drop_partitions_before,
+    ensure_partitions,
+    month_start,
+    partition_name,
+)
+
+
+def test_month_arithmetic():
+    at = datetime(2026, 12, 31, 23, 30, tzinfo=timezone.utc)
+    assert month_start(at) == datetime(2026, 12, 1, tzinfo=timezone.utc)
+    assert add_months(month_start(at), 1) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert add_months(month_start(at), -12) == datetime(
+        2025, 12, 1, tzinfo=timezone.utc
+    )
+    assert partition_name(month_start(at)) == "messages_y2026m12"
+
+
+async def _partitions(db_session) -> set[str]:
+    result = await db_session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c "
+            "ON c.oid = i.inhrelid WHERE i.inhparent = 'messages'::regclass"
+        )
+    )
+    return set(result.scalars())
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_of_old_history_creates_partition(
+    test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "History App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Old"}, headers=headers
+    )
+    thread_id = thread.json()["thread"]["id"]
+
+    response = await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {
+                    "thread_id": thread_id,
+                    "role": "user",
+                    "content": "from 2019",
+                    "created_at": "2019-03-04T05:06:07Z",
+                }
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    assert "messages_y2019m03" in await _partitions(db_session)
+
+    # messages_from moved back, so the old message is still listed
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert [m["content"] for m in response.json()][-1] == "from 2019"
+
+
+@pytest.mark.asyncio
+async def test_messages_from_allows_for_clock_skew(
+    test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Skew App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Skew"}, headers=headers
+    )
+    created_at = datetime.fromisoformat(thread.json()["thread"]["created_at"])
+    thread_id = thread.json()["thread"]["id"]
+
+    # Written by a server whose clock is a minute behind the thread creator's
+    await db_session.execute(
+        insert(Message).values(
+            thread_id=thread_id,
+            app_id=app_id,
+            seq=2,
+            role="user",
+            content="early clock",
+            created_at=created_at - timedelta(minutes=1),
+        )
+    )
+    await db_session.commit()
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert "early clock" in [m["content"] for m in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_partitions_enforce_thread_seq_and_drop_whole_months(
+    engine, test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Retention App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Dup"}, headers=headers
+    )
+    thread_id = thread.json()["thread"]["id"]
+
+    # The greeting already has seq 1
+    with pytest.raises(IntegrityError):
+        await db_session.execute(
+            insert(Message).values(
+                id=uuid.uuid4(), thread_id=thread_id, app_id=app_id, seq=1, role="user"
+            )
+        )
+    await db_session.rollback()
+
+    old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    assert await ensure_partitions(engine, [old, add_months(old, 1)]) == [
+        "messages_y2020m01",
+        "messages_y2020m02",
+    ]
+    assert await ensure_partitions(engine, [old]) == []
+
+    dropped = await drop_partitions_before(engine, add_months(old, 1))
+    assert dropped == ["messages_y2020m01"]
+    partitions = await _partitions(db_session)
+    assert "messages_y2020m01" not in partitions
+    assert "messages_y2020m02" in partitions
@@ -0,0 +1,105 @@
+"""Tests for connection pool and session instrumentation."""
+
+import asyncio
+import logging
+from collections import Counter, defaultdict
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.models import User
+from app.services import pool_metrics
+from app.services.pool_metrics import (
+    InstrumentedQueuePool,
+    instrument,
+    snapshot,
+    warn_long_held,
+)
+
+
+@pytest.fixture
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(pool_metrics, "_pools", [])
+    monkeypatch.setattr(pool_metrics, "_holds", defaultdict(pool_metrics._Durations))
+    monkeypatch.setattr(pool_metrics, "_long_holds", Counter())
+
+
+@pytest.mark.asyncio
+async def test_pool_gauges_waits_and_long_holds(
+    engine, fresh_metrics, monkeypatch, caplog
+):
+    monkeypatch.setattr(settings, "DATABASE_HOLD_WARN_SECONDS", 0.05)
+    pooled = create_async_engine(
+        settings.TEST_DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    instrument(pooled, "test")
+    try:
+        async with pooled.connect() as conn:
+            await conn.execute(select(1))
+            with pytest.raises(PoolTimeoutError):
+                async with pooled.connect() as other:
+                    await other.execute(select(1))
+            [pool] = snapshot()["pools"]
+            assert (pool["size"], pool["in_use"], pool["idle"]) == (1, 1, 0)
+            assert pool["checkout_timeouts"] == 1
+            assert pool["checkout_wait"]["max_ms"] >= 100
+
+            # Warned while still held, once
+            await asyncio.sleep(0.06)
+            with caplog.at_level(logging.WARNING):
+                assert warn_long_held() == 1
+                assert warn_long_held() == 1
+            warnings = [r for r in caplog.records if "held for" in r.getMessage()]
+            assert len(warnings) == 1
+            assert "by background" in warnings[0].getMessage()
+            assert snapshot()["long_held"][0]["route"] == "background"
+
+        metrics = snapshot()
+        [pool] = metrics["pools"]
+        assert (pool["in_use"], pool["idle"]) == (0, 1)
+        assert pool["checkout_wait"]["count"] == 2
+        [route] = metrics["routes"]
+        assert (route["route"], route["count"], route["long_holds"]) == (
+            "background",
+            1,
+            1,
+        )
+        assert metrics["long_held"] == []
+    finally:
+        await pooled.dispose()
+
+
+@pytest.mark.asyncio
+async def test_holds_are_attributed_to_routes(
+    engine, fresh_metrics, test_client: AsyncClient, authenticated_user, db_session
+):
+    instrument(engine, "primary")
+    # Release the connection the fixtures checked out before instrumenting
+    await db_session.close()
+    headers = authenticated_user["headers"]
+    response = await test_client.get("/apps/", headers=headers)
+    assert response.status_code == 200
+
+    response = await test_client.get("/metrics/database", headers=headers)
+    assert response.status_code == 403
+
+    await db_session.execute(
+        update(User)
+        .where(User.id == authenticated_user["user"].id)
+        .values(is_superuser=True)
+    )
+    await db_session.commit()
+    response = await test_client.get("/metrics/database", headers=headers)
+    assert response.status_code == 200
+    metrics = response.json()
+    routes = {route["route"]: route for route in metrics["routes"]}
+    assert routes["GET /apps/"]["count"] >= 1
+    assert metrics["pools"][0]["name"] == "primary"
@@ -0,0 +1,151 @@
+"""Tests for batched per-app retention."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text, update
+
+from app.config import settings
+from app.models import Thread
+from app.services.retention import run_retention
+
+
+@pytest.mark.asyncio
+async def test_retention_policy_is_validated(
+    test_client: AsyncClient, authenticated_user
+):
+    headers = authenticated_user["headers"]
+    response = await test_client.post(
+        "/apps/",
+        json={"name": "Bad", "config_json": {"retention": {"messages_days": 0}}},
+        headers=headers,
+    )
+    assert response.status_code == 422
+    response = await test_client.post(
+        "/apps/",
+        json={"name": "Bad", "config_json": {"retention": {"days": 30}}},
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_retention_trims_messages_and_deletes_inactive_threads(
+    engine, test_client: AsyncClient, authenticated_user, db_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "RETENTION_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "RETENTION_PAUSE_SECONDS", 0)
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/",
+        json={
+            "name": "Retention App",
+            "config_json": {
+                "retention": {"messages_days": 30, "threads_inactive_days": 90}
+            },
+        },
+        headers=headers,
+    )
+    app_id = app_response.json()["id"]
+    active = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Active"}, headers=headers
+    )
+    active_id = active.json()["thread"]["id"]
+    old = datetime.now(timezone.utc) - timedelta(days=60)
+    await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {
+                    "thread_id": active_id,
+                    "role": "user",
+                    "content": f"old {n}",
+                    "created_at": (old + timedelta(minutes=n)).isoformat(),
+                }
+                for n in range(5)
+            ]
+        },
+        headers=headers,
+    )
+    stale = await test_client.post(
+        f"/apps/{app_id}/threads",
+        json={"title": "Stale", "customer_id": "gone"},
+        headers=headers,
+    )
+    stale_id = stale.json()["thread"]["id"]
+    segment = await test_client.post(
+        f"/apps/{app_id}/segments",
+        json={"name": "Everyone", "filter_json": {}},
+        headers=headers,
+    )
+    assert segment.json()["member_count"] == 1
+
+    await db_session.execute(
+        update(Thread)
+        .where(Thread.id == stale_id)
+        .values(updated_at=datetime.now(timezone.utc) - timedelta(days=100))
+    )
+    await db_session.commit()
+    since = (await test_client.get(f"/apps/{app_id}/changes", headers=headers)).json()
+    active_updated_at = await db_session.scalar(
+        select(Thread.updated_at).filter(Thread.id == active_id)
+    )
+    messages_url = f"/apps/{app_id}/threads/{active_id}/messages"
+    etag = (await test_client.get(messages_url, headers=headers)).headers["ETag"]
+
+    await run_retention(engine)
+
+    # Trimming keeps updated_at but still invalidates cached message pages
+    messages = await test_client.get(
+        messages_url, headers={**headers, "If-None-Match": etag}
+    )
+    assert messages.status_code == 200
+    assert [m["content"] for m in messages.json()] != []
+    assert not any(m["content"].startswith("old") for m in messages.json())
+    response = await test_client.get(f"/threads/{stale_id}", headers=headers)
+    assert response.status_code == 404
+
+    segment = await test_client.get(
+        f"/apps/{app_id}/segments/{segment.json()['id']}", headers=headers
+    )
+    assert segment.json()["member_count"] == 0
+    changes = await test_client.get(
+        f"/apps/{app_id}/changes",
+        params={"since": since["next_since"]},
+        headers=headers,
+    )
+    assert [c["kind"] for c in changes.json()["items"]] == [
+        "thread.deleted",
+        "subscriber.deleted",
+    ]
+
+    runs = await test_client.get(f"/apps/{app_id}/retention-runs", headers=headers)
+    [run] = runs.json()
+    assert run["status"] == "completed"
+    assert run["messages_deleted"] == 6  # 5 expired + the stale thread's greeting
+    assert run["threads_deleted"] == 1
+    assert run["subscribers_deleted"] == 1
+    assert run["batches"] >= 4
+    assert run["rows_per_second"] > 0
+
+    # messages_from was raised to the cutoff: reads skip the trimmed months
+    messages_from, updated_at = (
+        await db_session.execute(
+            select(Thread.messages_from, Thread.updated_at).filter(
+                Thread.id == active_id
+            )
+        )
+    ).one()
+    assert messages_from > old + timedelta(days=29)
+    assert updated_at == active_updated_at
+
+    # Nothing left to trim: the next pass does not rewrite the thread row
+    row_version = text("SELECT xmin::text FROM threads WHERE id = :id")
+    version = await db_session.scalar(row_version, {"id": active_id})
+    await db_session.commit()
+    await run_retention(engine)
+    runs = await test_client.get(f"/apps/{app_id}/retention-runs", headers=headers)
+    assert len(runs.json()) == 2
+    assert runs.json()[0]["messages_deleted"] == 0
+    assert await db_session.scalar(row_version, {"id": active_id}) == version
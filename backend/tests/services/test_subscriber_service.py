@@ -0,0 +1,61 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+from app.models import App, Subscriber, User
+from app.services.subscriber_service import resolve_subscriber
+
+
+async def _create_app(db: AsyncSession) -> App:
+    user = User(
+        id=uuid.uuid4(),
+        email="subscribers@example.com",
+        hashed_password="x",
+        is_active=True,
+        is_superuser=False,
+        is_verified=True,
+    )
+    app = App(name="Subscriber App", user=user)
+    db.add_all([user, app])
+    await db.commit()
+    return app
+
+
+@pytest.mark.asyncio
+async def test_resolve_subscriber_creates_then_reuses(db_session):
+    app = await _create_app(db_session)
+
+    created = await resolve_subscriber(db_session, app_id=app.id, customer_id="c-1")
+    await db_session.commit()
+    again = await resolve_subscriber(db_session, app_id=app.id, customer_id="c-1")
+
+    assert created.id == again.id
+    assert created.display_name == "c-1"
+    assert again.last_seen_at >= created.created_at
+
+
+@pytest.mark.asyncio
+async def test_resolve_subscriber_concurrent_first_contact(engine, db_session):
+    """Concurrent first contacts for one customer resolve to a single row."""
+    app = await _create_app(db_session)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def resolve_in_own_session():
+        async with session_maker() as session:
+            subscriber = await resolve_subscriber(
+                session, app_id=app.id, customer_id="racer"
+            )
+            await session.commit()
+            return subscriber.id
+
+    ids = await asyncio.gather(*(resolve_in_own_session() for _ in range(5)))
+
+    assert len(set(ids)) == 1
+    count = await db_session.scalar(
+        select(func.count()).select_from(Subscriber).filter(Subscriber.app_id == app.id)
+    )
+    assert count == 1
@@ -0,0 +1,310 @@
+"""Tests for cold storage of archived threads."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, update
+
+from app.config import settings
+from app.models import ArchivedThread, Message, Thread
+from app.services.message_service import get_history
+from app.services.retention import run_retention
+from app.services import thread_archive
+from app.services.thread_archive import archive_threads, clear_cache
+
+
+async def _hot_count(db_session, thread_id) -> int:
+    return await db_session.scalar(
+        select(func.count()).select_from(Message).filter(Message.thread_id == thread_id)
+    )
+
+
+@pytest.mark.asyncio
+async def test_archived_thread_reads_transparently(
+    engine, test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Archive App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Cold"}, headers=headers
+    )
+    thread_id = thread.json()["thread"]["id"]
+    messages_url = f"/apps/{app_id}/threads/{thread_id}/messages"
+    for n in range(3):
+        await test_client.post(
+            messages_url,
+            json={"content": f"m{n}", "content_json": {"n": n}},
+            headers=headers,
+        )
+    before = (await test_client.get(messages_url, headers=headers)).json()
+    assert len(before) == 4
+
+    await test_client.patch(
+        f"/threads/{thread_id}", json={"status": "archived"}, headers=headers
+    )
+    assert await archive_threads(engine) == 1
+    assert await archive_threads(engine) == 0
+    assert await _hot_count(db_session, thread_id) == 0
+
+    clear_cache()
+    assert (await test_client.get(messages_url, headers=headers)).json() == before
+    page = await test_client.get(
+        messages_url, params={"after_seq": 1, "limit": 2}, headers=headers
+    )
+    assert [m["seq"] for m in page.json()] == [2, 3]
+    page = await test_client.get(
+        messages_url, params={"before_seq": 3, "fields": "seq"}, headers=headers
+    )
+    assert page.json() == [
+        {"id": before[0]["id"], "seq": 1},
+        {"id": before[1]["id"], "seq": 2},
+    ]
+
+    # Reopened: new messages are hot and follow the archive
+    await test_client.post(messages_url, json={"content": "back"}, headers=headers)
+    messages = (await test_client.get(messages_url, headers=headers)).json()
+    assert [m["seq"] for m in messages] == [1, 2, 3, 4, 5]
+    assert messages[:4] == before
+    history = await get_history(thread_id, db_session, limit=3)
+    assert [m.content for m in history] == ["m1", "m2", "back"]
+
+    # Going cold again folds the new messages into the archive
+    assert await archive_threads(engine) == 1
+    archive = await db_session.get(ArchivedThread, thread_id)
+    assert archive.message_count == 5
+    assert await _hot_count(db_session, thread_id) == 0
+    assert (await test_client.get(messages_url, headers=headers)).json() == messages
+
+    response = await test_client.delete(f"/threads/{thread_id}", headers=headers)
+    assert response.status_code == 200
+    db_session.expunge_all()
+    assert await db_session.get(ArchivedThread, thread_id) is None
+
+
+@pytest.mark.asyncio
+async def test_inactive_threads_are_archived_and_trimmed_by_retention(
+    engine, test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/",
+        json={
+            "name": "Archive App",
+            "config_json": {"retention": {"archive_inactive_days": 7}},
+        },
+        headers=headers,
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Old"}, headers=headers
+    )
+    thread_id = thread.json()["thread"]["id"]
+    old = datetime.now(timezone.utc) - timedelta(days=60)
+    await test_client.post(
+        f"/apps/{app_id}/messages/bulk",
+        json={
+            "messages": [
+                {
+                    "thread_id": thread_id,
+                    "role": "user",
+                    "content": "ancient",
+                    "created_at": old.isoformat(),
+                }
+            ]
+        },
+        headers=headers,
+    )
+    await db_session.execute(
+        update(Thread)
+        .where(Thread.id == thread_id)
+        .values(updated_at=datetime.now(timezone.utc) - timedelta(days=10))
+    )
+    await db_session.commit()
+
+    await run_retention(engine)
+    assert await _hot_count(db_session, thread_id) == 0
+    archive = await db_session.get(ArchivedThread, thread_id)
+    assert archive.message_count == 2
+
+    await test_client.patch(
+        f"/apps/{app_id}",
+        json={
+            "config_json": {
+                "retention": {"archive_inactive_days": 7, "messages_days": 30}
+            }
+        },
+        headers=headers,
+    )
+    await run_retention(engine)
+    db_session.expunge_all()
+    archive = await db_session.get(ArchivedThread, thread_id)
+    assert archive.message_count == 1
+    response = await test_client.get(
+        f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+    )
+    assert [m["seq"] for m in response.json()] == [1]
+    runs = await test_client.get(f"/apps/{app_id}/retention-runs", headers=headers)
+    assert runs.json()[0]["messages_deleted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rearchiving_reads_the_stored_archive_not_the_cache(
+    engine, test_client: AsyncClient, authenticated_user, db_session
+):
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Archive App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Cold"}, headers=headers
+    )
+    thread_id = thread.json()["thread"]["id"]
+    messages_url = f"/apps/{app_id}/threads/{thread_id}/messages"
+    await test_client.post(messages_url, json={"content": "one"}, headers=headers)
+    await test_client.patch(
+        f"/threads/{thread_id}", json={"status": "archived"}, headers=headers
+    )
+    assert await archive_threads(engine) == 1
+
+    # A stale (empty) cache entry under the thread's current archive key
+    row = (
+        await db_session.execute(
+            select(Thread.id, Thread.archived_seq, Thread.messages_from).filter(
+                Thread.id == thread_id
+            )
+        )
+    ).one()
+    thread_archive._cache[thread_archive._cache_key(row)] = []
+
+    await test_client.post(messages_url, json={"content": "two"}, headers=headers)
+    await test_client.patch(
+        f"/threads/{thread_id}", json={"status": "archived"}, headers=headers
+    )
+    assert await archive_threads(engine) == 1
+    archive = await db_session.get(ArchivedThread, thread_id)
+    assert archive.message_count == 3
+    clear_cache()
+
+
+@pytest.mark.asyncio
+async def test_thread_reopened_after_selection_is_not_archived(
+    engine, test_client: AsyncClient, authenticated_user, db_session, monkeypatch
+):
+    """The cold check is repeated under the row lock."""
+    headers = authenticated_user["headers"]
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Archive App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread = await test_client.post(
+        f"/apps/{app_id}/threads", json={"title": "Cold"}, headers=headers
+    )
+    thread_id = thread.json()["thread"]["id"]
+    await test_client.patch(
+        f"/threads/{thread_id}", json={"status": "archived"}, headers=headers
+    )
+
+    archive_chunk = thread_archive._archive_chunk
+
+    async def reopen_first(db, thread_ids):
+        await test_client.patch(
+            f"/threads/{thread_id}", json={"status": "active"}, headers=headers
+        )
+        return await archive_chunk(db, thread_ids)
+
+    monkeypatch.setattr(thread_archive, "_archive_chunk", reopen_first)
+    assert await archive_threads(engine) == 0
+    assert await _hot_count(db_session, thread_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_other_readers_include_archived_messages(
+    engine, test_client: AsyncClient, authenticated_user, db_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    headers = {**authenticated_user["headers"], "Accept-Encoding": "identity"}
+    app_response = await test_client.post(
+        "/apps/", json={"name": "Archive App"}, headers=headers
+    )
+    app_id = app_response.json()["id"]
+    thread_ids = []
+    for title in ("Cold", "Hot"):
+        thread = await test_client.post(
+            f"/apps/{app_id}/threads",
+            json={"title": title, "customer_id": f"cust-{title}"},
+            headers=headers,
+        )
+        thread_ids.append(thread.json()["thread"]["id"])
+        await test_client.post(
+            f"/apps/{app_id}/threads/{thread_ids[-1]}/messages",
+            json={"content": f"{title} question"},
+            headers=headers,
+        )
+    cold_id, hot_id = thread_ids
+    expected = [
+        (m["thread_id"], m["seq"])
+        for thread_id in sorted(thread_ids)
+        for m in (
+            await test_client.get(
+                f"/apps/{app_id}/threads/{thread_id}/messages", headers=headers
+            )
+        ).json()
+    ]
+    await test_client.patch(
+        f"/threads/{cold_id}", json={"status": "archived"}, headers=headers
+    )
+    assert await archive_threads(engine) == 1
+    assert await _hot_count(db_session, cold_id) == 0
+    clear_cache()
+
+    # Export: archived messages merged in (thread_id, seq) order, resumable
+    response = await test_client.get(f"/apps/{app_id}/export/messages", headers=headers)
+    lines = [json.loads(line) for line in response.content.splitlines()]
+    assert [(m["thread_id"], m["seq"]) for m in lines if "seq" in m] == expected
+    assert lines[-1] == {"complete": True, "exported": len(expected)}
+    token = next(line["resume_token"] for line in lines if "resume_token" in line)
+    resumed = await test_client.get(
+        f"/apps/{app_id}/export/messages",
+        params={"resume_token": token},
+        headers=headers,
+    )
+    resumed_lines = [json.loads(line) for line in resumed.content.splitlines()]
+    assert [(m["thread_id"], m["seq"]) for m in resumed_lines if "seq" in m] == (
+        expected[2:]
+    )
+
+    # Subscriber summaries
+    subscribers = (
+        await test_client.get(f"/apps/{app_id}/subscribers", headers=headers)
+    ).json()["items"]
+    previews = {s["customer_id"]: s["last_message_preview"] for s in subscribers}
+    assert previews == {"cust-Cold": "Cold question", "cust-Hot": "Hot question"}
+    cold_subscriber = next(s for s in subscribers if s["customer_id"] == "cust-Cold")
+    threads = (
+        await test_client.get(
+            f"/apps/{app_id}/subscribers/{cold_subscriber['id']}/threads",
+            headers=headers,
+        )
+    ).json()["items"]
+    assert threads[0]["message_count"] == 2
+    assert threads[0]["last_message_preview"] == "Cold question"
+    assert threads[0]["last_message_at"] is not None
+
+    # Run: the last user message and history come from the archive
+    response = await test_client.post(
+        f"/apps/{app_id}/run/bulk", json={"thread_ids": [cold_id]}, headers=headers
+    )
+    item = json.loads(response.text.splitlines()[0])
+    assert item["status"] == "completed"
+    assert item["assistant_message"]["seq"] == 3
+    response = await test_client.post(
+        f"/apps/{app_id}/threads/{cold_id}/run", headers=headers
+    )
+    assert response.json()["status"] == "completed"
+    clear_cache()
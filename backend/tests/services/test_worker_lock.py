@@ -0,0 +1,18 @@
+"""Tests for the transaction-scoped worker lock."""
+
+import pytest
+
+from app.services.worker_lock import worker_lock
+
+
+@pytest.mark.asyncio
+async def test_worker_lock_elects_one_worker(engine):
+    async with worker_lock(engine, 42) as first:
+        assert first is True
+        async with worker_lock(engine, 42) as second:
+            assert second is False
+        async with worker_lock(engine, 43) as other:
+            assert other is True
+    # Ending the holding transaction released it
+    async with worker_lock(engine, 42) as again:
+        assert again is True
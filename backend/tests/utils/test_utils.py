@@ -1,5 +1,5 @@
 from fastapi.routing import APIRoute
-from app.utils import simple_generate_unique_route_id
+from app.utils import etag_matches, make_etag, simple_generate_unique_route_id
 
 
 def test_simple_generate_unique_route_id(mocker):
@@ -11,3 +11,17 @@ def test_simple_generate_unique_route_id(mocker):
     unique_id = simple_generate_unique_route_id(mock_route)
 
     assert unique_id == "auth-authenticate_user"
+
+
+def test_etag_matches_weak_and_lists():
+    etag = make_etag("thread", 42)
+
+    assert etag.startswith('W/"')
+    assert make_etag("thread", 42) == etag
+    assert make_etag("thread", 43) != etag
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
@@ -98,15 +98,34 @@ const messages = {
   ERROR_NO_DATA: "No data returned from server",
   ERROR_UNKNOWN: "Unknown error",
   ERROR_INVALID_CURSOR: "Invalid pagination cursor",
+  ERROR_INVALID_FIELDS: "Unknown field requested",
+  ERROR_INVALID_IMPORT_HEADER: "Import file header must include customer_id",
+  ERROR_INVALID_METADATA_FILTER: "Invalid metadata filter",
 
   // ── Backend error keys (returned as raw keys from API) ────────
   ERROR_INTERNAL: "Internal server error",
   ERROR_APP_NOT_FOUND: "App not found or not authorized",
   ERROR_SUBSCRIBER_NOT_FOUND: "Subscriber not found",
+  ERROR_SEGMENT_NOT_FOUND: "Segment not found",
   ERROR_THREAD_NOT_FOUND: "Thread not found or not authorized",
   ERROR_MESSAGE_NOT_FOUND: "Message not found or not authorized",
   ERROR_NO_USER_MESSAGES: "No user messages in thread",
   ERROR_NO_REPLY: "No reply generated",
+  ERROR_PURGE_JOB_NOT_FOUND: "App deletion job not found",
+  ERROR_CHANGE_FEED_EXPIRED:
+    "Change feed position is older than the retained entries; resync",
+  ERROR_CREATED_AT_IN_FUTURE: "Message timestamp is in the future",
+  ERROR_CREATED_AT_BEFORE_RETENTION:
+    "Message timestamp is older than the message retention period",
+  ERROR_TOO_MANY_MONTHS: "Messages span too many months for one import",
+  ERROR_WS_INVALID_FRAME: "Invalid chat socket frame",
+  ERROR_WS_MESSAGE_TOO_LARGE: "Message is too large",
+  ERROR_WS_TOO_MANY_PENDING_MESSAGES:
+    "Too many messages waiting for a reply; wait and try again",
+  ERROR_IDEMPOTENCY_KEY_REUSED:
+    "Idempotency-Key was already used for a different request",
+  ERROR_IDEMPOTENCY_KEY_IN_PROGRESS:
+    "A request with this Idempotency-Key is still in progress; retry shortly",
   ERROR_PARTNER_API_UNAUTHORIZED:
     "Partner API: provide JWT Bearer token or X-App-Id and X-App-Secret headers",
   ERROR_PARTNER_API_INVALID_APP_HEADER:
@@ -118,7 +137,10 @@ const messages = {
 
   // ── Backend success keys (returned as raw keys from API) ──────
   ACTION_APP_DELETED: "App successfully deleted",
+  ACTION_APP_DELETE_SCHEDULED:
+    "App deletion started; its data is being removed in the background",
   ACTION_THREAD_DELETED: "Thread successfully deleted",
+  ACTION_SEGMENT_DELETED: "Segment successfully deleted",
 
   // ── Backend webhook test keys (returned as raw keys from API) ─
   WEBHOOK_TEST_BAD_STATUS: "Webhook returned a non-200 status",